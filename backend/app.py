@@ -1,22 +1,52 @@
-from flask import Flask, request, send_file, jsonify
+from flask import Flask, Request, Response, request, send_file, jsonify
 import pandas as pd
 import numpy as np
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import ClosingIterator
+import hashlib
+import contextvars
+import importlib.util
+import io
+import logging
+import multiprocessing
 import os
+import queue
 import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing, contextmanager
+from functools import partial, wraps
 from flask_cors import CORS
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
 
 app = Flask(__name__)
-CORS(app)
+CORS(app, expose_headers=["X-Peak-Memory-MB", "X-Duplicate-Rows", "X-Already-Imported-Rows", "Server-Timing"])
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# DEBUG | INFO | WARNING | ERROR
+LOG_LEVEL = os.environ.get("KASTLE_LOG_LEVEL", "INFO").strip().upper()
+log = logging.getLogger("kastle")
+if not log.handlers:
+    _log_handler = logging.StreamHandler()
+    _log_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    log.addHandler(_log_handler)
+    log.propagate = False
+log.setLevel(LOG_LEVEL)
+
 
 @app.before_request
 def log_req():
-    print("REQ:", request.method, request.path)
+    log.info("REQ: %s %s", request.method, request.path)
 
 
 @app.route("/", methods=["GET"])
@@ -26,7 +56,18 @@ def index():
 
 @app.route("/ping", methods=["GET"])
 def ping():
-    return jsonify({"status": "ok", "message": "Flask is alive!"})
+    # boot.py answers {"status": "starting", "ready": false} until this module is loaded.
+    return jsonify({"status": "ok", "ready": True, "message": "Flask is alive!"})
+
+
+@app.route("/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(_parse_cache.stats())
+
+
+@app.route("/session-store", methods=["DELETE"])
+def session_store_clear():
+    return jsonify({"cleared_keys": _session_store.clear()})
 
 
 @app.route("/routes", methods=["GET"])
@@ -34,13 +75,71 @@ def routes():
     return jsonify(sorted([str(r) for r in app.url_map.iter_rules()]))
 
 
+# -----------------------------
+# Column candidates
+# -----------------------------
+READER_COLS = ["Reader", "Reader Name", "Reader Description"]
+DATETIME_COLS = ["Date and Time", "Date & Time", "Datetime", "Date Time", "Time"]
+NAME_COLS = ["Personnel Name", "Employee", "Name"]
+DATE_COLS = ["Date", "Day", "Report Date"]
+ENTRY_COLS = ["Time Of First CardRead", "Time Of First Card Read", "Entry Time", "First In", "First Card Read"]
+EXIT_COLS = ["Time Of Last Card Read", "Time Of Last CardRead", "Exit Time", "Last Out", "Last Card Read"]
+
+# (candidates, dtype, required) per column a report builder reads. Identity
+# columns repeat heavily, so they are read as categoricals; timestamps stay
+# strings until _parse_dt handles them.
+ATTENDANCE_COLUMNS = [
+    (NAME_COLS, "category", True),
+    (DATE_COLS, "str", True),
+    (ENTRY_COLS, "str", True),
+    (EXIT_COLS, "str", True),
+]
+QUICK_COLUMNS = [
+    (READER_COLS, "category", True),
+    (DATETIME_COLS, "str", True),
+    (["Personnel Name"], "category", False),
+    (["Card Number"], "category", False),
+]
+
+# Read only the report columns (drops everything else from "Combined" sheets).
+PRUNE_COLUMNS = os.environ.get("KASTLE_PRUNE_COLUMNS", "0") == "1"
+# Content-addressed cache of parsed uploads; 0 MB disables it.
+PARSE_CACHE_DIR = os.environ.get("KASTLE_PARSE_CACHE_DIR", os.path.join(BASE_DIR, "cache"))
+PARSE_CACHE_MB = int(os.environ.get("KASTLE_PARSE_CACHE_MB", "512"))
+# Optional CSV/JSON of reader overrides (Reader, Direction, Suite).
+READER_MAP_PATH = os.environ.get("KASTLE_READER_MAP", "").strip()
+# SQLite file holding open sessions for incremental Quick reports.
+SESSION_STORE_PATH = os.environ.get("KASTLE_SESSION_STORE", os.path.join(BASE_DIR, "session_store.sqlite3"))
+# Default for the per-request low_memory option (categorical pipeline).
+LOW_MEMORY = os.environ.get("KASTLE_LOW_MEMORY", "0") == "1"
+# Default for the per-request dedupe option (drop events repeated across uploads).
+DEDUPE = os.environ.get("KASTLE_DEDUPE", "1") == "1"
+# Worker processes for per-file read+build; 1 disables the pool.
+PARSE_WORKERS = int(os.environ.get("KASTLE_PARSE_WORKERS", "0")) or (os.cpu_count() or 1)
+# Uploaded files larger than this go to temp files under SPOOL_FOLDER, not RAM.
+UPLOAD_SPOOL_BYTES = int(float(os.environ.get("KASTLE_UPLOAD_SPOOL_MB", "8")) * 1024 * 1024)
+SPOOL_FOLDER = os.path.join(UPLOAD_FOLDER, ".spool")
+# Finished reports are deleted after RESULT_TTL_HOURS, or oldest-first once they
+# exceed RESULT_QUOTA_MB; the sweep runs every RESULT_SWEEP_SECONDS.
+RESULT_TTL_HOURS = float(os.environ.get("KASTLE_RESULT_TTL_HOURS", "24"))
+RESULT_QUOTA_MB = int(os.environ.get("KASTLE_RESULT_QUOTA_MB", "2048"))
+RESULT_SWEEP_SECONDS = float(os.environ.get("KASTLE_RESULT_SWEEP_SECONDS", "300"))
+
+
+# Excel reader engine: auto | calamine | openpyxl_stream | openpyxl.
+EXCEL_ENGINE = os.environ.get("KASTLE_EXCEL_ENGINE", "auto").strip().lower()
+
+
 # -----------------------------
 # Helpers
 # -----------------------------
+def _norm_name(c) -> str:
+    return re.sub(r"\s+", " ", str(c)).strip()
+
+
 def _norm_cols(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.copy()
-    df.columns = [re.sub(r"\s+", " ", str(c)).strip() for c in df.columns]
-    return df
+    # set_axis shares the column data (copy-on-write), so no full copy here.
+    return df.set_axis([_norm_name(c) for c in df.columns], axis=1)
 
 
 def _find_col(df: pd.DataFrame, candidates: list[str]) -> str | None:
@@ -51,15 +150,140 @@ def _find_col(df: pd.DataFrame, candidates: list[str]) -> str | None:
     return None
 
 
+def _clean_text(series: pd.Series, blank: str | None = None, na: str | None = None, lean: bool = False) -> pd.Series:
+    """
+    astype(str).str.strip(), with "" replaced by `blank` and missing values by
+    `na` when given. With `lean` the result is a categorical and the string work
+    runs once per category; categories that clean to the same text are merged
+    and kept sorted, so sorting and grouping match the object version.
+    """
+    if not lean:
+        if na is not None:
+            series = series.fillna(na)
+        out = series.astype(str).str.strip()
+        return out.replace("", blank) if blank is not None else out
+
+    cat = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+    text = cat.cat.categories.astype(str).str.strip().to_numpy(dtype=object)
+    if blank is not None:
+        text[text == ""] = blank
+    # Code -1 (missing) indexes the extra last slot: `na`, or stays missing.
+    text = np.append(text, na if na is not None else np.nan)
+    known = pd.notna(text)
+    categories, inverse = np.unique(text[known].astype(str), return_inverse=True)
+    lookup = np.full(len(text), -1, dtype=np.int64)
+    lookup[known] = inverse
+    codes = lookup[cat.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=series.index, name=series.name)
+
+
+def _constant_column(value, n: int, lean: bool = False):
+    """A column of `n` copies of `value`; a one-category categorical with `lean`."""
+    if not lean:
+        return value
+    return pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[value])
+
+
 def _parse_dt_from_date_and_time(date_series: pd.Series, time_series: pd.Series) -> pd.Series:
     d = date_series.astype(str).str.strip()
     t = time_series.astype(str).str.replace(" CT", "", regex=False).str.strip()
-    return pd.to_datetime(d + " " + t, errors="coerce")
+    return _to_datetime_detected(d + " " + t, f"{date_series.name}+{time_series.name}")
 
 
 def _parse_dt(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_datetime64_dtype(series):
+        return series  # Excel cells that are already naive datetimes
     s = series.astype(str).str.replace(" CT", "", regex=False).str.strip()
-    return pd.to_datetime(s, errors="coerce")
+    return _to_datetime_detected(s, str(series.name))
+
+
+# -----------------------------
+# Timestamp format detection
+# -----------------------------
+# Candidate layouts seen in badge-system exports, US orderings first so that
+# ambiguous day/month values read the way the exports mean them.
+DT_FORMATS = [
+    "ISO8601",
+    "%m/%d/%Y %I:%M:%S %p",
+    "%m/%d/%Y %I:%M %p",
+    "%m/%d/%Y %H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%m/%d/%y %I:%M:%S %p",
+    "%m/%d/%y %I:%M %p",
+    "%m/%d/%y %H:%M:%S",
+    "%m/%d/%y %H:%M",
+    "%d-%b-%Y %H:%M:%S",
+    "%d-%b-%Y %I:%M:%S %p",
+    "%b %d, %Y %I:%M:%S %p",
+    "%b %d %Y %I:%M:%S %p",
+    "%m/%d/%Y",
+]
+DT_SAMPLE_SIZE = 500
+_DT_MISSING = ["", "nan", "NaN", "NaT", "None", "<NA>"]
+
+_dt_formats: dict[tuple[str, str], str | None] = {}
+_dt_lock = threading.Lock()
+_dt_counters = {"rows": 0, "fallback_rows": 0, "detections": 0}
+
+
+def _dt_shape(value: str) -> str:
+    """Digit runs and words masked out, e.g. '1/5/2024 8:03:00 AM' -> '9/9/9 9:9:9 a'."""
+    return re.sub(r"[A-Za-z]+", "a", re.sub(r"\d+", "9", value))
+
+
+def _detect_dt_format(sample: pd.Series) -> str | None:
+    """The DT_FORMATS entry that parses the most sample values (None if none do)."""
+    best, best_hits = None, 0
+    for fmt in DT_FORMATS:
+        hits = int(pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum())
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+        if hits == len(sample):
+            break
+    return best
+
+
+def _to_datetime_detected(s: pd.Series, layout: str) -> pd.Series:
+    """
+    Vectorized to_datetime with an explicit format detected from a sample.
+
+    The format is cached per (source column layout, value shape), so later
+    files from the same export skip detection. Only values the format can't
+    read go through pandas' per-element "mixed" parser; how many did is kept
+    in `result.attrs["dt_fallback_rows"]` and in _dt_counters.
+    """
+    present = s.notna() & ~s.isin(_DT_MISSING)
+    if not present.any():
+        return pd.to_datetime(pd.Series(pd.NaT, index=s.index, name=s.name))
+
+    sample = s[present].iloc[:DT_SAMPLE_SIZE].drop_duplicates()
+    key = (layout, _dt_shape(str(sample.iloc[0])))
+    with _dt_lock:
+        cached = key in _dt_formats
+        fmt = _dt_formats.get(key)
+    if not cached:
+        fmt = _detect_dt_format(sample)
+        with _dt_lock:
+            _dt_formats[key] = fmt
+            _dt_counters["detections"] += 1
+
+    if fmt is None:
+        out = pd.to_datetime(pd.Series(pd.NaT, index=s.index, name=s.name))
+    else:
+        out = pd.to_datetime(s, format=fmt, errors="coerce")
+
+    miss = out.isna() & present
+    n_fallback = int(miss.sum())
+    if n_fallback:
+        slow = pd.to_datetime(s[miss], format="mixed", errors="coerce")
+        out = out.mask(miss, slow)
+        log.warning("DT: %d/%d '%s' values did not match %r; parsed individually", n_fallback, len(s), layout, fmt)
+
+    with _dt_lock:
+        _dt_counters["rows"] += len(s)
+        _dt_counters["fallback_rows"] += n_fallback
+    out.attrs["dt_fallback_rows"] = n_fallback
+    return out
 
 
 def _suite_from_reader(reader_text: str) -> str:
@@ -69,33 +293,321 @@ def _suite_from_reader(reader_text: str) -> str:
     return m.group(1).strip() if m else "Unknown"
 
 
-def _safe_output_path(output_name: str, default_name: str) -> str:
+# -----------------------------
+# Reader catalog
+# -----------------------------
+_reader_map_state: dict = {"key": None, "map": {}}
+_reader_catalog: dict = {}
+_reader_catalog_lock = threading.Lock()
+
+
+def _load_reader_map() -> dict[str, tuple[str | None, str | None]]:
+    """
+    Operator overrides from KASTLE_READER_MAP (CSV or JSON records) with a
+    Reader column plus optional Direction (ENTRY/EXIT/OTHER) and Suite columns.
+    Blank cells keep the name-based value. Reloaded when the file changes.
+    """
+    path = READER_MAP_PATH
+    if not path:
+        return {}
+    try:
+        key = (path, os.path.getmtime(path))
+    except OSError:
+        return {}
+    if _reader_map_state["key"] == key:
+        return _reader_map_state["map"]
+
+    raw = pd.read_json(path, dtype=str) if path.lower().endswith(".json") else pd.read_csv(path, dtype=str)
+    raw = _norm_cols(raw)
+    reader_col = _find_col(raw, ["Reader"] + READER_COLS)
+    if reader_col is None:
+        raise ValueError(f"Reader map {path} has no Reader column.")
+    direction = raw["Direction"] if "Direction" in raw.columns else pd.Series(None, index=raw.index)
+    suite = raw["Suite"] if "Suite" in raw.columns else pd.Series(None, index=raw.index)
+
+    mapping = {}
+    for reader, d, s in zip(raw[reader_col], direction, suite):
+        if pd.isna(reader):
+            continue
+        d = str(d).strip().upper() if pd.notna(d) and str(d).strip() else None
+        if d is not None and d not in ("ENTRY", "EXIT", "OTHER"):
+            raise ValueError(f"Reader map {path}: direction for {reader!r} must be ENTRY, EXIT or OTHER.")
+        s = str(s).strip() if pd.notna(s) and str(s).strip() else None
+        mapping[str(reader).strip().lower()] = (d, s)
+
+    _reader_map_state.update(key=key, map=mapping)
+    _reader_catalog.clear()
+    return mapping
+
+
+def _reader_entry(reader) -> tuple[str, str]:
+    """(direction, suite) for one reader name, honoring the operator map."""
+    r = str(reader).lower()
+    direction = "ENTRY" if "entry" in r else "EXIT" if "exit" in r else "OTHER"
+    suite = _suite_from_reader(reader)
+
+    d, s = _load_reader_map().get(str(reader).strip().lower(), (None, None))
+    return d or direction, s or suite
+
+
+def _reader_catalog_codes(readers: pd.Series) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Integer codes for each row plus direction/suite arrays indexed by code.
+    Missing readers get the last slot (OTHER / Unknown).
+    """
+    if isinstance(readers.dtype, pd.CategoricalDtype):
+        codes, uniques = readers.cat.codes.to_numpy(), readers.cat.categories
+    else:
+        codes, uniques = pd.factorize(readers)
+
+    with _reader_catalog_lock:
+        _load_reader_map()
+        entries = []
+        for reader in uniques:
+            entry = _reader_catalog.get(reader)
+            if entry is None:
+                entry = _reader_catalog[reader] = _reader_entry(reader)
+            entries.append(entry)
+
+    directions = np.array([d for d, _ in entries] + ["OTHER"], dtype=object)
+    suites = np.array([s for _, s in entries] + ["Unknown"], dtype=object)
+    return np.where(codes < 0, len(entries), codes), directions, suites
+
+
+def _safe_output_path(output_name: str, default_name: str, ext: str = ".xlsx") -> str:
+    """
+    Result path for a report. Every call gets its own folder under uploads/
+    (created by whoever writes the file), so concurrent requests with the
+    same output_name never overwrite each other and the download keeps the
+    requested file name.
+    """
     out = (output_name or "").strip() or default_name
-    if not out.lower().endswith((".xlsx", ".xls")):
+    if ext != ".xlsx":
+        root, current = os.path.splitext(out)
+        out = (root if current.lower() in (".xlsx", ".xls", ext) else out) + ext
+    elif not out.lower().endswith((".xlsx", ".xls")):
         out += ".xlsx"
-    return os.path.join(UPLOAD_FOLDER, secure_filename(out))
+    return os.path.join(UPLOAD_FOLDER, uuid.uuid4().hex, secure_filename(out))
 
 
-def _load_df(file_storage) -> pd.DataFrame:
-    name = (file_storage.filename or "").lower()
-    if name.endswith(".csv"):
+def _discard_output(path: str | None) -> None:
+    """Delete a result written under _safe_output_path, with its folder."""
+    if not path:
+        return
+    folder = os.path.dirname(path)
+    if os.path.dirname(folder) == UPLOAD_FOLDER:
+        shutil.rmtree(folder, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _rewind(file_storage) -> None:
+    file_storage.stream.seek(0)
+
+
+def _read_csv(file_storage, **kwargs) -> pd.DataFrame:
+    """read_csv with the encoding fallbacks every upload path uses."""
+    def read(**encoding):
+        return pd.read_csv(file_storage, **kwargs, **encoding)
+
+    try:
+        return read()
+    except Exception:
+        _rewind(file_storage)
         try:
-            return pd.read_csv(file_storage)
+            return read(encoding="utf-8-sig")
         except Exception:
-            file_storage.stream.seek(0)
-            try:
-                return pd.read_csv(file_storage, encoding="utf-8-sig")
-            except Exception:
-                file_storage.stream.seek(0)
-                return pd.read_csv(file_storage, encoding_errors="ignore")
-    return pd.read_excel(file_storage, engine="openpyxl")
+            _rewind(file_storage)
+            return read(encoding_errors="ignore")
+
+
+def _upload_size(file_storage) -> int:
+    stream = file_storage.stream
+    try:
+        pos = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell()
+        stream.seek(pos)
+        return size
+    except Exception:
+        return 0
+
+
+def _concat_chunks(chunks) -> pd.DataFrame:
+    """
+    Concatenate per-file frames, keeping columns that are categorical in every
+    frame categorical.
+    """
+    frames = list(chunks)
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    out = pd.concat(frames, ignore_index=True)
+    for col in frames[0].columns:
+        parts = [f[col] for f in frames if col in f.columns and isinstance(f[col].dtype, pd.CategoricalDtype)]
+        if len(parts) == len(frames) and len({p.cat.categories.dtype for p in parts}) == 1:
+            out[col] = pd.api.types.union_categoricals(parts, ignore_order=True)
+    return out
+
 
+# -----------------------------
+# Excel readers
+# -----------------------------
+def _read_excel_calamine(src, **kwargs) -> pd.DataFrame:
+    # Rust-backed reader; needs the optional python-calamine package.
+    return pd.read_excel(src, engine="calamine", **kwargs)
+
+
+def _read_excel_openpyxl_stream(src, **kwargs) -> pd.DataFrame:
+    """
+    Stream the first sheet with openpyxl read_only/values_only and hand the
+    raw rows to pandas' TextParser, which is what read_excel does after it has
+    built (much slower) per-cell objects.
+    """
+    from openpyxl import load_workbook
+    from pandas.io.parsers import TextParser
+
+    wb = load_workbook(src, read_only=True, data_only=True, keep_links=False)
+    try:
+        ws = wb.worksheets[0]
+        # Some exporters write a stale <dimension>; read what is there instead.
+        ws.reset_dimensions()
+        nrows = kwargs.get("nrows")
+        limit = None if nrows is None else nrows + 1
+        rows = []
+        for values in ws.iter_rows(values_only=True):
+            # Same cell coercion as pandas: integral floats become ints.
+            rows.append([int(v) if isinstance(v, float) and v.is_integer() else v for v in values])
+            if limit is not None and len(rows) >= limit:
+                break
+    finally:
+        wb.close()
+
+    # Drop trailing blank rows and columns the sheet dimensions padded in.
+    while rows and all(v is None for v in rows[-1]):
+        rows.pop()
+    width = max((max((i + 1 for i, v in enumerate(r) if v is not None), default=0) for r in rows), default=0)
+    rows = [r[:width] for r in rows]
+    if not rows:
+        return pd.DataFrame()
+    return TextParser(rows, header=0, **kwargs).read()
+
+
+def _read_excel_openpyxl(src, **kwargs) -> pd.DataFrame:
+    return pd.read_excel(src, engine="openpyxl", **kwargs)
+
+
+EXCEL_READERS = {
+    "calamine": _read_excel_calamine,
+    "openpyxl_stream": _read_excel_openpyxl_stream,
+    "openpyxl": _read_excel_openpyxl,
+}
+
+
+def _excel_engine_order(engine: str | None = None) -> list[str]:
+    """Requested engine first, then the remaining ones fastest-first."""
+    engine = (engine or EXCEL_ENGINE or "auto").strip().lower()
+    order = list(EXCEL_READERS)
+    if importlib.util.find_spec("python_calamine") is None:
+        order.remove("calamine")
+    if engine in order:
+        order.remove(engine)
+        order.insert(0, engine)
+    return order
+
+
+def _read_excel(file_storage, engine: str | None = None, **kwargs) -> pd.DataFrame:
+    last_error = None
+    for name in _excel_engine_order(engine):
+        try:
+            return EXCEL_READERS[name](file_storage, **kwargs)
+        except Exception as e:
+            last_error = e
+            _rewind(file_storage)
+    raise last_error
 
-def _looks_like_reader_activity(df: pd.DataFrame) -> bool:
-    df = _norm_cols(df)
-    reader_col = _find_col(df, ["Reader", "Reader Name", "Reader Description"])
-    dt_col = _find_col(df, ["Date and Time", "Date & Time", "Datetime", "Date Time", "Time"])
-    return reader_col is not None and dt_col is not None
+
+def _sniff_header(file_storage) -> list[str]:
+    name = (file_storage.filename or "").lower()
+    try:
+        if name.endswith(".csv"):
+            cols = list(_read_csv(file_storage, nrows=0).columns)
+        else:
+            # Whatever KASTLE_EXCEL_ENGINE says: calamine loads the whole
+            # sheet even for nrows=0, openpyxl read_only stops after row 1.
+            # .xls still falls through to the other readers.
+            cols = list(_read_excel(file_storage, engine="openpyxl_stream", nrows=0).columns)
+    finally:
+        _rewind(file_storage)
+    return [str(c) for c in cols]
+
+
+def _resolve_columns(header: list[str], columns) -> dict[str, str] | None:
+    """
+    Map raw header names to dtypes for the first matching candidate of each
+    column spec. Returns None when a required column is missing, so the caller
+    can fall back to reading the whole file (e.g. legacy positional layouts).
+    """
+    by_norm = {}
+    for raw in header:
+        by_norm.setdefault(_norm_name(raw), raw)
+
+    dtypes = {}
+    for candidates, dtype, required in columns:
+        raw = next((by_norm[c] for c in candidates if c in by_norm), None)
+        if raw is None:
+            if required:
+                return None
+            continue
+        dtypes[raw] = dtype
+    return dtypes
+
+
+def _load_df(file_storage, columns=None, prune: bool = True) -> pd.DataFrame:
+    """
+    Parse an uploaded CSV/XLSX.
+
+    `columns` is a column spec such as ATTENDANCE_COLUMNS or QUICK_COLUMNS. When
+    given, the header row is sniffed first and the resolved columns are parsed
+    with pinned dtypes; with `prune` the other columns are not read at all.
+    """
+    name = (file_storage.filename or "").lower()
+    is_csv = name.endswith(".csv")
+    kwargs = {}
+    if columns is not None:
+        dtypes = _resolve_columns(_sniff_header(file_storage), columns)
+        if dtypes:
+            if prune:
+                kwargs["usecols"] = list(dtypes)
+            # Excel cells already carry date/time types; stringifying them at
+            # read time would change how _parse_dt sees them.
+            kwargs["dtype"] = dtypes if is_csv else {c: t for c, t in dtypes.items() if t != "str"}
+
+    if is_csv:
+        return _read_csv(file_storage, **kwargs)
+    return _read_excel(file_storage, **kwargs)
+
+
+def _looks_like_reader_activity(header) -> bool:
+    names = {_norm_name(c) for c in header}
+    return any(c in names for c in READER_COLS) and any(c in names for c in DATETIME_COLS)
+
+
+def _sniff_report_type(file_storage) -> str | None:
+    """
+    "quick" or "attendance" from the header row alone (anything that is not a
+    Reader Activity export, including headerless legacy files, is attendance).
+    None when the header cannot be read.
+    """
+    try:
+        header = _sniff_header(file_storage)
+    except Exception:
+        return None
+    return "quick" if _looks_like_reader_activity(header) else "attendance"
 
 
 def _excel_sheet_safe(name: str, fallback: str = "Unknown") -> str:
@@ -124,56 +636,192 @@ def _unique_sheet_name(base: str, used: set[str]) -> str:
         i += 1
 
 
+# -----------------------------
+# Row filters
+# -----------------------------
+def _person_key(value) -> str:
+    return str(value).strip().casefold()
+
+
+def _suite_key(value) -> str:
+    # "Suite 4", "suite4" and "4" all compare equal.
+    key = re.sub(r"\s+", "", str(value)).casefold()
+    return key[len("suite"):] if key.startswith("suite") and len(key) > len("suite") else key
+
+
+def _matches(series: pd.Series, keys: frozenset, normalize) -> np.ndarray:
+    """Per-row `normalize(value) in keys`, worked out once per distinct value."""
+    codes, uniques = pd.factorize(series)
+    hit = np.array([normalize(v) in keys for v in uniques] + [False], dtype=bool)
+    return hit[codes]  # code -1 (missing) picks the trailing False
+
+
+NO_MATCHING_ROWS = "No rows match the filters"
+
+
+class _RowFilter:
+    """
+    Row filters from the start/end/people/suites form fields. The builders
+    apply them while preparing rows, so pairing, aggregation and writing
+    only see matching rows.
+
+    start/end are dates (end inclusive) compared with the parsed event time;
+    people matches Personnel Name or Card Number, case-insensitively; suites
+    matches "Suite 4", "suite4" or "4". Lists are comma or newline separated
+    and the fields may repeat. A malformed field sets `error` instead.
+    """
+
+    def __init__(self, start=None, end=None, people=(), suites=(), error: str | None = None):
+        self.start = start  # inclusive
+        self.end = end  # exclusive: the day after the requested end date
+        self.people = frozenset(people)
+        self.suites = frozenset(suites)
+        self.error = error
+
+    @classmethod
+    def from_form(cls, form) -> "_RowFilter":
+        def values(name):
+            items = []
+            for raw in form.getlist(name):
+                items.extend(v.strip() for v in re.split(r"[,\n]", raw))
+            return [v for v in items if v]
+
+        try:
+            start = pd.Timestamp(form["start"]).normalize() if form.get("start") else None
+            end = pd.Timestamp(form["end"]).normalize() + pd.Timedelta(days=1) if form.get("end") else None
+        except (ValueError, TypeError) as e:
+            return cls(error=f"Invalid start/end date: {e}")
+        if start is not None and end is not None and start >= end:
+            return cls(error="start must not be after end")
+        return cls(start, end, map(_person_key, values("people")), map(_suite_key, values("suites")))
+
+    def __bool__(self) -> bool:
+        return self.start is not None or self.end is not None or bool(self.people) or bool(self.suites)
+
+    def __repr__(self) -> str:
+        return f"_RowFilter(start={self.start}, end={self.end}, people={sorted(self.people)}, suites={sorted(self.suites)})"
+
+    def date_mask(self, dt: pd.Series) -> np.ndarray:
+        mask = np.ones(len(dt), dtype=bool)
+        if self.start is not None:
+            mask &= (dt >= self.start).to_numpy()
+        if self.end is not None:
+            mask &= (dt < self.end).to_numpy()
+        return mask
+
+    def suite_match(self, suites: np.ndarray) -> np.ndarray:
+        if not self.suites:
+            return np.ones(len(suites), dtype=bool)
+        return np.array([_suite_key(s) in self.suites for s in suites], dtype=bool)
+
+    def person_mask(self, names: pd.Series, cards: pd.Series | None = None) -> np.ndarray:
+        if not self.people:
+            return np.ones(len(names), dtype=bool)
+        mask = _matches(names, self.people, _person_key)
+        if cards is not None:
+            mask |= _matches(cards, self.people, _person_key)
+        return mask
+
+
 # -----------------------------
 # Attendance Report (FIXED: groups by person)
 # -----------------------------
-def build_attendance_outputs(df_raw: pd.DataFrame, source_filename: str) -> tuple[pd.DataFrame, pd.DataFrame]:
+ATTENDANCE_ROW_COLUMNS = ["Source File", "Employee", "Day", "Undated", "DurationSeconds"]
+
+
+def _fmt_hhmm(seconds: pd.Series) -> pd.Series:
+    """Whole seconds as HH:MM (hours may exceed 99); missing or <= 0 is "N/A"."""
+    values = seconds.to_numpy(dtype=float, na_value=np.nan)
+    valid = values > 0
+    whole = np.where(valid, values, 0).astype(np.int64)
+    hours = pd.Series(whole // 3600, index=seconds.index).astype(str).str.zfill(2)
+    minutes = pd.Series(whole % 3600 // 60, index=seconds.index).astype(str).str.zfill(2)
+    return (hours + ":" + minutes).where(valid, "N/A")
+
+
+def _attendance_summary(rows: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+    """
+    Days in office and total/average time per `by` group in one grouped pass
+    over ATTENDANCE_ROW_COLUMNS rows from any number of files. A day is a
+    distinct Day; legacy rows carry no Date and count one day each.
+    """
+    grp = rows.groupby(by, dropna=False, observed=True)
+    agg = grp.agg(
+        Dates=("Day", "nunique"),
+        Undated=("Undated", "sum"),
+        TotalSeconds=("DurationSeconds", "sum"),
+    ).reset_index()
+    days = agg["Dates"] + agg["Undated"]
+    average = (agg["TotalSeconds"] / days.where(days > 0)).where(days > 0)
+
+    summary = {c: agg[c] for c in by if c != "Employee"}
+    summary.update({
+        "Name": agg["Employee"],
+        "Days in Office": days,
+        "Time in Office (HH:MM)": _fmt_hhmm(agg["TotalSeconds"]),
+        "Average Time per Day (HH:MM)": _fmt_hhmm(average),
+    })
+    return pd.DataFrame(summary)
+
+
+def _attendance_day(work: pd.DataFrame) -> pd.Series:
+    """
+    The calendar day of each header-based row, from the parsed reads (the
+    Date text when neither parsed). Exports spell Date differently: an
+    Excel date cell reads as "2024-01-02", a CSV as "01/02/2024".
+    """
+    day = work["EntryDT"].fillna(work["ExitDT"])
+    undated = day.isna().to_numpy()
+    if undated.any():
+        day = day.copy()
+        day[undated] = _parse_dt(work["Date"][undated].astype(object))
+    return day.dt.normalize()
+
+
+def _filter_attendance(work: pd.DataFrame, filters: "_RowFilter | None") -> pd.DataFrame:
+    # Dated by the first read (the last read when there is none); suites do
+    # not apply to attendance rows.
+    if not filters:
+        return work
+    mask = filters.date_mask(work["EntryDT"].fillna(work["ExitDT"]))
+    mask &= filters.person_mask(work["Employee"], work["Card Number"] if "Card Number" in work.columns else None)
+    if not mask.any():
+        raise ValueError(NO_MATCHING_ROWS)
+    return work[mask].reset_index(drop=True)
+
+
+def build_attendance_outputs(df_raw: pd.DataFrame, source_filename: str, lean: bool = False,
+                             filters: "_RowFilter | None" = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Per-row durations (ATTENDANCE_ROW_COLUMNS, for _attendance_summary) plus
+    the combined rows for one upload. Both share their columns. With `lean`,
+    Employee/Date stay categorical (see _clean_text). `filters` drops rows
+    right after the timestamps are parsed.
+    """
     df = _norm_cols(df_raw)
 
-    name_col = _find_col(df, ["Personnel Name", "Employee", "Name"])
-    date_col = _find_col(df, ["Date", "Day", "Report Date"])
-    entry_col = _find_col(df, ["Time Of First CardRead", "Time Of First Card Read", "Entry Time", "First In", "First Card Read"])
-    exit_col = _find_col(df, ["Time Of Last Card Read", "Time Of Last CardRead", "Exit Time", "Last Out", "Last Card Read"])
-
-    def fmt_hhmm(seconds):
-        if seconds is None or pd.isna(seconds) or seconds <= 0:
-            return "N/A"
-        seconds = int(seconds)
-        h, rem = divmod(seconds, 3600)
-        m, _ = divmod(rem, 60)
-        return f"{h:02d}:{m:02d}"
+    name_col = _find_col(df, NAME_COLS)
+    date_col = _find_col(df, DATE_COLS)
+    entry_col = _find_col(df, ENTRY_COLS)
+    exit_col = _find_col(df, EXIT_COLS)
 
     # Header-based attendance file
     if name_col and date_col and entry_col and exit_col:
-        work = df.copy()
-        work["Employee"] = work[name_col].astype(str).str.strip().replace("", "Unknown")
-        work["Date"] = work[date_col].astype(str).str.strip()
-
-        work["EntryDT"] = _parse_dt_from_date_and_time(work["Date"], work[entry_col])
-        work["ExitDT"] = _parse_dt_from_date_and_time(work["Date"], work[exit_col])
-
-        work["DurationSeconds"] = (work["ExitDT"] - work["EntryDT"]).dt.total_seconds()
-        work["DurationSeconds"] = pd.to_numeric(work["DurationSeconds"], errors="coerce")
-
-        grp = work.groupby("Employee", dropna=False)
-        summary = grp.agg(
-            Days_in_Office=("Date", lambda s: s.nunique()),
-            TotalSeconds=("DurationSeconds", "sum"),
-        ).reset_index()
-
-        summary_df = pd.DataFrame({
-            "Name": summary["Employee"],
-            "Days in Office": summary["Days_in_Office"],
-            "Time in Office (HH:MM)": summary["TotalSeconds"].apply(fmt_hhmm),
-            "Average Time per Day (HH:MM)": summary.apply(
-                lambda r: fmt_hhmm(r["TotalSeconds"] / r["Days_in_Office"]) if r["Days_in_Office"] else "N/A",
-                axis=1
-            ),
-            "Source File": source_filename
-        })
+        with _stage("prepare") as info:
+            work = df  # _norm_cols already returned a new frame
+            work["Employee"] = _clean_text(work[name_col], blank="Unknown", lean=lean)
+            work["Date"] = _clean_text(work[date_col], lean=lean)
 
-        combined_df = work.copy()
-        combined_df.insert(0, "Source File", source_filename)
+            work["EntryDT"] = _parse_dt_from_date_and_time(work["Date"], work[entry_col])
+            work["ExitDT"] = _parse_dt_from_date_and_time(work["Date"], work[exit_col])
+            work = _filter_attendance(work, filters)
+
+            work["DurationSeconds"] = (work["ExitDT"] - work["EntryDT"]).dt.total_seconds()
+            work["DurationSeconds"] = pd.to_numeric(work["DurationSeconds"], errors="coerce")
+            info["rows"] = len(work)
+
+        combined_df = work
+        combined_df.insert(0, "Source File", _constant_column(source_filename, len(work), lean))
         combined_df["Duration (minutes)"] = (combined_df["DurationSeconds"] / 60.0).round(2)
 
         # Keep Employee near front
@@ -182,50 +830,208 @@ def build_attendance_outputs(df_raw: pd.DataFrame, source_filename: str) -> tupl
             cols.insert(1, cols.pop(cols.index("Employee")))
             combined_df = combined_df[cols]
 
-        return summary_df, combined_df
+        rows_df = pd.DataFrame({
+            "Source File": combined_df["Source File"],
+            "Employee": combined_df["Employee"],
+            "Day": _attendance_day(combined_df),
+            "Undated": False,
+            "DurationSeconds": combined_df["DurationSeconds"],
+        })
+        return rows_df, combined_df
 
     # Fallback: legacy positional format (>=7 columns)
     if df_raw is None or df_raw.empty or df_raw.shape[1] < 7:
         raise ValueError("Attendance file format not recognized (missing headers and < 7 columns).")
 
-    legacy = df_raw.copy()
-    legacy["Employee"] = legacy.iloc[:, 1].astype(str).str.strip().replace("", "Unknown")
-    legacy["EntryDT"] = _parse_dt(legacy.iloc[:, 3])
-    legacy["ExitDT"] = _parse_dt(legacy.iloc[:, 6])
-    legacy["DurationSeconds"] = (legacy["ExitDT"] - legacy["EntryDT"]).dt.total_seconds()
-    legacy["DurationSeconds"] = pd.to_numeric(legacy["DurationSeconds"], errors="coerce")
-
-    grp = legacy.groupby("Employee", dropna=False)
-    summary = grp.agg(
-        Days_in_Office=("Employee", "size"),
-        TotalSeconds=("DurationSeconds", "sum"),
-    ).reset_index()
-
-    summary_df = pd.DataFrame({
-        "Name": summary["Employee"],
-        "Days in Office": summary["Days_in_Office"],
-        "Time in Office (HH:MM)": summary["TotalSeconds"].apply(fmt_hhmm),
-        "Average Time per Day (HH:MM)": summary.apply(
-            lambda r: fmt_hhmm(r["TotalSeconds"] / r["Days_in_Office"]) if r["Days_in_Office"] else "N/A",
-            axis=1
-        ),
-        "Source File": source_filename
-    })
-
-    combined_df = legacy.copy()
-    combined_df.insert(0, "Source File", source_filename)
+    with _stage("prepare") as info:
+        legacy = df_raw.copy(deep=False)
+        legacy["Employee"] = _clean_text(legacy.iloc[:, 1], blank="Unknown", lean=lean)
+        legacy["EntryDT"] = _parse_dt(legacy.iloc[:, 3])
+        legacy["ExitDT"] = _parse_dt(legacy.iloc[:, 6])
+        legacy = _filter_attendance(legacy, filters)
+        legacy["DurationSeconds"] = (legacy["ExitDT"] - legacy["EntryDT"]).dt.total_seconds()
+        legacy["DurationSeconds"] = pd.to_numeric(legacy["DurationSeconds"], errors="coerce")
+        info["rows"] = len(legacy)
+
+    combined_df = legacy
+    combined_df.insert(0, "Source File", _constant_column(source_filename, len(legacy), lean))
     combined_df["Duration (minutes)"] = (combined_df["DurationSeconds"] / 60.0).round(2)
-    return summary_df, combined_df
+    rows_df = pd.DataFrame({
+        "Source File": combined_df["Source File"],
+        "Employee": combined_df["Employee"],
+        "Day": pd.NaT,
+        "Undated": True,
+        "DurationSeconds": combined_df["DurationSeconds"],
+    })
+    return rows_df, combined_df
 
 
 # -----------------------------
 # Quick Custom Report (Reader Activity)
 # -----------------------------
-def build_suite_sessions(reader_df: pd.DataFrame):
+SESSION_COLUMNS = [
+    "Personnel Name", "Card Number", "Suite",
+    "Entry Reader", "Entry Time", "Exit Reader", "Exit Time",
+    "Duration (minutes)", "Issue",
+]
+
+ISSUE_DOUBLE_ENTRY = "DOUBLE ENTRY (missing EXIT before this ENTRY)"
+ISSUE_DOUBLE_EXIT = "DOUBLE EXIT (expected ENTRY between EXITs)"
+ISSUE_EXIT_WITHOUT_ENTRY = "EXIT WITHOUT ENTRY"
+ISSUE_NEGATIVE_DURATION = "NEGATIVE DURATION (timestamps out of order?)"
+ISSUE_MISSING_EXIT = "MISSING EXIT"
+
+
+def _take_or_blank(values: np.ndarray, src: np.ndarray) -> np.ndarray:
+    out = np.full(len(src), "", dtype=object)
+    has = src >= 0
+    out[has] = values[src[has]]
+    return out
+
+
+def _take_times(times: np.ndarray, src: np.ndarray) -> np.ndarray:
+    out = np.full(len(src), np.datetime64("NaT"), dtype=times.dtype)
+    has = src >= 0
+    out[has] = times[src[has]]
+    return out
+
+
+def _pair_events(df: pd.DataFrame) -> dict:
+    """
+    Pair ENTRY/EXIT events into session rows with array operations.
+
+    `df` must already be sorted by (Personnel Name, Card Number, Suite, dt) and
+    carry a `direction` column of ENTRY/EXIT. Within a key, the card holder is
+    "inside" exactly when the previous event was an ENTRY, so every outcome
+    follows from comparing each event with the one before it:
+
+      ENTRY after ENTRY  -> DOUBLE ENTRY row for the earlier entry
+      EXIT after ENTRY   -> completed session (NEGATIVE DURATION if < 0)
+      EXIT after EXIT    -> DOUBLE EXIT
+      EXIT first in key  -> EXIT WITHOUT ENTRY
+      ENTRY last in key  -> MISSING EXIT (appended after all other rows)
+
+    Returns the key columns plus, per output row, the event positions it was
+    built from (`key_src`, `entry_src`, `exit_src`; -1 for blank sides).
+    """
+    n = len(df)
+    # Categorical key columns (low-memory mode) stay categorical and are
+    # compared through their codes; _clean_text leaves the categories unique.
+    lean = isinstance(df["Personnel Name"].dtype, pd.CategoricalDtype)
+    keys = []
+    for col, blank in (("Personnel Name", "Unknown"), ("Card Number", None), ("Suite", None)):
+        s = _clean_text(df[col], blank=blank, na="nan", lean=lean)
+        keys.append(s.array if lean else s.to_numpy(dtype=object))
+    name, card, suite = keys
+
+    new_key = np.zeros(n, dtype=bool)
+    new_key[:1] = True
+    for values in keys:
+        values = values.codes if lean else values
+        new_key[1:] |= values[1:] != values[:-1]
+    last_in_key = np.ones(n, dtype=bool)
+    last_in_key[:-1] = new_key[1:]
+
+    is_entry = (df["direction"] == "ENTRY").to_numpy()
+    is_exit = ~is_entry
+    prev_entry = np.zeros(n, dtype=bool)
+    prev_entry[1:] = is_entry[:-1] & ~new_key[1:]
+    prev_exit = np.zeros(n, dtype=bool)
+    prev_exit[1:] = is_exit[:-1] & ~new_key[1:]
+
+    # Rows emitted while walking the events, then trailing open entries.
+    emitted = np.flatnonzero(is_exit | (is_entry & prev_entry))
+    missing = np.flatnonzero(is_entry & last_in_key)
+
+    key_src = np.concatenate([emitted, missing])
+    entry_src = np.concatenate([np.where(prev_entry[emitted], emitted - 1, -1), missing])
+    exit_src = np.concatenate([np.where(is_exit[emitted], emitted, -1), np.full(len(missing), -1)])
+
+    paired = (entry_src >= 0) & (exit_src >= 0)
+    dt = df["dt"].to_numpy()
+    duration = np.full(len(key_src), np.nan)
+    duration[paired] = np.round(
+        (dt[exit_src[paired]] - dt[entry_src[paired]]) / np.timedelta64(1, "s") / 60.0, 2
+    )
+
+    n_emitted = len(emitted)
+    issue = np.full(len(key_src), "", dtype=object)
+    issue[:n_emitted] = np.select(
+        [
+            is_entry[emitted],
+            paired[:n_emitted] & (duration[:n_emitted] < 0),
+            paired[:n_emitted],
+            prev_exit[emitted],
+        ],
+        [ISSUE_DOUBLE_ENTRY, ISSUE_NEGATIVE_DURATION, "", ISSUE_DOUBLE_EXIT],
+        default=ISSUE_EXIT_WITHOUT_ENTRY,
+    )
+    issue[n_emitted:] = ISSUE_MISSING_EXIT
+
+    return {
+        "name": name, "card": card, "suite": suite, "last_in_key": last_in_key,
+        "key_src": key_src, "entry_src": entry_src, "exit_src": exit_src,
+        "paired": paired, "duration": duration, "issue": issue,
+    }
+
+
+def _sessions_frame(df: pd.DataFrame, reader_col: str, pairs: dict, keep: np.ndarray | None = None) -> pd.DataFrame:
+    """Materialize _pair_events output (optionally only the `keep` rows) as the Sessions frame."""
+    if keep is not None:
+        pairs = {**pairs, **{k: pairs[k][keep] for k in ("key_src", "entry_src", "exit_src", "paired", "duration", "issue")}}
+    key_src, entry_src, exit_src = pairs["key_src"], pairs["entry_src"], pairs["exit_src"]
+
+    if isinstance(pairs["name"], pd.Categorical):
+        # Low-memory mode: typed columns (NaT/NaN for blank sides) instead of
+        # object arrays padded with "".
+        readers = pd.Categorical(df[reader_col])
+        times = df["dt"].to_numpy()
+        return pd.DataFrame({
+            "Personnel Name": pairs["name"][key_src],
+            "Card Number": pairs["card"][key_src],
+            "Suite": pairs["suite"][key_src],
+            "Entry Reader": readers.take(entry_src, allow_fill=True),
+            "Entry Time": _take_times(times, entry_src),
+            "Exit Reader": readers.take(exit_src, allow_fill=True),
+            "Exit Time": _take_times(times, exit_src),
+            "Duration (minutes)": pairs["duration"],  # NaN unless paired
+            "Issue": pd.Categorical(pairs["issue"]),
+        }, columns=SESSION_COLUMNS)
+
+    duration_col = np.full(len(key_src), "", dtype=object)
+    duration_col[pairs["paired"]] = pairs["duration"][pairs["paired"]]
+    readers = df[reader_col].to_numpy(dtype=object)
+    times = df["dt"].to_numpy(dtype=object)
+
+    return pd.DataFrame({
+        "Personnel Name": pairs["name"][key_src],
+        "Card Number": pairs["card"][key_src],
+        "Suite": pairs["suite"][key_src],
+        "Entry Reader": _take_or_blank(readers, entry_src),
+        "Entry Time": _take_or_blank(times, entry_src),
+        "Exit Reader": _take_or_blank(readers, exit_src),
+        "Exit Time": _take_or_blank(times, exit_src),
+        "Duration (minutes)": duration_col,
+        "Issue": pairs["issue"],
+    }, columns=SESSION_COLUMNS)
+
+
+def _pair_sessions(df: pd.DataFrame, reader_col: str) -> pd.DataFrame:
+    return _sessions_frame(df, reader_col, _pair_events(df))
+
+
+def _prepare_reader_events(reader_df: pd.DataFrame, lean: bool = False,
+                           filters: "_RowFilter | None" = None) -> tuple[pd.DataFrame, str]:
+    """
+    Parse, classify and sort Reader Activity rows; returns (events, reader
+    column). With `lean` the identity columns come back categorical.
+    `filters` is folded into the ENTRY/EXIT row selection, so rows outside
+    it are never cleaned, sorted or paired.
+    """
     df = _norm_cols(reader_df)
 
-    reader_col = _find_col(df, ["Reader", "Reader Name", "Reader Description"])
-    dt_col = _find_col(df, ["Date and Time", "Date & Time", "Datetime", "Date Time", "Time"])
+    reader_col = _find_col(df, READER_COLS)
+    dt_col = _find_col(df, DATETIME_COLS)
 
     if not reader_col or not dt_col:
         raise ValueError("Missing required columns for Reader Activity report (need Reader + Date/Time).")
@@ -236,124 +1042,54 @@ def build_suite_sessions(reader_df: pd.DataFrame):
         df["Card Number"] = ""
 
     df["dt"] = _parse_dt(df[dt_col])
-    df = df.dropna(subset=["dt"]).copy()
-
-    r = df[reader_col].astype(str).str.lower()
-    df["direction"] = np.select(
-        [r.str.contains("entry"), r.str.contains("exit")],
-        ["ENTRY", "EXIT"],
-        default="OTHER"
-    )
+    df = df.dropna(subset=["dt"])
 
-    df = df[df["direction"].isin(["ENTRY", "EXIT"])].copy()
-    if df.empty:
+    # Direction and suite are worked out once per distinct reader name and
+    # mapped back to the rows through integer codes.
+    codes, directions, suites = _reader_catalog_codes(df[reader_col])
+    keep = directions[codes] != "OTHER"
+    if not keep.any():
         raise ValueError("No ENTRY/EXIT rows found (Reader column did not contain 'entry' or 'exit').")
-
-    df["Suite"] = df[reader_col].apply(_suite_from_reader)
-    df["Personnel Name"] = df["Personnel Name"].astype(str).str.strip().replace("", "Unknown")
-    df["Card Number"] = df["Card Number"].astype(str).str.strip()
+    if filters:
+        keep &= filters.date_mask(df["dt"]) & filters.suite_match(suites)[codes]
+        keep &= filters.person_mask(df["Personnel Name"], df["Card Number"])
+        if not keep.any():
+            raise ValueError(NO_MATCHING_ROWS)
+    df = df[keep]
+
+    codes = codes[keep]
+    if lean:
+        df["direction"] = pd.Categorical(directions).take(codes)
+        df["Suite"] = pd.Categorical(suites).take(codes)
+    else:
+        df["direction"] = directions[codes]
+        df["Suite"] = suites[codes]
+    df["Personnel Name"] = _clean_text(df["Personnel Name"], blank="Unknown", lean=lean)
+    df["Card Number"] = _clean_text(df["Card Number"], lean=lean)
 
     df = df.sort_values(["Personnel Name", "Card Number", "Suite", "dt"]).reset_index(drop=True)
+    return df, reader_col
 
-    sessions = []
-    open_state = {}
-    last_dir = {}
 
-    def key_for(row):
-        return (
-            str(row.get("Personnel Name", "")).strip() or "Unknown",
-            str(row.get("Card Number", "")).strip(),
-            str(row.get("Suite", "Unknown")).strip()
-        )
+def _session_outputs(sessions_df: pd.DataFrame):
+    """Split a Sessions frame into (sessions, discrepancies, per-day summary)."""
+    discrepancies_df = sessions_df[sessions_df["Issue"].astype(str).str.strip() != ""]
 
-    for _, row in df.iterrows():
-        k = key_for(row)
-        direction = row["direction"]
-        when = row["dt"]
-        reader = row.get(reader_col, "")
-        prev = last_dir.get(k)
-
-        if direction == "ENTRY":
-            if k in open_state:
-                sessions.append({
-                    "Personnel Name": k[0],
-                    "Card Number": k[1],
-                    "Suite": k[2],
-                    "Entry Reader": open_state[k]["entry_reader"],
-                    "Entry Time": open_state[k]["entry_time"],
-                    "Exit Reader": "",
-                    "Exit Time": "",
-                    "Duration (minutes)": "",
-                    "Issue": "DOUBLE ENTRY (missing EXIT before this ENTRY)"
-                })
-            open_state[k] = {"entry_time": when, "entry_reader": reader}
-
-        elif direction == "EXIT":
-            if k not in open_state:
-                issue = "EXIT WITHOUT ENTRY"
-                if prev == "EXIT":
-                    issue = "DOUBLE EXIT (expected ENTRY between EXITs)"
-                sessions.append({
-                    "Personnel Name": k[0],
-                    "Card Number": k[1],
-                    "Suite": k[2],
-                    "Entry Reader": "",
-                    "Entry Time": "",
-                    "Exit Reader": reader,
-                    "Exit Time": when,
-                    "Duration (minutes)": "",
-                    "Issue": issue
-                })
-            else:
-                entry_time = open_state[k]["entry_time"]
-                duration_min = round((when - entry_time).total_seconds() / 60.0, 2)
-                issue = "NEGATIVE DURATION (timestamps out of order?)" if duration_min < 0 else ""
-
-                sessions.append({
-                    "Personnel Name": k[0],
-                    "Card Number": k[1],
-                    "Suite": k[2],
-                    "Entry Reader": open_state[k]["entry_reader"],
-                    "Entry Time": entry_time,
-                    "Exit Reader": reader,
-                    "Exit Time": when,
-                    "Duration (minutes)": duration_min,
-                    "Issue": issue
-                })
-                open_state.pop(k, None)
-
-        last_dir[k] = direction
-
-    for k, state in open_state.items():
-        sessions.append({
-            "Personnel Name": k[0],
-            "Card Number": k[1],
-            "Suite": k[2],
-            "Entry Reader": state["entry_reader"],
-            "Entry Time": state["entry_time"],
-            "Exit Reader": "",
-            "Exit Time": "",
-            "Duration (minutes)": "",
-            "Issue": "MISSING EXIT"
-        })
-
-    sessions_df = pd.DataFrame(sessions)
-    if sessions_df.empty:
-        raise ValueError("No sessions produced after pairing. (Unexpected)")
-
-    discrepancies_df = sessions_df[sessions_df["Issue"].astype(str).str.strip() != ""].copy()
-
-    tmp = sessions_df.copy()
-    tmp["Entry Time"] = pd.to_datetime(tmp["Entry Time"], errors="coerce")
-    tmp["Exit Time"] = pd.to_datetime(tmp["Exit Time"], errors="coerce")
-    tmp["Duration (minutes)"] = pd.to_numeric(tmp["Duration (minutes)"], errors="coerce")
+    # Entry/Exit Time and Duration are object columns padded with "" unless
+    # the frame came from low-memory mode, where they are already typed.
+    tmp = sessions_df.assign(**{
+        "Entry Time": pd.to_datetime(sessions_df["Entry Time"], errors="coerce"),
+        "Exit Time": pd.to_datetime(sessions_df["Exit Time"], errors="coerce"),
+        "Duration (minutes)": pd.to_numeric(sessions_df["Duration (minutes)"], errors="coerce"),
+    })
 
-    completed = tmp.dropna(subset=["Entry Time", "Exit Time", "Duration (minutes)"]).copy()
-    completed["Date"] = completed["Entry Time"].dt.date
+    completed = tmp.dropna(subset=["Entry Time", "Exit Time", "Duration (minutes)"])
+    completed = completed.assign(Date=completed["Entry Time"].dt.date)
 
+    group_cols = [c for c in ("Source File", "Personnel Name", "Card Number", "Suite", "Date") if c in completed.columns]
     summary_df = (
         completed
-        .groupby(["Personnel Name", "Card Number", "Suite", "Date"], dropna=False)["Duration (minutes)"]
+        .groupby(group_cols, dropna=False, observed=True)["Duration (minutes)"]
         .sum()
         .reset_index()
         .sort_values(["Personnel Name", "Date", "Suite"])
@@ -362,59 +1098,1556 @@ def build_suite_sessions(reader_df: pd.DataFrame):
     return sessions_df, discrepancies_df, summary_df
 
 
+def build_suite_sessions(reader_df: pd.DataFrame, lean: bool = False, filters: "_RowFilter | None" = None):
+    with _stage("prepare") as info:
+        df, reader_col = _prepare_reader_events(reader_df, lean=lean, filters=filters)
+        info["rows"] = len(df)
+
+    with _stage("pair") as info:
+        sessions_df = _pair_sessions(df, reader_col)
+        info["rows"] = len(sessions_df)
+    if sessions_df.empty:
+        raise ValueError("No sessions produced after pairing. (Unexpected)")
+
+    with _stage("aggregate") as info:
+        outputs = _session_outputs(sessions_df)
+        info["rows"] = len(outputs[2])
+    return outputs
+
+
+# -----------------------------
+# Suite Occupancy (sweep over completed sessions)
+# -----------------------------
+# Default bucket width for the occupancy report, in minutes.
+OCCUPANCY_INTERVAL_MINUTES = int(os.environ.get("KASTLE_OCCUPANCY_MINUTES", "15"))
+OCCUPANCY_SESSION_COLUMNS = ["Suite", "Entry Time", "Exit Time"]
+OCCUPANCY_COLUMNS = [
+    "Suite", "Interval Start", "Interval End",
+    "Peak Occupancy", "Average Occupancy", "Occupied Minutes",
+]
+PEAK_COLUMNS = ["Suite", "Peak Occupancy", "Peak Start", "Peak End", "Sessions", "Occupied Hours"]
+
+
+def _occupancy_sessions(events: pd.DataFrame) -> pd.DataFrame:
+    """
+    OCCUPANCY_SESSION_COLUMNS for the completed sessions (exit after entry)
+    among prepared events, taken straight from _pair_events' positions
+    rather than the padded Sessions frame.
+    """
+    pairs = _pair_events(events)
+    dt = events["dt"].to_numpy()
+    entry_src, exit_src = pairs["entry_src"], pairs["exit_src"]
+    paired = np.flatnonzero(pairs["paired"])
+    entry, exit_ = dt[entry_src[paired]], dt[exit_src[paired]]
+    ok = exit_ > entry
+    return pd.DataFrame({
+        "Suite": pairs["suite"][pairs["key_src"][paired[ok]]],
+        "Entry Time": entry[ok],
+        "Exit Time": exit_[ok],
+    }, columns=OCCUPANCY_SESSION_COLUMNS)
+
+
+def _expand_runs(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """starts[i], starts[i] + 1, ..., starts[i] + lengths[i] - 1 for every i, concatenated."""
+    total = int(lengths.sum())
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.repeat(starts, lengths) + (np.arange(total) - offsets)
+
+
+def build_suite_occupancy(sessions: pd.DataFrame, interval_minutes: int = OCCUPANCY_INTERVAL_MINUTES):
+    """
+    Per-suite occupancy in `interval_minutes` buckets plus each suite's peak,
+    from OCCUPANCY_SESSION_COLUMNS rows (see _occupancy_sessions). A session
+    occupies [Entry Time, Exit Time); times are taken to the second and
+    buckets are aligned to midnight.
+
+    Every session becomes a +1 event at entry and a -1 event at exit, packed
+    into one int64 key (suite, time, delta). One np.sort of the keys and a
+    cumulative sum give the occupancy after every event; bucket values are
+    then read off that sweep with searchsorted at the bucket edges:
+
+        Peak Occupancy      occupancy at the bucket start, or after any
+                            event inside it, whichever is highest
+        Average Occupancy   person-seconds in the bucket / bucket length;
+                            person-seconds up to an edge E are
+                            E * level(E) - sum(delta * time) over the
+                            events before E
+        Occupied Minutes    person-minutes in the bucket
+
+    Only buckets some session overlaps are returned, so a sparse year costs
+    no more than a busy week. Ties put exits first: a session ending when
+    another starts does not overlap it.
+
+    Returns (occupancy, peaks) frames with OCCUPANCY_COLUMNS / PEAK_COLUMNS.
+    """
+    width = int(interval_minutes) * 60
+    if width <= 0:
+        raise ValueError("interval_minutes must be positive")
+    if sessions.empty:
+        return pd.DataFrame(columns=OCCUPANCY_COLUMNS), pd.DataFrame(columns=PEAK_COLUMNS)
+
+    suite_codes, suite_names = pd.factorize(sessions["Suite"], sort=True)
+    entry = sessions["Entry Time"].to_numpy(dtype="datetime64[s]").astype(np.int64)
+    exit_ = sessions["Exit Time"].to_numpy(dtype="datetime64[s]").astype(np.int64)
+    keep = exit_ > entry  # sub-second sessions vanish at second resolution
+    if not keep.any():
+        return pd.DataFrame(columns=OCCUPANCY_COLUMNS), pd.DataFrame(columns=PEAK_COLUMNS)
+    suite_codes, entry, exit_ = suite_codes[keep], entry[keep], exit_[keep]
+
+    origin = entry.min() // 86400 * 86400
+    entry -= origin
+    exit_ -= origin
+    n_buckets = int(exit_.max() // width) + 2
+    span = n_buckets * width  # suite stride in the combined sort keys
+
+    suite_codes = suite_codes.astype(np.int64)
+    with _stage("sweep") as info:
+        # Key = (suite * span + time) * 2 + is_entry: sorting the keys alone
+        # orders events by suite and time with exits first on ties.
+        packed = np.concatenate([(suite_codes * span + entry) * 2 + 1, (suite_codes * span + exit_) * 2])
+        packed.sort()
+        ev_delta = (packed & 1) * 2 - 1
+        ev_key = packed >> 1
+        del packed
+        ev_suite, ev_time = np.divmod(ev_key, span)
+        # Each suite's deltas sum to zero, so one running sum over all
+        # suites is also every suite's own occupancy.
+        level = np.cumsum(ev_delta)
+        weighted = np.concatenate([[0], np.cumsum(ev_delta * ev_time)])
+        info["rows"] = len(ev_key)
+
+    with _stage("buckets") as info:
+        # Buckets that any session overlaps: a second, coarse sweep over
+        # bucket indexes, kept where the bucket-level count is positive.
+        packed = np.concatenate([
+            (suite_codes * n_buckets + entry // width) * 2 + 1,
+            (suite_codes * n_buckets + (exit_ - 1) // width + 1) * 2,
+        ])
+        packed.sort()
+        b_key = packed >> 1
+        run_at = np.flatnonzero(np.r_[True, b_key[1:] != b_key[:-1]])
+        run_key = b_key[run_at]
+        active = np.cumsum(np.add.reduceat((packed & 1) * 2 - 1, run_at)) > 0
+        del packed, b_key
+        lengths = np.diff(run_key)[active[:-1]]
+        buckets = _expand_runs(run_key[:-1][active[:-1]], lengths)
+
+        b_suite = buckets // n_buckets
+        start = (buckets % n_buckets) * width
+        lo = b_suite * span + start
+
+        # Person-seconds up to each edge: E * level(E) - sum(delta * t) over
+        # earlier events of the suite (the suite's own offsets cancel out in
+        # the difference between the two edges of a bucket).
+        i0 = np.searchsorted(ev_key, lo, side="left")
+        i1 = np.searchsorted(ev_key, lo + width, side="left")
+        level_ext = np.concatenate([[0], level])  # level before event i is level_ext[i]
+        person_seconds = ((start + width) * level_ext[i1] - weighted[i1]) - (start * level_ext[i0] - weighted[i0])
+
+        # Peak: level once the events exactly at the bucket start are in,
+        # or after any event strictly inside the bucket.
+        r0 = np.searchsorted(ev_key, lo, side="right")
+        peak = level_ext[r0]
+        inside = i1 > r0
+        if inside.any():
+            bounds = np.column_stack([r0[inside], i1[inside]]).ravel()
+            peak[inside] = np.maximum(peak[inside], np.maximum.reduceat(np.append(level, 0), bounds)[::2])
+        info["rows"] = len(buckets)
+
+    suite_names = pd.Index(np.asarray(suite_names, dtype=object))
+    occupancy = pd.DataFrame({
+        "Suite": pd.Categorical.from_codes(b_suite, suite_names),
+        "Interval Start": (start + origin).astype("datetime64[s]"),
+        "Interval End": (start + width + origin).astype("datetime64[s]"),
+        "Peak Occupancy": peak,
+        "Average Occupancy": np.round(person_seconds / width, 2),
+        "Occupied Minutes": np.round(person_seconds / 60, 2),
+    }, columns=OCCUPANCY_COLUMNS)
+
+    # Per-suite peak and the first stretch it was reached.
+    suite_at = np.flatnonzero(np.r_[True, ev_suite[1:] != ev_suite[:-1]])
+    suite_peak = np.maximum.reduceat(level, suite_at)
+    hits = np.flatnonzero(level == np.repeat(suite_peak, np.diff(np.r_[suite_at, len(level)])))
+    _, first_hit = np.unique(ev_suite[hits], return_index=True)
+    at = hits[first_hit]  # the level changes at the next event, which is the same suite's
+    peaks = pd.DataFrame({
+        "Suite": suite_names.to_numpy()[ev_suite[suite_at]],
+        "Peak Occupancy": suite_peak,
+        "Peak Start": (ev_time[at] + origin).astype("datetime64[s]"),
+        "Peak End": (ev_time[at + 1] + origin).astype("datetime64[s]"),
+        "Sessions": np.bincount(suite_codes, minlength=len(suite_names))[ev_suite[suite_at]],
+        "Occupied Hours": np.round(np.bincount(suite_codes, weights=exit_ - entry, minlength=len(suite_names))[ev_suite[suite_at]] / 3600, 2),
+    }, columns=PEAK_COLUMNS)
+    return occupancy, peaks
+
+
+# -----------------------------
+# Session store (incremental Quick report)
+# -----------------------------
+SESSION_KEY_COLS = ["Personnel Name", "Card Number", "Suite"]
+SESSION_STORE_SOURCE = "(session store)"
+
+
+class _SessionStore:
+    """
+    SQLite table of the pairing state per (Personnel Name, Card Number, Suite):
+    the last event seen and, while the holder is inside, the open entry.
+
+    pair() loads state only for the keys in the new events (primary-key
+    lookups), replays it as one seed event per key ahead of the new events,
+    runs the normal vectorized pairing and writes the keys' new state back,
+    all inside one IMMEDIATE transaction. Events at or before a key's last
+    stored event are treated as already imported, so re-uploading an export
+    is a no-op; pair() counts them per file so the response can say so.
+    """
+
+    STATE_COLS = ["last_direction", "last_time", "entry_time", "entry_reader"]
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        con = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS key_state (
+                personnel_name TEXT NOT NULL,
+                card_number TEXT NOT NULL,
+                suite TEXT NOT NULL,
+                last_direction TEXT NOT NULL,
+                last_time TEXT NOT NULL,
+                entry_time TEXT,
+                entry_reader TEXT,
+                PRIMARY KEY (personnel_name, card_number, suite)
+            ) WITHOUT ROWID
+        """)
+        return con
+
+    def _load(self, con, keys: pd.DataFrame) -> pd.DataFrame:
+        con.execute("CREATE TEMP TABLE IF NOT EXISTS batch_keys (personnel_name TEXT, card_number TEXT, suite TEXT)")
+        con.execute("DELETE FROM batch_keys")
+        con.executemany("INSERT INTO batch_keys VALUES (?, ?, ?)", keys.itertuples(index=False, name=None))
+        rows = con.execute("""
+            SELECT s.personnel_name, s.card_number, s.suite,
+                   s.last_direction, s.last_time, s.entry_time, s.entry_reader
+            FROM batch_keys b
+            JOIN key_state s USING (personnel_name, card_number, suite)
+        """).fetchall()
+        state = pd.DataFrame(rows, columns=SESSION_KEY_COLS + self.STATE_COLS)
+        for col in ("last_time", "entry_time"):
+            state[col] = pd.to_datetime(state[col], format="ISO8601")
+        return state
+
+    def _save(self, con, state: pd.DataFrame) -> None:
+        def iso(ts):
+            return None if pd.isna(ts) else ts.isoformat()
+
+        con.executemany(
+            "INSERT OR REPLACE INTO key_state VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (name, card, suite, direction, iso(last), iso(entry), None if pd.isna(entry) else str(reader))
+                for name, card, suite, direction, last, entry, reader in state.itertuples(index=False, name=None)
+            ],
+        )
+
+    def pair(self, events: pd.DataFrame) -> tuple[pd.DataFrame | None, dict[str, int]]:
+        """
+        Pair new events (columns SESSION_KEY_COLS + dt, direction, Reader,
+        Source File) against the stored state. Returns the Sessions frame with
+        a leading Source File column (None when nothing new was uploaded) and
+        {Source File: events dropped as already imported}. Trailing open
+        entries are stored instead of reported as MISSING EXIT.
+        """
+        events = events.copy()
+        for col in SESSION_KEY_COLS:
+            events[col] = events[col].fillna("nan").astype(str)
+
+        with closing(self._connect()) as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                state = self._load(con, events[SESSION_KEY_COLS].drop_duplicates())
+
+                # Drop events the store has already seen for their key. Late
+                # events behind a key's last stored one go too: its state has
+                # moved past them and they can no longer pair correctly.
+                already_imported = {}
+                if not state.empty:
+                    seen = events.merge(state[SESSION_KEY_COLS + ["last_time"]], on=SESSION_KEY_COLS, how="left")["last_time"]
+                    fresh = seen.isna().to_numpy() | (events["dt"].to_numpy() > seen.to_numpy())
+                    if not fresh.all():
+                        counts = pd.Series(events["Source File"].to_numpy(dtype=object)[~fresh]).value_counts(sort=False)
+                        already_imported = {str(f): int(n) for f, n in counts.items()}
+                    events = events[fresh]
+                if events.empty:
+                    con.execute("ROLLBACK")
+                    return None, already_imported
+
+                state = state[state.set_index(SESSION_KEY_COLS).index.isin(events.set_index(SESSION_KEY_COLS).index)]
+                is_open = state["entry_time"].notna().to_numpy()
+                seeds = state[SESSION_KEY_COLS].assign(
+                    dt=np.where(is_open, state["entry_time"], state["last_time"]),
+                    direction=np.where(is_open, "ENTRY", "EXIT"),
+                    Reader=np.where(is_open, state["entry_reader"], ""),
+                )
+                seeds["Source File"] = SESSION_STORE_SOURCE
+                seeds["dt"] = pd.to_datetime(seeds["dt"])
+                seeds["_seed"] = True
+                events["_seed"] = False
+
+                df = (
+                    pd.concat([seeds, events], ignore_index=True)
+                    .sort_values(SESSION_KEY_COLS + ["dt"], kind="stable")
+                    .reset_index(drop=True)
+                )
+                pairs = _pair_events(df)
+
+                # Seeds only stand in for history: drop rows that exist solely
+                # because of a seeded EXIT, and keep trailing entries open.
+                seed = df["_seed"].to_numpy()
+                exit_src = pairs["exit_src"]
+                keep = (pairs["issue"] != ISSUE_MISSING_EXIT) & ~((exit_src >= 0) & seed[np.maximum(exit_src, 0)])
+                sessions_df = _sessions_frame(df, "Reader", pairs, keep)
+                sessions_df.insert(0, "Source File", df["Source File"].to_numpy(dtype=object)[pairs["key_src"][keep]])
+
+                last = pairs["last_in_key"]
+                last_entry = (df["direction"].to_numpy() == "ENTRY") & last
+                new_state = pd.DataFrame({
+                    "Personnel Name": pairs["name"][last],
+                    "Card Number": pairs["card"][last],
+                    "Suite": pairs["suite"][last],
+                    "last_direction": df["direction"].to_numpy()[last],
+                    "last_time": df["dt"][last].to_numpy(),
+                    "entry_time": df["dt"].where(last_entry)[last].to_numpy(),
+                    "entry_reader": df["Reader"].astype(object).where(last_entry)[last].to_numpy(),
+                })
+                new_state["last_time"] = pd.to_datetime(new_state["last_time"])
+                new_state["entry_time"] = pd.to_datetime(new_state["entry_time"])
+                self._save(con, new_state)
+                con.execute("COMMIT")
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+        return sessions_df, already_imported
+
+    def open_entries(self) -> pd.DataFrame:
+        with closing(self._connect()) as con:
+            rows = con.execute("""
+                SELECT personnel_name, card_number, suite, entry_reader, entry_time
+                FROM key_state WHERE entry_time IS NOT NULL
+                ORDER BY personnel_name, card_number, suite
+            """).fetchall()
+        df = pd.DataFrame(rows, columns=SESSION_KEY_COLS + ["Entry Reader", "Entry Time"])
+        df["Entry Time"] = pd.to_datetime(df["Entry Time"], format="ISO8601")
+        return df
+
+    def clear(self) -> int:
+        with closing(self._connect()) as con:
+            return con.execute("DELETE FROM key_state").rowcount
+
+
+_session_store = _SessionStore(SESSION_STORE_PATH)
+
+
+# -----------------------------
+# Streaming workbook output
+# -----------------------------
+# Same header look pandas' to_excel gives the sheets. Shared by every header
+# cell: styles are immutable and the workbook registers each one only once.
+_THIN = Side(style="thin")
+EXCEL_HEADER_FONT = Font(bold=True)
+EXCEL_HEADER_BORDER = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+EXCEL_HEADER_ALIGNMENT = Alignment(horizontal="center", vertical="top")
+
+
+def _excel_header_cell(ws, value):
+    cell = WriteOnlyCell(ws, value=str(value))
+    cell.font = EXCEL_HEADER_FONT
+    cell.border = EXCEL_HEADER_BORDER
+    cell.alignment = EXCEL_HEADER_ALIGNMENT
+    return cell
+
+
+def _excel_rows(df: pd.DataFrame):
+    """Yield plain row tuples with missing values as None (blank cells)."""
+    # One conversion for the whole frame instead of one where() per column.
+    values = df.astype(object).where(df.notna(), None)
+    yield from values.itertuples(index=False, name=None)
+
+
+def _write_workbook_streaming(output_path: str, sheets) -> int:
+    """
+    Write (sheet_name, DataFrame) pairs with an openpyxl write-only workbook.
+
+    Rows are appended one at a time into a temp file per sheet, so memory stays
+    bounded by the largest single frame rather than by the total number of
+    cells. Each sheet is closed once written: openpyxl otherwise keeps every
+    temp file open until save, and thousands of per-person tabs run out of
+    file descriptors. `sheets` may be a generator so per-person frames are
+    built only as they are written. Returns the number of data rows written.
+    """
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    rows = 0
+    for sheet_name, df in sheets:
+        ws = wb.create_sheet(title=sheet_name)
+        ws.append([_excel_header_cell(ws, c) for c in df.columns])
+        for row in _excel_rows(df):
+            ws.append(row)
+        ws.close()
+        rows += len(df)
+        del df  # release this frame before the generator builds the next one
+    wb.save(output_path)
+    return rows
+
+
+def _write_workbook_pandas(output_path: str, sheets) -> int:
+    """Write (sheet_name, DataFrame) pairs through pandas' ExcelWriter (full openpyxl workbook)."""
+    rows = 0
+    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            rows += len(df)
+    return rows
+
+
+# -----------------------------
+# Output formats
+# -----------------------------
+# output_format -> (file extension, mimetype). csv and parquet are zips with
+# one file per sheet; ndjson is one JSON object per row tagged with its sheet.
+# Only xlsx and csv carry the per-person sheets, the others are meant for
+# loading into other tools and get the overall tables only.
+OUTPUT_FORMATS = {
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "csv": (".zip", "application/zip"),
+    "parquet": (".zip", "application/zip"),
+    "ndjson": (".ndjson", "application/x-ndjson"),
+}
+PER_PERSON_FORMATS = ("xlsx", "csv")
+# Accept header values mapped to formats, in order of preference for */*.
+ACCEPT_FORMATS = {
+    OUTPUT_FORMATS["xlsx"][1]: "xlsx",
+    "application/zip": "csv",
+    "text/csv": "csv",
+    "application/vnd.apache.parquet": "parquet",
+    "application/x-parquet": "parquet",
+    "application/x-ndjson": "ndjson",
+}
+NDJSON_CHUNK_ROWS = 50_000
+
+
+def _output_format(form, accept=None) -> str:
+    """output_format form field, else the best Accept match, else xlsx."""
+    fmt = (form.get("output_format") or "").strip().lower()
+    if fmt:
+        return fmt
+    if accept is not None:
+        best = accept.best_match(list(ACCEPT_FORMATS))
+        if best:
+            return ACCEPT_FORMATS[best]
+    return "xlsx"
+
+
+def _options_error(options, report_type: str | None = None) -> dict | None:
+    """Error body for options a processor cannot honour (checked before any file is read)."""
+    options = options or {}
+    fmt = options.get("output_format") or "xlsx"
+    if fmt not in OUTPUT_FORMATS:
+        return {"error": f"Unknown output_format '{fmt}'", "output_formats": list(OUTPUT_FORMATS)}
+    if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        return {"error": "output_format 'parquet' needs pyarrow installed on the server"}
+
+    filters = options.get("filters")
+    if filters is not None and filters.error:
+        return {"error": filters.error}
+    # Incremental runs persist every event they see; a filtered or read-only
+    # run would leave the session store with gaps.
+    if options.get("incremental") and filters:
+        return {"error": "Filters cannot be combined with incremental"}
+    interval = options.get("interval")
+    if interval is not None and (not str(interval).isdigit() or int(interval) <= 0):
+        return {"error": "interval must be a whole number of minutes"}
+    query = options.get("query")
+    if query is not None:
+        if options.get("incremental"):
+            return {"error": "Queries cannot be combined with incremental"}
+        tables = QUERY_TABLES.get(report_type) if report_type else {t: None for ts in QUERY_TABLES.values() for t in ts}
+        if query and query not in tables:
+            return {"error": f"Unknown table '{query}'", "tables": list(tables)}
+    return None
+
+
+def _export_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Typed copy for columnar output: "" in object columns (the padding of
+    session times, durations) becomes null, then columns that infer to
+    datetime/float keep that type and other mixed columns become text. A
+    column that is all padding comes out all null.
+    """
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if s.dtype == object:
+            s = s.mask(s.eq(""), None).infer_objects()
+            if s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+                s = s.where(s.isna(), s.astype(str))
+        out[str(col)] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def _write_csv_zip(output_path: str, sheets) -> int:
+    import zipfile
+
+    rows = 0
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for sheet_name, df in sheets:
+            with zf.open(f"{sheet_name}.csv", "w") as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as f:
+                df.to_csv(f, index=False)
+            rows += len(df)
+    return rows
+
+
+def _write_parquet_zip(output_path: str, sheets) -> int:
+    import zipfile
+
+    rows = 0
+    # Parquet is already compressed; store the members as-is.
+    with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_STORED) as zf:
+        for sheet_name, df in sheets:
+            buf = io.BytesIO()
+            _export_frame(df).to_parquet(buf, index=False)
+            zf.writestr(f"{sheet_name}.parquet", buf.getvalue())
+            rows += len(df)
+    return rows
+
+
+def _ndjson_chunks(sheets):
+    """Yield NDJSON bytes, NDJSON_CHUNK_ROWS rows at a time, each row tagged with "sheet"."""
+    for sheet_name, df in sheets:
+        for start in range(0, len(df), NDJSON_CHUNK_ROWS):
+            part = df.iloc[start:start + NDJSON_CHUNK_ROWS]
+            part = _export_frame(part)
+            part.insert(0, "sheet", sheet_name)
+            text = part.to_json(orient="records", lines=True, date_format="iso")
+            yield (text if text.endswith("\n") else text + "\n").encode()
+
+
+def _write_ndjson(output_path: str, sheets) -> int:
+    rows = 0
+    with open(output_path, "wb") as f:
+        for sheet_name, df in sheets:
+            for chunk in _ndjson_chunks([(sheet_name, df)]):
+                f.write(chunk)
+            rows += len(df)
+    return rows
+
+
+OUTPUT_WRITERS = {
+    "xlsx": _write_workbook_streaming,
+    "csv": _write_csv_zip,
+    "parquet": _write_parquet_zip,
+    "ndjson": _write_ndjson,
+}
+
+
+class _ReportStream:
+    """Report body sent as it is generated (no file on disk)."""
+
+    def __init__(self, chunks, filename: str, mimetype: str):
+        self.chunks = chunks
+        self.filename = filename
+        self.mimetype = mimetype
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+
+def _emit_report(output_path: str, sheets, options=None, progress=None, xlsx_writer=None):
+    """
+    Write a processor's sheets in the requested output_format. `sheets` is
+    called with per_person=True/False and returns (sheet_name, DataFrame)
+    pairs. Returns (output path, None), or (_ReportStream, None) for ndjson
+    when options["stream"] is set.
+    """
+    options = options or {}
+    fmt = options.get("output_format") or "xlsx"
+    if progress is not None:
+        progress("writing")
+    if fmt == "ndjson" and options.get("stream"):
+        stream = _ndjson_chunks(sheets(per_person=False))
+        return _ReportStream(stream, os.path.basename(output_path), OUTPUT_FORMATS["ndjson"][1]), None
+    writer = xlsx_writer if fmt == "xlsx" and xlsx_writer is not None else OUTPUT_WRITERS[fmt]
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    try:
+        with _stage("write") as info:
+            info["rows"] = writer(output_path, sheets(per_person=fmt in PER_PERSON_FORMATS))
+    except BaseException:
+        _discard_output(output_path)
+        raise
+    _result_store.wake()
+    return output_path, None
+
+
+# -----------------------------
+# Duplicate rows across uploads
+# -----------------------------
+# Exports often overlap by a day, or the same range is uploaded twice. With
+# the dedupe option the builders tag every row with a 64-bit hash of its key
+# and rows already seen earlier in the batch (upload order, then row order)
+# are dropped before pairing/aggregation.
+ROW_HASH = "_hash"
+QUICK_DEDUPE_COLS = ["Personnel Name", "Card Number", "Reader", "dt"]
+# Attendance rows key on the parsed Day (see _attendance_day): the Date text
+# differs between Excel and CSV exports of the same day.
+ATTENDANCE_DEDUPE_COLS = ["Employee", "Day", "EntryDT", "ExitDT"]
+
+
+def _row_hashes(df: pd.DataFrame, columns: list[str]) -> np.ndarray:
+    key = df[columns]
+    # Hashes see the raw int64s: a CSV parses to datetime64[us], an Excel
+    # cell arrives as datetime64[ns], and the same instant must hash equal.
+    key = key.astype({c: "datetime64[us]" for c in columns if pd.api.types.is_datetime64_dtype(key[c])})
+    return pd.util.hash_pandas_object(key, index=False).to_numpy()
+
+
+def _dedupe_masks(parts: list[tuple[str, pd.DataFrame]]) -> tuple[list[np.ndarray], dict[str, int]]:
+    """
+    Keep-masks for (filename, frame with ROW_HASH) parts in upload order, and
+    {filename: rows removed} for the files that lost any. The removed total
+    is the "dedupe" stage's row count.
+    """
+    with _stage("dedupe") as info:
+        hashes = np.concatenate([frame[ROW_HASH].to_numpy() for _, frame in parts])
+        dup = pd.Series(hashes).duplicated().to_numpy()
+        info["rows"] = int(dup.sum())
+    masks = np.split(~dup, np.cumsum([len(frame) for _, frame in parts])[:-1])
+    removed = {}
+    for (filename, _), keep in zip(parts, masks):
+        n = int(len(keep) - keep.sum())
+        if n:
+            removed[filename] = removed.get(filename, 0) + n
+    return masks, removed
+
+
+# -----------------------------
+# Parse cache
+# -----------------------------
+class _ParseCache:
+    """
+    On-disk cache of normalized upload frames keyed by a SHA-256 of the file
+    bytes (plus the column spec). Entries are Feather when pyarrow is
+    installed, pickle otherwise. File mtimes double as LRU recency: a hit
+    touches the entry and evict() drops the stalest ones past max_bytes.
+
+    Pool workers read and write entries directly; lookups that decide
+    hit/miss and eviction run in the web process so the counters are global.
+    """
+
+    VERSION = "1"
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def key(self, stream, ingest: dict) -> str:
+        # Hashed in blocks so spooled uploads are not read into memory.
+        h = hashlib.sha256()
+        for block in iter(partial(stream.read, 1024 * 1024), b""):
+            h.update(block)
+        h.update(f"|v{self.VERSION}|{ingest!r}".encode())
+        return h.hexdigest()
+
+    def _paths(self, key: str) -> list[str]:
+        base = os.path.join(self.directory, key)
+        return [base + ".feather", base + ".pkl"]
+
+    def _existing(self, key: str) -> str | None:
+        return next((p for p in self._paths(key) if os.path.exists(p)), None)
+
+    def lookup(self, key: str) -> bool:
+        """Count a hit or miss for `key` and report whether it is cached."""
+        hit = self._existing(key) is not None
+        with self.lock:
+            self.counters["hits" if hit else "misses"] += 1
+        return hit
+
+    def get(self, key: str) -> pd.DataFrame | None:
+        path = self._existing(key)
+        if path is None:
+            return None
+        try:
+            df = pd.read_feather(path) if path.endswith(".feather") else pd.read_pickle(path)
+            os.utime(path)
+            return df
+        except Exception:
+            return None
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        feather_path, pickle_path = self._paths(key)
+        tmp = f"{feather_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                if importlib.util.find_spec("pyarrow") is None:
+                    raise ImportError("pyarrow not installed")
+                df.to_feather(tmp)
+                path = feather_path
+            except Exception:
+                # No pyarrow, or a frame Feather can't hold (e.g. duplicate headers).
+                df.to_pickle(tmp)
+                path = pickle_path
+            os.replace(tmp, path)
+        except Exception:
+            pass
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def evict(self) -> None:
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith((".feather", ".pkl"))]
+        except FileNotFoundError:
+            return
+        entries = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entries]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self.lock:
+                self.counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        try:
+            entries = [e.stat().st_size for e in os.scandir(self.directory) if e.name.endswith((".feather", ".pkl"))]
+        except FileNotFoundError:
+            entries = []
+        with self.lock:
+            counters = dict(self.counters)
+        return {**counters, "entries": len(entries), "bytes": sum(entries), "max_bytes": self.max_bytes}
+
+
+_parse_cache = _ParseCache(PARSE_CACHE_DIR, PARSE_CACHE_MB * 1024 * 1024)
+
+
+def _ingest_kwargs(columns, lean: bool = False) -> dict:
+    """_load_df arguments for a report's column spec under the current settings."""
+    if PRUNE_COLUMNS:
+        return {"columns": columns}
+    if lean:
+        return {"columns": columns, "prune": False}
+    return {}
+
+
+def _load_df_cached(upload, ingest: dict, cache_key: str | None = None) -> pd.DataFrame:
+    """_load_df through the parse cache; the result is already _norm_cols'd when a key is given."""
+    if cache_key is None:
+        return _load_df(upload, **ingest)
+    df = _parse_cache.get(cache_key)
+    if df is None:
+        df = _norm_cols(_load_df(upload, **ingest))
+        _parse_cache.put(cache_key, df)
+    return df
+
+
+# -----------------------------
+# Per-file parsing (process pool)
+# -----------------------------
+class _UploadBuffer(io.BytesIO):
+    """In-memory upload with the `filename`/`stream` surface of FileStorage, but picklable."""
+
+    def __init__(self, data: bytes, filename: str):
+        super().__init__(data)
+        self.filename = filename
+
+    @property
+    def stream(self):
+        return self
+
+    def __reduce__(self):
+        return (_UploadBuffer, (self.getvalue(), self.filename))
+
+
+class _SpooledUpload(io.BufferedReader):
+    """
+    Upload copied to a file under SPOOL_FOLDER. Pickles as its path, so pool
+    workers and queued jobs open the file instead of carrying the bytes; only
+    the original (owner) deletes it, in discard().
+    """
+
+    def __init__(self, path: str, filename: str, owner: bool = True):
+        super().__init__(io.FileIO(path, "rb"))
+        self.path = path
+        self.filename = filename
+        self.owner = owner
+
+    @property
+    def stream(self):
+        return self
+
+    def __reduce__(self):
+        return (_SpooledUpload, (self.path, self.filename, False))
+
+    def discard(self) -> None:
+        self.close()
+        if self.owner:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass  # still open elsewhere (Windows); the result sweep removes it later
+
+
+class _SpoolingRequest(Request):
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        # Per uploaded file: in memory up to UPLOAD_SPOOL_BYTES, then a temp file.
+        os.makedirs(SPOOL_FOLDER, exist_ok=True)
+        return tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES, dir=SPOOL_FOLDER)
+
+
+app.request_class = _SpoolingRequest
+
+
+def _spool_upload(file_storage):
+    """
+    Picklable copy of an upload that outlives the request: an _UploadBuffer up
+    to UPLOAD_SPOOL_BYTES, a _SpooledUpload beyond. Copies already made are
+    returned as they are.
+    """
+    if isinstance(file_storage, (_UploadBuffer, _SpooledUpload)):
+        _rewind(file_storage)
+        return file_storage
+    _rewind(file_storage)
+    if _upload_size(file_storage) <= UPLOAD_SPOOL_BYTES:
+        return _UploadBuffer(file_storage.read(), file_storage.filename)
+    os.makedirs(SPOOL_FOLDER, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=SPOOL_FOLDER, suffix=".upload")
+    with os.fdopen(fd, "wb") as out:
+        shutil.copyfileobj(file_storage.stream, out, 1024 * 1024)
+    _rewind(file_storage)
+    return _SpooledUpload(path, file_storage.filename)
+
+
+def _discard_uploads(uploads, keep=()) -> None:
+    """Delete the spool files of `uploads` (except those in `keep`)."""
+    for upload in uploads:
+        if isinstance(upload, _SpooledUpload) and not any(upload is k for k in keep):
+            upload.discard()
+
+
+def _build_quick_outputs(df: pd.DataFrame, source_filename: str, lean: bool = False, filters=None):
+    sessions_df, discrepancies_df, summary_df = build_suite_sessions(df, lean=lean, filters=filters)
+    # The Combined sheet is the raw upload; a filtered report leaves it out.
+    return sessions_df, discrepancies_df, summary_df, None if filters else _norm_cols(df)
+
+
+def _build_quick_events(df: pd.DataFrame, source_filename: str, lean: bool = False, filters=None, dedupe: bool = False):
+    """Prepared events (for pairing after the whole batch is in), plus the raw rows for Combined."""
+    with _stage("prepare") as info:
+        events, reader_col = _prepare_reader_events(df, lean=lean, filters=filters)
+        info["rows"] = len(events)
+    events = events[SESSION_KEY_COLS + ["dt", "direction", reader_col]].rename(columns={reader_col: "Reader"})
+    events["Source File"] = source_filename
+    if dedupe:
+        events[ROW_HASH] = _row_hashes(events, QUICK_DEDUPE_COLS)
+    return events, None if filters else _norm_cols(df)
+
+
+def _build_attendance_rows(df: pd.DataFrame, source_filename: str, lean: bool = False, filters=None, dedupe: bool = False):
+    rows_df, combined_df = build_attendance_outputs(df, source_filename, lean=lean, filters=filters)
+    if dedupe:
+        key = combined_df.assign(Day=rows_df["Day"])
+        rows_df = rows_df.assign(**{ROW_HASH: _row_hashes(key, ATTENDANCE_DEDUPE_COLS)})
+    return rows_df, combined_df
+
+
+def _build_occupancy_sessions(df: pd.DataFrame, source_filename: str, lean: bool = False, filters=None, dedupe: bool = False):
+    """Completed sessions of one upload; with `dedupe`, its hashed events instead (paired after _dedupe_masks)."""
+    if dedupe:
+        return _build_quick_events(df, source_filename, lean=lean, filters=filters, dedupe=True)[0]
+    with _stage("prepare") as info:
+        events, _ = _prepare_reader_events(df, lean=lean, filters=filters)
+        info["rows"] = len(events)
+    with _stage("pair") as info:
+        sessions = _occupancy_sessions(events)
+        info["rows"] = len(sessions)
+    return sessions
+
+
+def _pair_occupancy_sessions(events: pd.DataFrame) -> pd.DataFrame:
+    with _stage("pair") as info:
+        sessions = _occupancy_sessions(events)
+        info["rows"] = len(sessions)
+    return sessions
+
+
+def _build_one_file(upload, build, ingest: dict, stage: str, cache_key: str | None = None):
+    """
+    Read and build a single upload. Returns (outcome, stage timings): the
+    outcome is the builder's result, or a file_errors entry ({"file", "stage",
+    "error"}) when a stage fails. Timings are returned rather than recorded so
+    that pool workers report them as well.
+    """
+    with _traced() as trace:
+        outcome = _read_and_build(upload, build, ingest, stage, cache_key)
+    return outcome, trace.stages
+
+
+def _read_and_build(upload, build, ingest: dict, stage: str, cache_key: str | None = None):
+    try:
+        with _stage("read") as info:
+            df = _load_df_cached(upload, ingest, cache_key)
+            info["rows"] = 0 if df is None else len(df)
+    except Exception as e:
+        return {"file": upload.filename, "stage": "read", "error": str(e)}
+
+    if df is None or df.empty:
+        return {"file": upload.filename, "stage": "validate", "error": "Empty file"}
+
+    try:
+        return build(df, upload.filename)
+    except Exception as e:
+        return {"file": upload.filename, "stage": stage, "error": str(e)}
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def _get_parse_pool():
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            # spawn everywhere, not Linux's default fork: the pool starts inside a
+            # request while server, job, sampler and sweeper threads run, and a
+            # forked child can inherit a lock one of them held (logging, _dt_lock).
+            _parse_pool = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _parse_pool
+
+
+def _reset_parse_pool() -> None:
+    global _parse_pool
+    with _parse_pool_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=False, cancel_futures=True)
+        _parse_pool = None
+
+
+def _run_file_builds(files, build, ingest: dict, stage: str, progress=None):
+    """
+    Run _build_one_file for every upload and return [(filename, outcome)] in
+    upload order. Batches of two or more files go to a shared process pool
+    (KASTLE_PARSE_WORKERS); a broken pool falls back to parsing in-process.
+    Large uploads reach the workers as spool file paths (_spool_upload).
+
+    `progress(state, index)` is called with "processing" when a file starts
+    and "done"/"skipped" when its outcome is known.
+    """
+    def report(state, i, outcome=None):
+        if progress is not None:
+            if outcome is not None:
+                state = "skipped" if isinstance(outcome, dict) else "done"
+            progress(state, i)
+
+    trace = _trace_var.get()
+
+    def run_serial(uploads):
+        results = []
+        for i, f in enumerate(uploads):
+            report("processing", i)
+            outcome, stages = _build_one_file(f, build, ingest, stage, keys[i])
+            report(None, i, outcome)
+            results.append((f.filename, outcome))
+            if trace is not None:
+                trace.merge(stages)
+        return results
+
+    for f in files:
+        _rewind(f)  # auto-detection in /process may already have read the first file
+    keys = [_parse_cache_key(f, ingest) for f in files]
+    uploads = []
+    try:
+        if PARSE_WORKERS <= 1 or len(files) <= 1:
+            return run_serial(files)
+
+        uploads = [_spool_upload(f) for f in files]
+        try:
+            pool = _get_parse_pool()
+            futures = []
+            for i, u in enumerate(uploads):
+                report("processing", i)
+                fut = pool.submit(_build_one_file, u, build, ingest, stage, keys[i])
+                if progress is not None:
+                    def on_done(fut, i=i):
+                        if fut.exception() is None:
+                            report(None, i, fut.result()[0])
+                    fut.add_done_callback(on_done)
+                futures.append(fut)
+            results = []
+            for u, fut in zip(uploads, futures):
+                outcome, stages = fut.result()
+                results.append((u.filename, outcome))
+                if trace is not None:
+                    trace.merge(stages)
+            return results
+        except BrokenProcessPool:
+            _reset_parse_pool()
+            return run_serial(uploads)
+    finally:
+        _discard_uploads(uploads, keep=files)
+        if _parse_cache.enabled:
+            _parse_cache.evict()
+
+
+def _parse_cache_key(upload, ingest: dict) -> str | None:
+    """Hash an upload for the parse cache (counting the hit/miss) and rewind it."""
+    if not _parse_cache.enabled:
+        return None
+    key = _parse_cache.key(upload.stream, ingest)
+    _rewind(upload)
+    _parse_cache.lookup(key)
+    return key
+
+
+# -----------------------------
+# Result store
+# -----------------------------
+class _ResultStore:
+    """
+    Finished reports under UPLOAD_FOLDER: a folder per result (see
+    _safe_output_path), plus loose files older versions left there. sweep()
+    deletes entries older than the TTL, then the oldest ones until the rest
+    fit in max_bytes, and spool files a crash left behind. A daemon thread
+    sweeps every `interval` seconds and right after wake().
+    """
+
+    def __init__(self, directory: str, spool_directory: str, ttl_seconds: float, max_bytes: int, interval: float):
+        self.directory = directory
+        self.spool_directory = spool_directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.counters = {"expired": 0, "evicted": 0}
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        """(mtime, bytes, path) per stored result."""
+        try:
+            scan = [e for e in os.scandir(self.directory) if e.path != self.spool_directory]
+        except FileNotFoundError:
+            return []
+        entries = []
+        for e in scan:
+            try:
+                if e.is_dir():
+                    stats = [f.stat() for f in os.scandir(e.path) if f.is_file()]
+                    mtime = max((s.st_mtime for s in stats), default=e.stat().st_mtime)
+                    size = sum(s.st_size for s in stats)
+                else:
+                    stat = e.stat()
+                    mtime, size = stat.st_mtime, stat.st_size
+            except OSError:
+                continue
+            entries.append((mtime, size, e.path))
+        return entries
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+            return True
+        except OSError:
+            return False  # e.g. still being downloaded on Windows; next sweep
+
+    def sweep(self) -> dict:
+        now = time.time()
+        removed = {"expired": 0, "evicted": 0}
+        kept = []
+        for mtime, size, path in sorted(self._entries()):
+            if self.ttl_seconds > 0 and now - mtime > self.ttl_seconds and self._remove(path):
+                removed["expired"] += 1
+            else:
+                kept.append((size, path))
+
+        total = sum(size for size, _ in kept)
+        for size, path in kept:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                total -= size
+                removed["evicted"] += 1
+
+        try:
+            spooled = list(os.scandir(self.spool_directory))
+        except FileNotFoundError:
+            spooled = []
+        for e in spooled:
+            try:
+                stale = self.ttl_seconds > 0 and now - e.stat().st_mtime > self.ttl_seconds
+            except OSError:
+                continue
+            if stale:
+                self._remove(e.path)
+
+        with self.lock:
+            for reason, count in removed.items():
+                self.counters[reason] += count
+        if any(removed.values()):
+            log.info("RESULTS: removed %d expired and %d over quota", removed["expired"], removed["evicted"])
+        return removed
+
+    def stats(self) -> dict:
+        entries = self._entries()
+        with self.lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    def start(self) -> None:
+        with self.lock:
+            if self.thread is not None:
+                return
+            self.thread = threading.Thread(target=self._run, name="result-sweeper", daemon=True)
+            self.thread.start()
+
+    def wake(self) -> None:
+        """Sweep now (a result was just written), starting the thread if needed."""
+        self.start()
+        self.wakeup.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.sweep()
+            except Exception:
+                log.exception("Result sweep failed")
+            self.wakeup.wait(self.interval if self.interval > 0 else None)
+            self.wakeup.clear()
+
+
+_result_store = _ResultStore(
+    UPLOAD_FOLDER, SPOOL_FOLDER, RESULT_TTL_HOURS * 3600, RESULT_QUOTA_MB * 1024 * 1024, RESULT_SWEEP_SECONDS,
+)
+
+
+# -----------------------------
+# Peak memory
+# -----------------------------
+_HAVE_PSUTIL = importlib.util.find_spec("psutil") is not None
+
+
+def _rss_bytes() -> int | None:
+    """
+    Resident memory of this process, or None when it cannot be read. With
+    psutil installed the parse pool's worker processes are included.
+    """
+    if _HAVE_PSUTIL:
+        import psutil
+
+        proc = psutil.Process()
+        total = proc.memory_info().rss
+        for child in proc.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    if os.name == "nt":
+        import ctypes
+        from ctypes import wintypes
+
+        class _Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD)] + [
+                (f, ctypes.c_size_t) for f in (
+                    "PeakWorkingSetSize", "WorkingSetSize", "QuotaPeakPagedPoolUsage", "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage", "QuotaNonPagedPoolUsage", "PagefileUsage", "PeakPagefileUsage",
+                )
+            ]
+
+        kernel32 = ctypes.windll.kernel32
+        kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+        kernel32.K32GetProcessMemoryInfo.argtypes = [wintypes.HANDLE, ctypes.POINTER(_Counters), wintypes.DWORD]
+        counters = _Counters(cb=ctypes.sizeof(_Counters))
+        if kernel32.K32GetProcessMemoryInfo(kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb):
+            return counters.WorkingSetSize
+        return None
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _MemoryWatch:
+    """
+    Context manager that samples _rss_bytes() from a background thread while a
+    report runs. Memory is process-wide, so concurrent requests share peaks.
+    """
+
+    INTERVAL = 0.05  # seconds
+
+    def __init__(self, label: str):
+        self.label = label
+        self.start = None
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start = self.peak = _rss_bytes()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._sample, name="memory-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.INTERVAL):
+            self._record(_rss_bytes())
+
+    def _record(self, rss) -> None:
+        if rss is not None and rss > self.peak:
+            self.peak = rss
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._record(_rss_bytes())
+            log.info("MEM: %s peak %s MB (start %.1f MB)", self.label, self.peak_mb, self.start / 1048576)
+        return False
+
+    @property
+    def peak_mb(self) -> float | None:
+        return None if self.peak is None else round(self.peak / 1048576, 1)
+
+
+# -----------------------------
+# Stage timing and metrics
+# -----------------------------
+# Add a Server-Timing header with the stage breakdown to report downloads.
+SERVER_TIMING = os.environ.get("KASTLE_SERVER_TIMING", "0") == "1"
+TIMING_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+METRICS = {
+    # name: (type, help)
+    "kastle_requests_total": ("counter", "Report requests by report type and outcome."),
+    "kastle_request_seconds": ("histogram", "Wall time of report requests."),
+    "kastle_stage_seconds": ("histogram", "Time per processing stage, summed over the files of a request."),
+    "kastle_stage_rows_total": ("counter", "Rows produced by each processing stage."),
+    "kastle_request_peak_memory_bytes": ("gauge", "Peak resident memory of the last report request."),
+    "kastle_parse_cache_events_total": ("counter", "Parse cache hits/misses/evictions in this process."),
+    "kastle_parse_cache_bytes": ("gauge", "Bytes held by the parse cache directory."),
+    "kastle_dt_rows_total": ("counter", "Timestamp rows parsed in this process, by path."),
+    "kastle_jobs": ("gauge", "Background jobs currently held, by status."),
+    "kastle_requests_in_progress": ("gauge", "Report requests holding a concurrency slot."),
+    "kastle_requests_rejected_total": ("counter", "Report requests turned away because every slot was busy."),
+    "kastle_result_store_bytes": ("gauge", "Bytes of finished reports kept under uploads/."),
+    "kastle_result_store_removals_total": ("counter", "Finished reports deleted by the result sweep, by reason."),
+}
+
+
+class _Trace:
+    """Stage timings for one request: {stage: [seconds, rows]}, summed across files."""
+
+    def __init__(self):
+        self.stages: dict[str, list] = {}
+        # Per-file outcomes of the reports that finished under this trace.
+        self.skipped_files: list[str] = []
+        self.duplicate_rows: dict[str, int] = {}
+        self.already_imported_rows: dict[str, int] = {}
+
+    def note_files(self, skipped_files: list[str], duplicate_rows: dict[str, int],
+                   already_imported_rows: dict[str, int] | None = None) -> None:
+        self.skipped_files.extend(f for f in skipped_files if f not in self.skipped_files)
+        for counts, rows in ((self.duplicate_rows, duplicate_rows), (self.already_imported_rows, already_imported_rows or {})):
+            for filename, n in rows.items():
+                counts[filename] = counts.get(filename, 0) + n
+
+    def add(self, stage: str, seconds: float, rows: int | None = None) -> None:
+        totals = self.stages.setdefault(stage, [0.0, 0])
+        totals[0] += seconds
+        totals[1] += rows or 0
+
+    def merge(self, stages: dict) -> None:
+        for stage, (seconds, rows) in stages.items():
+            self.add(stage, seconds, rows)
+
+    def view(self) -> dict:
+        return {stage: {"seconds": round(s, 4), "rows": r} for stage, (s, r) in self.stages.items()}
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={s * 1000:.1f}" for stage, (s, _) in self.stages.items())
+
+
+_trace_var: contextvars.ContextVar = contextvars.ContextVar("kastle_trace", default=None)
+
+
+@contextmanager
+def _stage(name: str):
+    """
+    Time a block into the current request's _Trace (no-op outside a request).
+    Set `info["rows"]` inside the block to record the stage's row count.
+    """
+    trace = _trace_var.get()
+    info = {"rows": None}
+    t0 = time.perf_counter()
+    try:
+        yield info
+    finally:
+        if trace is not None:
+            trace.add(name, time.perf_counter() - t0, info["rows"])
+
+
+def _note_files(skipped_files: list[str], duplicate_rows: dict[str, int],
+                already_imported_rows: dict[str, int] | None = None) -> None:
+    """Record a report's skipped files and dropped rows on the current _Trace (job status shows them)."""
+    trace = _trace_var.get()
+    if trace is not None:
+        trace.note_files(skipped_files, duplicate_rows, already_imported_rows)
+
+
+@contextmanager
+def _traced():
+    """Run a block with a fresh _Trace as the current one; yields it."""
+    trace = _Trace()
+    token = _trace_var.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace_var.reset(token)
+
+
+class _Metrics:
+    """In-process counters, gauges and histograms rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values: dict[tuple, float] = {}
+        self.histograms: dict[tuple, list] = {}
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted(labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = self._key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        with self.lock:
+            self.values[self._key(name, labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self.lock:
+            hist = self.histograms.setdefault(key, [[0] * len(TIMING_BUCKETS), 0.0, 0])
+            for i, bound in enumerate(TIMING_BUCKETS):
+                if value <= bound:
+                    hist[0][i] += 1
+            hist[1] += value
+            hist[2] += 1
+
+    def record(self, report: str, outcome: str, seconds: float, trace: _Trace, mem) -> None:
+        """Fold one finished request into the metrics."""
+        self.inc("kastle_requests_total", report=report, outcome=outcome)
+        self.observe("kastle_request_seconds", seconds, report=report)
+        for stage, (stage_seconds, rows) in trace.stages.items():
+            self.observe("kastle_stage_seconds", stage_seconds, report=report, stage=stage)
+            self.inc("kastle_stage_rows_total", rows, report=report, stage=stage)
+        if mem.peak is not None:
+            self.set("kastle_request_peak_memory_bytes", mem.peak, report=report)
+
+    def render(self) -> str:
+        # Gauges read from the other subsystems at scrape time.
+        cache = _parse_cache.stats()
+        for event in ("hits", "misses", "evictions"):
+            self.set("kastle_parse_cache_events_total", cache[event], event=event)
+        self.set("kastle_parse_cache_bytes", cache["bytes"])
+        results = _result_store.stats()
+        self.set("kastle_result_store_bytes", results["bytes"])
+        for reason in ("expired", "evicted"):
+            self.set("kastle_result_store_removals_total", results[reason], reason=reason)
+        with _dt_lock:
+            dt_rows = dict(_dt_counters)
+        self.set("kastle_dt_rows_total", dt_rows["rows"] - dt_rows["fallback_rows"], path="format")
+        self.set("kastle_dt_rows_total", dt_rows["fallback_rows"], path="fallback")
+        with _jobs_lock:
+            statuses = [j["status"] for j in _jobs.values()]
+        for status in ("queued", "running", "done", "failed"):
+            self.set("kastle_jobs", statuses.count(status), status=status)
+
+        def fmt_labels(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+        with self.lock:
+            values = dict(self.values)
+            histograms = {k: (list(h[0]), h[1], h[2]) for k, h in self.histograms.items()}
+
+        lines = []
+        for name, (kind, help_text) in METRICS.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "histogram":
+                for (hname, labels), (buckets, total, count) in sorted(histograms.items()):
+                    if hname != name:
+                        continue
+                    for bound, n in zip(TIMING_BUCKETS, buckets):
+                        lines.append(f"{name}_bucket{fmt_labels(labels, [('le', bound)])} {n}")
+                    lines.append(f"{name}_bucket{fmt_labels(labels, [('le', '+Inf')])} {count}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {total}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {count}")
+            else:
+                for (vname, labels), value in sorted(values.items()):
+                    if vname == name:
+                        lines.append(f"{name}{fmt_labels(labels)} {int(value) if float(value).is_integer() else value}")
+        return "\n".join(lines) + "\n"
+
+
+_metrics = _Metrics()
+
+
+class _RequestTrace:
+    """
+    Instrument one report request: stage timings (via _stage), wall time and
+    peak memory. Call finish(outcome) once the result is known.
+    """
+
+    def __init__(self, report: str, label: str):
+        self.report = report
+        self.trace = _Trace()
+        self.mem = _MemoryWatch(label)
+        self.seconds = None
+
+    def __enter__(self):
+        self._token = _trace_var.set(self.trace)
+        self.mem.__enter__()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._t0
+        self.mem.__exit__(*exc)
+        _trace_var.reset(self._token)
+        return False
+
+    def finish(self, outcome: str) -> None:
+        _metrics.record(self.report, outcome, self.seconds, self.trace, self.mem)
+        log.debug("TIMING: %s %s %.3fs %s", self.report, outcome, self.seconds, self.trace.server_timing())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return _metrics.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
 # -----------------------------
 # Processors
 # -----------------------------
-def _process_attendance(files, output_name):
-    output_path = _safe_output_path(output_name, "Attendance_Output.xlsx")
+def _process_attendance(files, output_name, progress=None, options=None):
+    err = _options_error(options, "attendance")
+    if err:
+        return None, err
+    ext = OUTPUT_FORMATS[(options or {}).get("output_format") or "xlsx"][0]
+    output_path = _safe_output_path(output_name, "Attendance_Output.xlsx", ext)
 
-    summary_frames = []
+    row_frames = []
     combined_frames = []
     skipped_files = []
     file_errors = []
 
-    for f in files:
-        try:
-            df = _load_df(f)
-        except Exception as e:
-            skipped_files.append(f.filename)
-            file_errors.append({"file": f.filename, "stage": "read", "error": str(e)})
+    lean = bool((options or {}).get("low_memory"))
+    query = (options or {}).get("query")
+    dedupe = bool((options or {}).get("dedupe"))
+    build = partial(_build_attendance_rows, lean=lean, filters=(options or {}).get("filters"), dedupe=dedupe)
+    ingest = _ingest_kwargs(ATTENDANCE_COLUMNS, lean)
+    parts = []
+    for filename, outcome in _run_file_builds(files, build, ingest, "attendance", progress):
+        if isinstance(outcome, dict):
+            skipped_files.append(filename)
+            file_errors.append(outcome)
             continue
+        parts.append((filename, *outcome))
 
-        if df is None or df.empty:
-            skipped_files.append(f.filename)
-            file_errors.append({"file": f.filename, "stage": "validate", "error": "Empty file"})
-            continue
+    duplicate_rows = {}
+    if dedupe and parts:
+        masks, duplicate_rows = _dedupe_masks([(filename, r_df) for filename, r_df, _ in parts])
+        parts = [(filename, r_df[keep].drop(columns=ROW_HASH), c_df[keep]) for (filename, r_df, c_df), keep in zip(parts, masks)]
 
-        try:
-            s_df, c_df = build_attendance_outputs(df, f.filename)
-            if not s_df.empty:
-                summary_frames.append(s_df)
-            if c_df is not None and not c_df.empty:
-                combined_frames.append(c_df)
-        except Exception as e:
-            skipped_files.append(f.filename)
-            file_errors.append({"file": f.filename, "stage": "attendance", "error": str(e)})
-            continue
+    for _, r_df, c_df in parts:
+        if not r_df.empty:
+            row_frames.append(r_df)
+        if c_df is not None and not c_df.empty:
+            combined_frames.append(c_df)
+    del parts
 
-    if not summary_frames:
+    if not row_frames:
         return None, {
             "error": "No valid data processed",
             "skipped_files": skipped_files,
+            "duplicate_rows": duplicate_rows,
             "file_errors": file_errors
         }
 
-    summary_df = pd.concat(summary_frames, ignore_index=True)
-    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
-        summary_df.to_excel(writer, sheet_name="Summary", index=False)
+    with _stage("aggregate") as info:
+        rows = _concat_chunks(row_frames)
+        del row_frames
+        summary_df = _attendance_summary(rows, ["Employee"])
+        per_file = (options or {}).get("per_file") if query is None else _query_table("attendance", query) == "Per File"
+        per_file_df = _attendance_summary(rows, ["Source File", "Employee"]) if per_file else None
+        del rows
+        info["rows"] = len(summary_df)
+
+    def sheets(per_person=True):
+        yield "Summary", summary_df
+        if per_file_df is not None:
+            yield "Per File", per_file_df
         if combined_frames:
-            pd.concat(combined_frames, ignore_index=True).to_excel(writer, sheet_name="Combined", index=False)
+            yield "Combined", _concat_chunks(combined_frames)
 
-    return output_path, None
+    _note_files(skipped_files, duplicate_rows)
+    if query is not None:
+        return _query_result("attendance", query, sheets, file_errors, duplicate_rows), None
+    return _emit_report(output_path, sheets, options, progress, xlsx_writer=_write_workbook_pandas)
 
 
-def _process_quick(files, output_name):
-    output_path = _safe_output_path(output_name, "Quick_Custom_Output.xlsx")
+def _process_quick(files, output_name, progress=None, options=None):
+    """
+    Suite Sessions report. With options["incremental"], events from all files
+    are paired together against the persistent session store, so sessions
+    spanning exports close correctly and still-open entries carry forward.
+    """
+    err = _options_error(options, "quick")
+    if err:
+        return None, err
+    ext = OUTPUT_FORMATS[(options or {}).get("output_format") or "xlsx"][0]
+    output_path = _safe_output_path(output_name, "Quick_Custom_Output.xlsx", ext)
+    incremental = bool((options or {}).get("incremental"))
 
     all_sessions = []
     all_discrepancies = []
@@ -428,151 +2661,836 @@ def _process_quick(files, output_name):
     per_person_issues: dict[str, list[pd.DataFrame]] = {}
     per_person_summary: dict[str, list[pd.DataFrame]] = {}
 
-    for f in files:
-        try:
-            df = _load_df(f)
-        except Exception as e:
-            skipped_files.append(f.filename)
-            file_errors.append({"file": f.filename, "stage": "read", "error": str(e)})
-            continue
-
-        if df is None or df.empty:
-            skipped_files.append(f.filename)
-            file_errors.append({"file": f.filename, "stage": "validate", "error": "Empty file"})
+    lean = bool((options or {}).get("low_memory"))
+    filters = (options or {}).get("filters")
+    query = (options or {}).get("query")
+    dedupe = bool((options or {}).get("dedupe"))
+
+    def add_part(source, sessions_df, discrepancies_df, summary_df):
+        # Overall sheets (`source` is None when rows already carry Source File)
+        if source is not None:
+            sessions_df.insert(0, "Source File", _constant_column(source, len(sessions_df), lean))
+        all_sessions.append(sessions_df)
+
+        if not discrepancies_df.empty:
+            if source is not None:
+                discrepancies_df.insert(0, "Source File", _constant_column(source, len(discrepancies_df), lean))
+            all_discrepancies.append(discrepancies_df)
+
+        if not summary_df.empty:
+            if source is not None:
+                summary_df.insert(0, "Source File", _constant_column(source, len(summary_df), lean))
+            all_summaries.append(summary_df)
+
+        if query is not None:
+            return
+
+        # ✅ Split into per-person tabs (names were cleaned by _pair_events)
+        for person, chunk in sessions_df.groupby("Personnel Name", dropna=False, observed=True):
+            per_person_sessions.setdefault(person, []).append(chunk)
+
+        if not discrepancies_df.empty:
+            for person, chunk in discrepancies_df.groupby("Personnel Name", dropna=False, observed=True):
+                per_person_issues.setdefault(person, []).append(chunk)
+
+        if not summary_df.empty:
+            for person, chunk in summary_df.groupby("Personnel Name", dropna=False, observed=True):
+                per_person_summary.setdefault(person, []).append(chunk)
+
+    # Without dedupe every file is paired in its worker; with it (and for
+    # incremental runs) workers only prepare events, which are paired here
+    # once the whole batch is in.
+    if incremental:
+        build = partial(_build_quick_events, dedupe=dedupe)
+    elif dedupe:
+        build = partial(_build_quick_events, lean=lean, filters=filters, dedupe=True)
+    else:
+        build = partial(_build_quick_outputs, lean=lean, filters=filters)
+    ingest = _ingest_kwargs(QUICK_COLUMNS, lean)
+    event_frames = []
+    for filename, outcome in _run_file_builds(files, build, ingest, "quick", progress):
+        if isinstance(outcome, dict):
+            skipped_files.append(filename)
+            file_errors.append(outcome)
             continue
 
         try:
-            sessions_df, discrepancies_df, summary_df = build_suite_sessions(df)
-
-            # Overall sheets
-            sessions_df.insert(0, "Source File", f.filename)
-            all_sessions.append(sessions_df)
-
-            if not discrepancies_df.empty:
-                discrepancies_df.insert(0, "Source File", f.filename)
-                all_discrepancies.append(discrepancies_df)
-
-            if not summary_df.empty:
-                summary_df.insert(0, "Source File", f.filename)
-                all_summaries.append(summary_df)
-
-            df2 = _norm_cols(df).copy()
-            df2.insert(0, "Source File", f.filename)
-            combined_frames.append(df2)
-
-            # ✅ Split into per-person tabs
-            sessions_df["Personnel Name"] = sessions_df["Personnel Name"].astype(str).str.strip().replace("", "Unknown")
+            *results, df2 = outcome
+            if incremental or dedupe:
+                event_frames.append((filename, results[0]))
+            else:
+                add_part(filename, *results)
 
-            for person, chunk in sessions_df.groupby("Personnel Name", dropna=False):
-                per_person_sessions.setdefault(person, []).append(chunk)
+            if df2 is not None:
+                df2.insert(0, "Source File", _constant_column(filename, len(df2), lean))
+                combined_frames.append(df2)
 
-            if not discrepancies_df.empty:
-                discrepancies_df["Personnel Name"] = discrepancies_df["Personnel Name"].astype(str).str.strip().replace("", "Unknown")
-                for person, chunk in discrepancies_df.groupby("Personnel Name", dropna=False):
-                    per_person_issues.setdefault(person, []).append(chunk)
+        except Exception as e:
+            skipped_files.append(filename)
+            file_errors.append({"file": filename, "stage": "quick", "error": str(e)})
+            continue
 
-            if not summary_df.empty:
-                summary_df["Personnel Name"] = summary_df["Personnel Name"].astype(str).str.strip().replace("", "Unknown")
-                for person, chunk in summary_df.groupby("Personnel Name", dropna=False):
-                    per_person_summary.setdefault(person, []).append(chunk)
+    duplicate_rows = {}
+    if dedupe and event_frames:
+        masks, duplicate_rows = _dedupe_masks(event_frames)
+        event_frames = [(filename, events[keep].drop(columns=ROW_HASH)) for (filename, events), keep in zip(event_frames, masks)]
 
+    if not incremental:
+        for filename, events in event_frames:
+            if events.empty:
+                continue  # every event was already in an earlier file
+            try:
+                with _stage("pair") as info:
+                    sessions_df = _pair_sessions(events, "Reader")
+                    info["rows"] = len(sessions_df)
+                with _stage("aggregate") as info:
+                    outputs = _session_outputs(sessions_df)
+                    info["rows"] = len(outputs[2])
+                add_part(filename, *outputs)
+            except Exception as e:
+                skipped_files.append(filename)
+                file_errors.append({"file": filename, "stage": "quick", "error": str(e)})
+
+    open_entries = None
+    already_imported_rows = {}
+    if incremental and event_frames:
+        try:
+            with _stage("session_store") as info:
+                sessions_df, already_imported_rows = _session_store.pair(pd.concat([events for _, events in event_frames], ignore_index=True))
+                info["rows"] = 0 if sessions_df is None else len(sessions_df)
         except Exception as e:
-            skipped_files.append(f.filename)
-            file_errors.append({"file": f.filename, "stage": "quick", "error": str(e)})
-            continue
+            return None, {
+                "error": "Session store update failed",
+                "details": str(e),
+                "skipped_files": skipped_files,
+                "duplicate_rows": duplicate_rows,
+                "file_errors": file_errors
+            }
+        if already_imported_rows:
+            log.info("Session store: dropped events at or before the stored state: %s", already_imported_rows)
+        if sessions_df is None:
+            return None, {
+                "error": "No new events: every uploaded event is already in the session store",
+                "skipped_files": skipped_files,
+                "duplicate_rows": duplicate_rows,
+                "already_imported_rows": already_imported_rows,
+                "file_errors": file_errors
+            }
+        with _stage("aggregate") as info:
+            outputs = _session_outputs(sessions_df)
+            info["rows"] = len(outputs[2])
+        add_part(None, *outputs)
+        open_entries = _session_store.open_entries()
 
     if not all_sessions:
         return None, {
             "error": "No valid data processed",
             "skipped_files": skipped_files,
+            "duplicate_rows": duplicate_rows,
             "file_errors": file_errors
         }
 
-    used = set()
-
-    with pd.ExcelWriter(output_path, engine="openpyxl") as writer:
+    def sheets(per_person=True):
         # Overall
-        pd.concat(all_sessions, ignore_index=True).to_excel(writer, sheet_name="Suite Sessions", index=False)
+        yield "Suite Sessions", _concat_chunks(all_sessions)
         if all_discrepancies:
-            pd.concat(all_discrepancies, ignore_index=True).to_excel(writer, sheet_name="Suite Discrepancies", index=False)
+            yield "Suite Discrepancies", _concat_chunks(all_discrepancies)
         if all_summaries:
-            pd.concat(all_summaries, ignore_index=True).to_excel(writer, sheet_name="Suite Summary", index=False)
+            yield "Suite Summary", _concat_chunks(all_summaries)
         if combined_frames:
-            pd.concat(combined_frames, ignore_index=True).to_excel(writer, sheet_name="Combined", index=False)
+            yield "Combined", _concat_chunks(combined_frames)
+        if open_entries is not None:
+            yield "Open Entries", open_entries
+
+        if not per_person:
+            return
 
         # Per-person tabs
+        used = set()
         for person in sorted(per_person_sessions.keys(), key=lambda x: str(x).lower()):
             safe_person = _excel_sheet_safe(str(person), fallback="Unknown")
 
             sess_name = _unique_sheet_name(f"{safe_person} - Sessions", used)
-            pd.concat(per_person_sessions[person], ignore_index=True).to_excel(writer, sheet_name=sess_name, index=False)
+            yield sess_name, pd.concat(per_person_sessions[person], ignore_index=True)
 
             if person in per_person_issues and per_person_issues[person]:
                 iss_name = _unique_sheet_name(f"{safe_person} - Issues", used)
-                pd.concat(per_person_issues[person], ignore_index=True).to_excel(writer, sheet_name=iss_name, index=False)
+                yield iss_name, pd.concat(per_person_issues[person], ignore_index=True)
 
             if person in per_person_summary and per_person_summary[person]:
                 sum_name = _unique_sheet_name(f"{safe_person} - Summary", used)
-                pd.concat(per_person_summary[person], ignore_index=True).to_excel(writer, sheet_name=sum_name, index=False)
+                yield sum_name, pd.concat(per_person_summary[person], ignore_index=True)
+
+    _note_files(skipped_files, duplicate_rows, already_imported_rows)
+    if query is not None:
+        return _query_result("quick", query, sheets, file_errors, duplicate_rows), None
+    return _emit_report(output_path, sheets, options, progress)
+
 
+def _process_occupancy(files, output_name, progress=None, options=None):
+    """
+    Suite Occupancy report: completed sessions from every file (paired per
+    file, as in the Suite Sessions report) swept together per suite in
+    options["interval"]-minute buckets (see build_suite_occupancy).
+    """
+    err = _options_error(options, "occupancy")
+    if err:
+        return None, err
+    ext = OUTPUT_FORMATS[(options or {}).get("output_format") or "xlsx"][0]
+    output_path = _safe_output_path(output_name, "Suite_Occupancy_Output.xlsx", ext)
+
+    skipped_files = []
+    file_errors = []
+
+    lean = bool((options or {}).get("low_memory"))
+    query = (options or {}).get("query")
+    interval = int((options or {}).get("interval") or OCCUPANCY_INTERVAL_MINUTES)
+    dedupe = bool((options or {}).get("dedupe"))
+    build = partial(_build_occupancy_sessions, lean=lean, filters=(options or {}).get("filters"), dedupe=dedupe)
+    ingest = _ingest_kwargs(QUICK_COLUMNS, lean)
+    parts = []
+    for filename, outcome in _run_file_builds(files, build, ingest, "occupancy", progress):
+        if isinstance(outcome, dict):
+            skipped_files.append(filename)
+            file_errors.append(outcome)
+            continue
+        parts.append((filename, outcome))
+
+    duplicate_rows = {}
+    if dedupe and parts:
+        # Outcomes are hashed events here; pair what is left of each file.
+        masks, duplicate_rows = _dedupe_masks(parts)
+        parts = [(filename, _pair_occupancy_sessions(events[keep])) for (filename, events), keep in zip(parts, masks)]
+    session_frames = [sessions for _, sessions in parts if not sessions.empty]
+    del parts
+
+    if not session_frames:
+        return None, {
+            "error": "No completed sessions to measure occupancy from" if not file_errors else "No valid data processed",
+            "skipped_files": skipped_files,
+            "duplicate_rows": duplicate_rows,
+            "file_errors": file_errors
+        }
+
+    occupancy_df, peaks_df = build_suite_occupancy(_concat_chunks(session_frames), interval)
+    del session_frames
+    if occupancy_df.empty:
+        return None, {
+            "error": "No completed sessions to measure occupancy from",
+            "details": "Every session is shorter than a second",
+            "skipped_files": skipped_files,
+            "duplicate_rows": duplicate_rows,
+            "file_errors": file_errors
+        }
+
+    def sheets(per_person=True):
+        yield "Suite Occupancy", occupancy_df
+        yield "Suite Peaks", peaks_df
+
+    _note_files(skipped_files, duplicate_rows)
+    if query is not None:
+        return _query_result("occupancy", query, sheets, file_errors, duplicate_rows), None
+    return _emit_report(output_path, sheets, options, progress)
+
+
+def _report_options(form, accept=None) -> dict:
+    """
+    Processing options shared by /process* and /jobs* (multipart form fields;
+    the Accept header picks the output format when the form does not).
+    """
+    def flag(name, default=False):
+        value = (form.get(name) or "").strip().lower()
+        return value in ("1", "true", "yes", "on") if value else default
+
+    return {
+        "incremental": flag("incremental"),
+        "per_file": flag("per_file"),
+        "low_memory": flag("low_memory", LOW_MEMORY),
+        "dedupe": flag("dedupe", DEDUPE),
+        "output_format": _output_format(form, accept),
+        "filters": _RowFilter.from_form(form),
+        "interval": (form.get("interval") or "").strip() or None,
+    }
+
+
+REPORT_PROCESSORS = {
+    "attendance": ("Attendance", _process_attendance),
+    "quick": ("Suite Sessions", _process_quick),
+    "occupancy": ("Suite Occupancy", _process_occupancy),
+}
+
+
+def _process_report(report_type: str, files, output_name, progress=None, options=None):
+    """
+    Dispatch to a processor by report_type. Without one, each file's type is
+    sniffed from its header row and the files are routed to their processors;
+    a mixed batch produces one report per type, bundled in a zip.
+    """
+    if report_type in REPORT_PROCESSORS:
+        return REPORT_PROCESSORS[report_type][1](files, output_name, progress, options)
+
+    with _stage("detect") as info:
+        kinds = [_sniff_report_type(f) for f in files]
+        info["rows"] = len(files)
+    known = [k for k in kinds if k is not None]
+    if not known:
+        return None, {"error": "Could not read uploaded file", "details": "No file has a readable header row"}
+    # Unreadable files go along with the first readable one; its processor
+    # reports them in file_errors.
+    kinds = [k or known[0] for k in kinds]
+    groups = {kind: [i for i, k in enumerate(kinds) if k == kind] for kind in dict.fromkeys(kinds)}
+    if len(groups) == 1:
+        return REPORT_PROCESSORS[kinds[0]][1](files, output_name, progress, options)
+
+    log.info("Mixed upload routed per file: %s", {k: len(v) for k, v in groups.items()})
+    return _process_mixed(groups, files, output_name, progress, options)
+
+
+def _remap_progress(progress, indexes: list[int], state, index=None) -> None:
+    # File indexes within one group back to positions in the whole upload.
+    progress(state, None if index is None else indexes[index])
+
+
+def _process_mixed(groups: dict[str, list[int]], files, output_name, progress=None, options=None):
+    """Run each report type on its own files and zip the reports (plus errors.json for any that failed)."""
+    import json
+    import zipfile
+
+    err = _options_error(options)
+    if err:
+        return None, err
+    if (options or {}).get("query") is not None:
+        return None, {"error": "A query needs files of a single report type", "report_types": {k: len(v) for k, v in groups.items()}}
+    # Each part is written to disk so it can go into the bundle.
+    options = {**(options or {}), "stream": False}
+    root = os.path.splitext((output_name or "").strip() or "Report_Output")[0]
+
+    parts, errors = [], {}
+    for kind, indexes in groups.items():
+        label, processor = REPORT_PROCESSORS[kind]
+        part_progress = partial(_remap_progress, progress, indexes) if progress else None
+        path, part_err = processor([files[i] for i in indexes], f"{root} - {label}", part_progress, options)
+        if part_err:
+            errors[label] = part_err
+        else:
+            parts.append(path)
+
+    if not parts:
+        return None, {
+            "error": "No valid data processed",
+            "skipped_files": [f for e in errors.values() for f in e.get("skipped_files", [])],
+            "file_errors": [f for e in errors.values() for f in e.get("file_errors", [])],
+        }
+
+    for part_err in errors.values():
+        _note_files(part_err.get("skipped_files", []), part_err.get("duplicate_rows", {}), part_err.get("already_imported_rows"))
+    output_path = _safe_output_path(root, "Report_Output", ".zip")
+    os.makedirs(os.path.dirname(output_path))
+    try:
+        with _stage("write"):
+            with zipfile.ZipFile(output_path, "w", compression=zipfile.ZIP_STORED) as zf:
+                for path in parts:
+                    zf.write(path, os.path.basename(path))
+                if errors:
+                    zf.writestr("errors.json", json.dumps(errors, indent=2, default=str))
+    finally:
+        for path in parts:
+            _discard_output(path)
+    _result_store.wake()
     return output_path, None
 
 
+# -----------------------------
+# Queries
+# -----------------------------
+# /query returns one report table as JSON instead of a file. Table names per
+# report type map to the sheet they come from; the first is the default.
+QUERY_TABLES = {
+    "quick": {"sessions": "Suite Sessions", "discrepancies": "Suite Discrepancies", "summary": "Suite Summary"},
+    "attendance": {"summary": "Summary", "per_file": "Per File", "rows": "Combined"},
+    "occupancy": {"occupancy": "Suite Occupancy", "peaks": "Suite Peaks"},
+}
+# Rows returned when the request has no (or a larger) limit.
+QUERY_LIMIT = int(os.environ.get("KASTLE_QUERY_LIMIT", "10000"))
+
+
+def _query_table(report_type: str, query: str) -> str:
+    tables = QUERY_TABLES[report_type]
+    return tables.get(query) or next(iter(tables.values()))
+
+
+def _query_result(report_type: str, query: str, sheets, file_errors: list, duplicate_rows: dict | None = None) -> dict:
+    """
+    Pull the queried table out of a processor's sheets. Sheets are built
+    lazily, so the ones after it (the Combined concat, per-person tabs) are
+    never materialized. A table the report has no rows for comes back None.
+    """
+    wanted = _query_table(report_type, query)
+    frame = None
+    with _stage("query") as info:
+        for sheet_name, df in sheets(per_person=False):
+            if sheet_name == wanted:
+                frame = df
+                break
+        info["rows"] = 0 if frame is None else len(frame)
+    table = next(k for k, v in QUERY_TABLES[report_type].items() if v == wanted)
+    return {"report_type": report_type, "table": table, "frame": frame, "file_errors": file_errors, "duplicate_rows": duplicate_rows or {}}
+
+
+# -----------------------------
+# Request limits
+# -----------------------------
+# Report requests run in at most MAX_CONCURRENT slots (background jobs have
+# their own JOB_WORKERS). A request waits up to QUEUE_WAIT seconds for a slot,
+# then gets a 503 with Retry-After instead of piling up behind the others.
+MAX_CONCURRENT = int(os.environ.get("KASTLE_MAX_CONCURRENT", "0")) or max(2, min(4, os.cpu_count() or 1))
+QUEUE_WAIT = float(os.environ.get("KASTLE_QUEUE_WAIT", "5"))
+
+_request_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+
+
+def _limited(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not _request_slots.acquire(timeout=QUEUE_WAIT):
+            _metrics.inc("kastle_requests_rejected_total")
+            log.warning("BUSY: rejected %s, %d report requests already running", request.path, MAX_CONCURRENT)
+            body = {
+                "error": "Server is busy with other reports, try again shortly",
+                "max_concurrent": MAX_CONCURRENT,
+            }
+            return jsonify(body), 503, {"Retry-After": str(max(1, round(QUEUE_WAIT)))}
+        _metrics.inc("kastle_requests_in_progress")
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _metrics.inc("kastle_requests_in_progress", -1)
+            _request_slots.release()
+    return wrapper
+
+
 # -----------------------------
 # Endpoints
 # -----------------------------
+def _request_options() -> dict:
+    # Synchronous requests may stream NDJSON straight into the response.
+    return {**_report_options(request.form, request.accept_mimetypes), "stream": True}
+
+
+def _uploaded_files():
+    """request.files["files"], or None when nothing was uploaded. Parsing the multipart body is the "upload" stage."""
+    with _stage("upload") as info:
+        files = request.files.getlist("files")
+        info["rows"] = len(files)
+    return files or None
+
+
+def _report_response(output, err, rt: _RequestTrace):
+    """
+    Send the finished report file (or the error JSON) with the request's peak
+    memory and timings. `output` is a path, or a _ReportStream whose rows are
+    produced while the response is sent.
+    """
+    rt.finish("error" if err else "ok")
+    peak_mb = rt.mem.peak_mb
+    if err:
+        if peak_mb is not None:
+            err = {**err, "peak_memory_mb": peak_mb}
+        return jsonify(err), 400
+    if isinstance(output, _ReportStream):
+        response = Response(output, mimetype=output.mimetype)
+        response.headers["Content-Disposition"] = f'attachment; filename="{output.filename}"'
+    else:
+        response = send_file(output, as_attachment=True)
+        # The result is only ever downloaded once; drop it after sending.
+        # (call_on_close is skipped for send_file's passthrough body.)
+        response.response = ClosingIterator(response.response, partial(_discard_output, output))
+    if peak_mb is not None:
+        response.headers["X-Peak-Memory-MB"] = str(peak_mb)
+    if "dedupe" in rt.trace.stages:
+        response.headers["X-Duplicate-Rows"] = str(rt.trace.stages["dedupe"][1])
+    if "session_store" in rt.trace.stages:
+        response.headers["X-Already-Imported-Rows"] = str(sum(rt.trace.already_imported_rows.values()))
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = rt.trace.server_timing()
+    return response
+
+
 @app.route("/process/attendance", methods=["POST"])
 @app.route("/process/attendance/", methods=["POST"])
+@_limited
 def process_attendance():
-    if "files" not in request.files:
-        return jsonify({"error": "No files uploaded"}), 400
-    files = request.files.getlist("files")
-    output_path, err = _process_attendance(files, request.form.get("output_name"))
-    if err:
-        return jsonify(err), 400
-    return send_file(output_path, as_attachment=True)
+    with _RequestTrace("attendance", request.path) as rt:
+        files = _uploaded_files()
+        if files is None:
+            output_path, err = None, {"error": "No files uploaded"}
+        else:
+            output_path, err = _process_attendance(files, request.form.get("output_name"), options=_request_options())
+    return _report_response(output_path, err, rt)
 
 
 @app.route("/process/quick", methods=["POST"])
 @app.route("/process/quick/", methods=["POST"])
+@_limited
 def process_quick():
-    if "files" not in request.files:
-        return jsonify({"error": "No files uploaded"}), 400
-    files = request.files.getlist("files")
-    output_path, err = _process_quick(files, request.form.get("output_name"))
-    if err:
-        return jsonify(err), 400
-    return send_file(output_path, as_attachment=True)
+    with _RequestTrace("quick", request.path) as rt:
+        files = _uploaded_files()
+        if files is None:
+            output_path, err = None, {"error": "No files uploaded"}
+        else:
+            output_path, err = _process_quick(files, request.form.get("output_name"), options=_request_options())
+    return _report_response(output_path, err, rt)
+
+
+@app.route("/process/occupancy", methods=["POST"])
+@app.route("/process/occupancy/", methods=["POST"])
+@_limited
+def process_occupancy():
+    with _RequestTrace("occupancy", request.path) as rt:
+        files = _uploaded_files()
+        if files is None:
+            output_path, err = None, {"error": "No files uploaded"}
+        else:
+            output_path, err = _process_occupancy(files, request.form.get("output_name"), options=_request_options())
+    return _report_response(output_path, err, rt)
 
 
 @app.route("/process", methods=["POST"])
 @app.route("/process/", methods=["POST"])
+@_limited
 def process_compat():
-    if "files" not in request.files:
-        return jsonify({"error": "No files uploaded"}), 400
-
     report_type = (request.form.get("report_type") or "").strip().lower()
-    files = request.files.getlist("files")
+    with _RequestTrace(report_type or "auto", request.path) as rt:
+        files = _uploaded_files()
+        if files is None:
+            output_path, err = None, {"error": "No files uploaded"}
+        else:
+            output_path, err = _process_report(report_type, files, request.form.get("output_name"), options=_request_options())
+    return _report_response(output_path, err, rt)
+
+
+def _query_response(report_type: str):
+    """
+    Run a report with the request's filters and return one table as JSON:
+
+        {"report_type", "table", "columns", "rows", "row_count", "truncated", "duplicate_rows", "file_errors"}
+
+    Form fields are those of /process (files, start, end, people, suites, ...)
+    plus `table` (see QUERY_TABLES) and `limit` (rows, at most KASTLE_QUERY_LIMIT).
+    Filters that match nothing give 200 with no rows; nothing is written to disk.
+    """
+    import json
+
+    try:
+        limit = min(int(request.form.get("limit") or QUERY_LIMIT), QUERY_LIMIT)
+    except ValueError:
+        return jsonify({"error": "limit must be a whole number"}), 400
+    if limit < 0:
+        return jsonify({"error": "limit must not be negative"}), 400
+
+    options = {**_report_options(request.form), "query": (request.form.get("table") or "").strip().lower()}
+    with _RequestTrace(report_type or "auto", request.path) as rt:
+        files = _uploaded_files()
+        if files is None:
+            result, err = None, {"error": "No files uploaded"}
+        else:
+            result, err = _process_report(report_type, files, None, options=options)
+        if err and err.get("file_errors") and all(e.get("error") == NO_MATCHING_ROWS for e in err["file_errors"]):
+            table = next(k for k, v in QUERY_TABLES[report_type].items() if v == _query_table(report_type, options["query"])) if report_type else options["query"] or None
+            result, err = {"report_type": report_type or None, "table": table, "frame": None, "file_errors": [], "duplicate_rows": {}}, None
+    rt.finish("error" if err else "ok")
+    if err:
+        return jsonify(err), 400
 
-    if report_type == "attendance":
-        output_path, err = _process_attendance(files, request.form.get("output_name"))
-    elif report_type == "quick":
-        output_path, err = _process_quick(files, request.form.get("output_name"))
-    else:
+    frame = result["frame"]
+    rows = []
+    if frame is not None and limit:
+        rows = json.loads(_export_frame(frame.iloc[:limit]).to_json(orient="records", date_format="iso"))
+    row_count = 0 if frame is None else len(frame)
+    response = jsonify({
+        "report_type": result["report_type"],
+        "table": result["table"],
+        "columns": [] if frame is None else [str(c) for c in frame.columns],
+        "rows": rows,
+        "row_count": row_count,
+        "truncated": row_count > limit,
+        "duplicate_rows": result["duplicate_rows"],
+        "file_errors": result["file_errors"],
+    })
+    if SERVER_TIMING:
+        response.headers["Server-Timing"] = rt.trace.server_timing()
+    return response
+
+
+@app.route("/query", methods=["POST"])
+@app.route("/query/", methods=["POST"])
+@_limited
+def query_compat():
+    return _query_response((request.form.get("report_type") or "").strip().lower())
+
+
+@app.route("/query/attendance", methods=["POST"])
+@app.route("/query/attendance/", methods=["POST"])
+@_limited
+def query_attendance():
+    return _query_response("attendance")
+
+
+@app.route("/query/quick", methods=["POST"])
+@app.route("/query/quick/", methods=["POST"])
+@_limited
+def query_quick():
+    return _query_response("quick")
+
+
+@app.route("/query/occupancy", methods=["POST"])
+@app.route("/query/occupancy/", methods=["POST"])
+@_limited
+def query_occupancy():
+    return _query_response("occupancy")
+
+
+# -----------------------------
+# Background jobs
+# -----------------------------
+# A POST to /jobs... copies the uploads, queues the work and returns 202 with a
+# job id; JOB_WORKERS threads drain the queue. Jobs live in memory only.
+JOB_WORKERS = int(os.environ.get("KASTLE_JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.environ.get("KASTLE_JOB_QUEUE_SIZE", "16"))
+JOB_HISTORY = int(os.environ.get("KASTLE_JOB_HISTORY", "200"))
+
+_jobs: dict[str, dict] = {}
+_jobs_lock = threading.Lock()
+_job_queue: queue.Queue = queue.Queue(maxsize=JOB_QUEUE_SIZE)
+_job_threads: list[threading.Thread] = []
+
+
+def _job_view(job: dict) -> dict:
+    view = {k: job[k] for k in ("job_id", "report_type", "status", "stage", "created", "started", "finished", "files", "peak_memory_mb", "timings")}
+    view["files"] = [dict(f) for f in job["files"]]
+    if job["error"]:
+        view.update(job["error"])
+    if job["status"] == "done":
+        view["skipped_files"] = list(job["skipped_files"])
+        view["duplicate_rows"] = dict(job["duplicate_rows"])
+        view["already_imported_rows"] = dict(job["already_imported_rows"])
+        view["download_url"] = f"/jobs/{job['job_id']}/download"
+    return view
+
+
+def _update_job(job_id: str, **fields) -> None:
+    with _jobs_lock:
+        _jobs[job_id].update(fields)
+
+
+def _job_progress(job_id: str):
+    def progress(state, index=None):
+        with _jobs_lock:
+            job = _jobs[job_id]
+            if index is None:
+                job["stage"] = state
+            else:
+                job["stage"] = "parsing"
+                job["files"][index]["stage"] = state
+    return progress
+
+
+def _run_job(job_id: str, files, output_name, options) -> None:
+    report_type = _jobs[job_id]["report_type"]
+    _update_job(job_id, status="running", stage="parsing", started=time.time())
+    with _RequestTrace(report_type, f"job {job_id}") as rt:
         try:
-            first_df = _load_df(files[0])
+            output_path, err = _process_report(report_type, files, output_name, _job_progress(job_id), options)
         except Exception as e:
-            return jsonify({"error": "Could not read uploaded file", "details": str(e)}), 400
+            output_path, err = None, {"error": "Processing failed", "details": str(e)}
+        finally:
+            _discard_uploads(files)
+    rt.finish("error" if err else "ok")
+    _update_job(job_id, peak_memory_mb=rt.mem.peak_mb, timings=rt.trace.view())
+
+    if err:
+        _update_job(job_id, status="failed", stage="failed", error=err, finished=time.time())
+    else:
+        _update_job(job_id, status="done", stage="done", output_path=output_path, finished=time.time(),
+                    skipped_files=rt.trace.skipped_files, duplicate_rows=rt.trace.duplicate_rows,
+                    already_imported_rows=rt.trace.already_imported_rows)
+
+
+def _job_worker() -> None:
+    while True:
+        job_id, files, output_name, options = _job_queue.get()
+        try:
+            _run_job(job_id, files, output_name, options)
+        finally:
+            _job_queue.task_done()
+
+
+def _ensure_job_workers() -> None:
+    with _jobs_lock:
+        _job_threads[:] = [t for t in _job_threads if t.is_alive()]
+        while len(_job_threads) < JOB_WORKERS:
+            t = threading.Thread(target=_job_worker, name=f"job-worker-{len(_job_threads)}", daemon=True)
+            t.start()
+            _job_threads.append(t)
 
-        if _looks_like_reader_activity(first_df):
-            output_path, err = _process_quick(files, request.form.get("output_name"))
-        else:
-            output_path, err = _process_attendance(files, request.form.get("output_name"))
 
+def _prune_jobs() -> None:
+    # Caller holds _jobs_lock. Forget the oldest finished jobs past JOB_HISTORY
+    # and delete their results.
+    finished = [j for j in _jobs.values() if j["status"] in ("done", "failed")]
+    for job in sorted(finished, key=lambda j: j["created"])[: max(0, len(_jobs) - JOB_HISTORY)]:
+        _jobs.pop(job["job_id"], None)
+        _discard_output(job["output_path"])
+
+
+def _submit_job(report_type: str):
+    if "files" not in request.files:
+        return jsonify({"error": "No files uploaded"}), 400
+
+    options = _report_options(request.form)
+    err = _options_error(options)
     if err:
         return jsonify(err), 400
-    return send_file(output_path, as_attachment=True)
+
+    _ensure_job_workers()
+    # Request-scoped FileStorage objects are gone once we return, so copy them
+    # (large ones to spool files).
+    files = [_spool_upload(f) for f in request.files.getlist("files")]
+    report_type = report_type or (request.form.get("report_type") or "").strip().lower()
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "report_type": report_type or "auto",
+        "status": "queued",
+        "stage": "queued",
+        "created": time.time(),
+        "started": None,
+        "finished": None,
+        "files": [{"file": f.filename, "stage": "pending"} for f in files],
+        "output_path": None,
+        "skipped_files": [],
+        "duplicate_rows": {},
+        "already_imported_rows": {},
+        "error": None,
+        "peak_memory_mb": None,
+        "timings": None,
+    }
+    with _jobs_lock:
+        _prune_jobs()
+        _jobs[job_id] = job
+
+    try:
+        _job_queue.put_nowait((job_id, files, request.form.get("output_name"), options))
+    except queue.Full:
+        with _jobs_lock:
+            _jobs.pop(job_id, None)
+        _discard_uploads(files)
+        return jsonify({"error": "Job queue is full, try again later", "queue_size": JOB_QUEUE_SIZE}), 503
+
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "download_url": f"/jobs/{job_id}/download",
+    }), 202
+
+
+@app.route("/jobs", methods=["POST"])
+@app.route("/jobs/", methods=["POST"])
+def job_submit():
+    return _submit_job("")
+
+
+@app.route("/jobs/attendance", methods=["POST"])
+@app.route("/jobs/attendance/", methods=["POST"])
+def job_submit_attendance():
+    return _submit_job("attendance")
+
+
+@app.route("/jobs/quick", methods=["POST"])
+@app.route("/jobs/quick/", methods=["POST"])
+def job_submit_quick():
+    return _submit_job("quick")
+
+
+@app.route("/jobs/occupancy", methods=["POST"])
+@app.route("/jobs/occupancy/", methods=["POST"])
+def job_submit_occupancy():
+    return _submit_job("occupancy")
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def job_status(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        view = _job_view(job) if job else None
+    if view is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    return jsonify(view)
+
+
+@app.route("/jobs/<job_id>/download", methods=["GET"])
+def job_download(job_id):
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        status, output_path = (job["status"], job["output_path"]) if job else (None, None)
+        dedupe = (job["timings"] or {}).get("dedupe") if job else None
+        already_imported = job["already_imported_rows"] if job and "session_store" in (job["timings"] or {}) else None
+    if status is None:
+        return jsonify({"error": "Unknown job id"}), 404
+    if status != "done":
+        return jsonify({"error": f"Job is {status}", "status": status}), 409
+    if not os.path.exists(output_path):
+        return jsonify({"error": "Job result has expired", "status": status}), 410
+    response = send_file(output_path, as_attachment=True)
+    if dedupe is not None:
+        # Same header as /process*, for the renderer's download path.
+        response.headers["X-Duplicate-Rows"] = str(dedupe["rows"])
+    if already_imported is not None:
+        response.headers["X-Already-Imported-Rows"] = str(sum(already_imported.values()))
+    return response
+
+
+# -----------------------------
+# Serving
+# -----------------------------
+# `python app.py` (and the packaged exe) serve with waitress when it is
+# installed: one process, SERVER_THREADS threads, safe for several users.
+# Jobs, metrics and the concurrency limit live in this process, so run one
+# server process per machine rather than several behind a balancer; CPU-heavy
+# parsing already fans out to the parse pool. KASTLE_SERVER=flask (or waitress
+# missing) falls back to Flask's threaded development server.
+HOST = os.environ.get("KASTLE_HOST", "127.0.0.1")
+PORT = int(os.environ.get("KASTLE_PORT", "5000"))
+SERVER = os.environ.get("KASTLE_SERVER", "auto").strip().lower()
+SERVER_THREADS = int(os.environ.get("KASTLE_THREADS", "0")) or MAX_CONCURRENT + JOB_WORKERS + 2
+
+
+def _preload() -> None:
+    """Import the lazily loaded readers/writers before the first request needs them."""
+    for module in ("openpyxl", "python_calamine", "pyarrow"):
+        if importlib.util.find_spec(module) is not None:
+            __import__(module)
+
+
+def serve() -> None:
+    _preload()
+    _ensure_job_workers()
+    _result_store.start()
+    if SERVER != "flask" and importlib.util.find_spec("waitress") is not None:
+        from waitress import serve as waitress_serve
+
+        log.info("Serving on http://%s:%d with waitress (%d threads, %d concurrent reports)",
+                 HOST, PORT, SERVER_THREADS, MAX_CONCURRENT)
+        waitress_serve(app, host=HOST, port=PORT, threads=SERVER_THREADS, ident="kastle")
+        return
+    if SERVER == "waitress":
+        log.warning("KASTLE_SERVER=waitress but waitress is not installed; using the Flask server")
+    log.info("Serving on http://%s:%d with the Flask development server", HOST, PORT)
+    app.run(host=HOST, port=PORT, debug=False, threaded=True)
 
 
 if __name__ == "__main__":
-    app.run(host="127.0.0.1", port=5000, debug=False)
+    multiprocessing.freeze_support()
+    serve()
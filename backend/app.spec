@@ -2,7 +2,7 @@
 
 
 a = Analysis(
-    ['app.py'],
+    ['boot.py'],
     pathex=[],
     binaries=[],
     datas=[],
@@ -0,0 +1,242 @@
+"""
+Run reports from the command line, without the HTTP server.
+
+    python batch.py quick exports/*.csv -o reports/
+    python batch.py auto "exports/**/*.xlsx" --format csv --start 2024-01-01 --end 2024-01-31
+    python batch.py occupancy exports/ --interval 30 --workers 8
+    python batch.py auto inbox/ -o reports/ --watch
+
+The report (auto, attendance, quick or occupancy) goes through the same
+processors as /process, reading local files in place: directories are
+searched for .csv/.xlsx/.xls exports and quoted globs are expanded here (**
+recurses), so they also work in cmd.exe. Uploads reach the parse pool as file
+paths (--workers, default KASTLE_PARSE_WORKERS), nothing is copied through a
+request body. The options mirror the /process form fields; finished reports
+are moved to --output and their paths printed. Exit status is 1 when a report
+failed and 2 for bad arguments.
+
+--watch keeps polling the inputs every --poll seconds. A file is picked up
+once its size and mtime hold still between two polls, so exports that are
+still being copied are left alone. Files are grouped by report type (sniffed
+per file for auto) and only the groups that gained, changed or lost a file
+are run again, over all of their files; each group's report is replaced
+atomically. The parse cache keeps unchanged files from being parsed again.
+
+The packaged backend runs this as `kastle_backend.exe batch ...` (see boot.py).
+"""
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import time
+
+REPORTS = ("auto", "attendance", "quick", "occupancy")
+EXTENSIONS = (".csv", ".xlsx", ".xls")
+
+
+def _expand(inputs: list[str]) -> list[str]:
+    """Absolute paths of the export files named by `inputs`, sorted (the upload order)."""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, names in os.walk(item):
+                paths.extend(os.path.join(root, n) for n in names if n.lower().endswith(EXTENSIONS))
+        elif glob.has_magic(item):
+            paths.extend(p for p in glob.glob(item, recursive=True) if os.path.isfile(p))
+        elif os.path.isfile(item):
+            paths.append(item)
+    # "~$name.xlsx" is the lock file Excel keeps next to an open workbook.
+    paths = [os.path.abspath(p) for p in paths if not os.path.basename(p).startswith("~$")]
+    return sorted(dict.fromkeys(paths))
+
+
+def _display_names(paths: list[str]) -> list[str]:
+    """Source File names: paths relative to the folder the files share (plain names when it is one folder)."""
+    if len(paths) == 1:
+        return [os.path.basename(paths[0])]
+    root = os.path.commonpath([os.path.dirname(p) for p in paths])
+    return [os.path.relpath(p, root).replace(os.sep, "/") for p in paths]
+
+
+def _form(args):
+    from werkzeug.datastructures import MultiDict
+
+    def flag(value):
+        return None if value is None else ("1" if value else "0")
+
+    fields = {
+        "output_format": args.format,
+        "low_memory": flag(args.low_memory),
+        "dedupe": flag(args.dedupe),
+        "per_file": flag(args.per_file),
+        "incremental": flag(args.incremental),
+        "start": args.start,
+        "end": args.end,
+        "interval": None if args.interval is None else str(args.interval),
+    }
+    form = MultiDict([(k, v) for k, v in fields.items() if v is not None])
+    form.setlist("people", args.people)
+    form.setlist("suites", args.suites)
+    return form
+
+
+def run_report(app, report: str, paths: list[str], options: dict, output_dir: str, output_name: str | None = None) -> str | None:
+    """Run one report over `paths` and move it into `output_dir`. Returns its path, None if it failed."""
+    uploads = [app._SpooledUpload(p, name, owner=False) for p, name in zip(paths, _display_names(paths))]
+    skipped = []
+
+    def progress(state, index=None):
+        if state == "skipped":
+            skipped.append(uploads[index].filename)
+
+    t0 = time.perf_counter()
+    try:
+        with app._traced() as trace:
+            result, err = app._process_report("" if report == "auto" else report, uploads, output_name, progress, options)
+    except Exception as e:
+        result, err = None, {"error": "Processing failed", "details": str(e)}
+    finally:
+        for upload in uploads:
+            upload.close()
+    seconds = time.perf_counter() - t0
+
+    if err:
+        print(f"{report}: failed after {seconds:.1f}s", file=sys.stderr)
+        print(json.dumps(err, indent=2, default=str), file=sys.stderr)
+        return None
+
+    target = os.path.abspath(os.path.join(output_dir, os.path.basename(result)))
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        # Readers of the output folder never see a half-moved report.
+        shutil.move(result, target + ".part")
+        os.replace(target + ".part", target)
+    except OSError as e:
+        # e.g. the previous report is still open in Excel
+        print(f"{report}: could not write {target}: {e}", file=sys.stderr)
+        return None
+    finally:
+        app._discard_output(result)
+
+    stages = trace.stages
+    notes = []
+    if stages.get("dedupe", [0, 0])[1]:
+        notes.append(f"{stages['dedupe'][1]} duplicate rows dropped")
+    if trace.already_imported_rows:
+        notes.append(f"{sum(trace.already_imported_rows.values())} events already in the session store")
+    print(f"{report}: {len(paths) - len(skipped)} of {len(paths)} files in {seconds:.1f}s -> {target}"
+          + (f" ({', '.join(notes)})" if notes else ""))
+    for stage, (s, rows) in stages.items():
+        print(f"  {stage:<14} {s:>8.2f}s  {rows:>10} rows")
+    for name in sorted(set(skipped)):
+        print(f"  skipped {name}: could not be read or has no usable rows", file=sys.stderr)
+    return target
+
+
+def watch(app, report: str, inputs: list[str], options: dict, output_dir: str, output_name: str | None, poll: float) -> int:
+    """Poll `inputs` until Ctrl+C, re-running the report groups whose files changed."""
+    previous: dict[str, tuple] = {}  # path -> (size, mtime) at the last poll
+    known: dict[str, tuple] = {}  # path -> signature last processed
+    kinds: dict[str, str | None] = {}  # path -> report type (None: header unreadable)
+    written: set[str] = set()  # our own reports, when --output is inside a watched folder
+    print(f"watching {', '.join(inputs)} every {poll:g}s (Ctrl+C to stop)")
+    try:
+        while True:
+            current = {}
+            for path in _expand(inputs):
+                if path in written:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue  # removed between listing and stat
+                current[path] = (st.st_size, st.st_mtime_ns)
+
+            stable = {p: sig for p, sig in current.items() if previous.get(p) == sig}
+            changed = [p for p, sig in stable.items() if known.get(p) != sig]
+            removed = [p for p in known if p not in current]
+
+            affected = set()
+            for path in removed:
+                known.pop(path)
+                affected.add(kinds.pop(path))
+            for path in changed:
+                known[path] = stable[path]
+                kind = report
+                if report == "auto":
+                    upload = app._SpooledUpload(path, os.path.basename(path), owner=False)
+                    try:
+                        kind = app._sniff_report_type(upload)
+                    finally:
+                        upload.close()
+                    if kind is None:
+                        print(f"skipping {path}: header row could not be read", file=sys.stderr)
+                if kinds.get(path) not in (None, kind):
+                    affected.add(kinds[path])
+                kinds[path] = kind
+                affected.add(kind)
+            affected.discard(None)
+
+            for kind in sorted(affected):
+                paths = sorted(p for p, k in kinds.items() if k == kind)
+                if not paths:
+                    print(f"{kind}: no files left, keeping the last report")
+                    continue
+                label = app.REPORT_PROCESSORS[kind][0]
+                name = f"{output_name} - {label}" if output_name else None
+                target = run_report(app, kind, paths, options, output_dir, name)
+                if target:
+                    written.add(target)
+
+            previous = current
+            time.sleep(poll)
+    except KeyboardInterrupt:
+        return 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("report", choices=REPORTS)
+    p.add_argument("inputs", nargs="+", help="export files, folders or quoted globs")
+    p.add_argument("-o", "--output", default=".", help="folder for the finished reports (default: current folder)")
+    p.add_argument("--name", help="report file name (output_name)")
+    p.add_argument("--format", choices=["xlsx", "csv", "parquet", "ndjson"], help="output_format (default xlsx)")
+    p.add_argument("--workers", type=int, help="parse pool processes (default KASTLE_PARSE_WORKERS)")
+    p.add_argument("--start", help="first day to include, YYYY-MM-DD")
+    p.add_argument("--end", help="last day to include, YYYY-MM-DD")
+    p.add_argument("--people", action="append", default=[], help="names or card numbers, comma separated (repeatable)")
+    p.add_argument("--suites", action="append", default=[], help="suites, comma separated (repeatable)")
+    p.add_argument("--interval", type=int, help="occupancy bucket minutes")
+    p.add_argument("--low-memory", action=argparse.BooleanOptionalAction, default=None)
+    p.add_argument("--dedupe", action=argparse.BooleanOptionalAction, default=None)
+    p.add_argument("--per-file", action=argparse.BooleanOptionalAction, default=None)
+    p.add_argument("--incremental", action=argparse.BooleanOptionalAction, default=None)
+    p.add_argument("--watch", action="store_true", help="keep running and re-run reports as exports land")
+    p.add_argument("--poll", type=float, default=5.0, help="seconds between folder scans in --watch mode")
+    args = p.parse_args(argv)
+
+    if args.workers is not None:
+        # Read by app at import time.
+        os.environ["KASTLE_PARSE_WORKERS"] = str(max(1, args.workers))
+    import app
+
+    options = app._report_options(_form(args))
+    err = app._options_error(options, None if args.report == "auto" else args.report)
+    if err:
+        p.error(err["error"])
+
+    if args.watch:
+        return watch(app, args.report, args.inputs, options, args.output, args.name, args.poll)
+
+    paths = _expand(args.inputs)
+    if not paths:
+        p.error("no .csv/.xlsx/.xls files found in the inputs")
+    return 0 if run_report(app, args.report, paths, options, args.output, args.name) else 1
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    raise SystemExit(main())
@@ -0,0 +1,209 @@
+"""
+Synthetic badge data in the shapes app._load_df accepts.
+
+    python benchmarks/badge_data.py reader --events 100000 -o reader.csv
+    python benchmarks/badge_data.py attendance --events 50000 --legacy -o legacy.xlsx
+
+Reader Activity exports come out sorted by time, one row per card read, with
+configurable anomaly rates (double entries, missing exits, exits without an
+entry, non-suite readers, unparseable timestamps). Attendance exports are one
+row per person per day, either with the usual headers or in the legacy
+positional layout (name in column 2, first/last read in columns 4 and 7).
+Everything is generated with numpy; timestamps are formatted through lookup
+tables of distinct days and seconds, so 10M-row frames take well under a
+minute.
+"""
+import argparse
+import io
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+DATE_FORMAT = "%m/%d/%Y"
+READER_CLOCK_FORMAT = "%I:%M:%S %p"
+ATTENDANCE_CLOCK_FORMAT = "%I:%M %p"
+START = pd.Timestamp("2024-01-01")
+OTHER_READERS = np.array(["Lobby Turnstile 1", "Lobby Turnstile 2", "Garage Door", "Freight Elevator"], dtype=object)
+
+
+def _people(n: int) -> np.ndarray:
+    return np.array([f"Person {i:05d}" for i in range(n)], dtype=object)
+
+
+def _format_dates(values: np.ndarray) -> np.ndarray:
+    # strftime only the distinct days; per-row strftime is what makes large
+    # frames slow to generate.
+    days, inverse = np.unique(values.astype("datetime64[D]"), return_inverse=True)
+    return pd.Series(days).dt.strftime(DATE_FORMAT).to_numpy(dtype=object)[inverse]
+
+
+@lru_cache(maxsize=None)
+def _clock_table(fmt: str) -> np.ndarray:
+    return pd.date_range(START, periods=86400, freq="s").strftime(fmt).to_numpy(dtype=object)
+
+
+def _format_clock(values: np.ndarray, fmt: str) -> np.ndarray:
+    seconds = (values - values.astype("datetime64[D]")).astype(np.int64)
+    return _clock_table(fmt)[seconds] + " CT"
+
+
+def _format_times(values: np.ndarray) -> np.ndarray:
+    return _format_dates(values) + " " + _format_clock(values, READER_CLOCK_FORMAT)
+
+
+def reader_activity_frame(
+    events: int = 10_000,
+    people: int = 500,
+    suites: int = 40,
+    days: int = 30,
+    double_entry_rate: float = 0.02,
+    missing_exit_rate: float = 0.02,
+    exit_without_entry_rate: float = 0.01,
+    other_reader_rate: float = 0.02,
+    bad_time_rate: float = 0.0,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Reader Activity rows (Date and Time, Reader, Personnel Name, Card Number,
+    plus the pass-through columns real exports carry), about `events` long.
+
+    Each visit is an ENTRY/EXIT pair on one suite; anomaly rates are per visit
+    (double entry, missing exit, exit without entry) or per row (other reader,
+    bad timestamp).
+    """
+    rng = np.random.default_rng(seed)
+    visits = max(1, int(events / (2 + double_entry_rate + other_reader_rate - missing_exit_rate - exit_without_entry_rate)))
+
+    person = rng.integers(0, people, visits)
+    suite = rng.integers(1, suites + 1, visits)
+    day = rng.integers(0, days, visits).astype("timedelta64[D]")
+    entry = np.datetime64(START, "s") + day + rng.integers(6 * 3600, 18 * 3600, visits).astype("timedelta64[s]")
+    exit_ = entry + rng.integers(5 * 60, 4 * 3600, visits).astype("timedelta64[s]")
+
+    anomaly = rng.random(visits)
+    no_exit = anomaly < missing_exit_rate
+    no_entry = (anomaly >= missing_exit_rate) & (anomaly < missing_exit_rate + exit_without_entry_rate)
+    double = rng.random(visits) < double_entry_rate
+
+    parts = [
+        (person[~no_entry], suite[~no_entry], entry[~no_entry], "Entry"),
+        (person[~no_exit], suite[~no_exit], exit_[~no_exit], "Exit"),
+        (person[double], suite[double], entry[double] - np.timedelta64(90, "s"), "Entry"),
+    ]
+    person = np.concatenate([p[0] for p in parts])
+    suite = np.concatenate([p[1] for p in parts])
+    when = np.concatenate([p[2] for p in parts])
+    direction = np.concatenate([np.full(len(p[0]), p[3], dtype=object) for p in parts])
+
+    readers = np.array([f"Suite {s} " for s in range(suites + 1)], dtype=object)[suite] + direction + " Reader"
+    other = rng.random(len(readers)) < other_reader_rate
+    readers[other] = OTHER_READERS[rng.integers(0, len(OTHER_READERS), int(other.sum()))]
+
+    order = np.argsort(when, kind="stable")
+    times = _format_times(when[order])
+    bad = rng.random(len(times)) < bad_time_rate
+    times[bad] = "N/A"
+
+    person = person[order]
+    return pd.DataFrame({
+        "Date and Time": times,
+        "Reader": readers[order],
+        "Personnel Name": _people(people)[person],
+        "Card Number": 100000 + person,
+        "Event": "Access Granted",
+        "Site": "HQ",
+    })
+
+
+def attendance_frame(
+    events: int = 10_000,
+    people: int = 500,
+    missing_exit_rate: float = 0.02,
+    legacy: bool = False,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Attendance rows (one per person per day, `events` rows). Missing exits
+    leave the last-read time blank. `legacy` gives the headerless positional
+    layout with full timestamps in columns 4 and 7.
+    """
+    rng = np.random.default_rng(seed)
+    person = np.arange(events) % people
+    day = (np.arange(events) // people).astype("timedelta64[D]")
+    first = np.datetime64(START, "s") + day + rng.integers(6 * 3600, 10 * 3600, events).astype("timedelta64[s]")
+    last = first + rng.integers(4 * 3600, 10 * 3600, events).astype("timedelta64[s]")
+    no_exit = rng.random(events) < missing_exit_rate
+    names = _people(people)[person]
+
+    if legacy:
+        last_text = _format_times(last)
+        last_text[no_exit] = ""
+        return pd.DataFrame({
+            "Card": 100000 + person,
+            "Cardholder": names,
+            "Company": "Tenant",
+            "First Read": _format_times(first),
+            "First Reader": "Lobby Turnstile 1",
+            "Last Reader": "Lobby Turnstile 2",
+            "Last Read": last_text,
+        })
+
+    last_text = _format_clock(last, ATTENDANCE_CLOCK_FORMAT)
+    last_text[no_exit] = ""
+    return pd.DataFrame({
+        "Personnel Name": names,
+        "Card Number": 100000 + person,
+        "Date": _format_dates(first),
+        "Time Of First CardRead": _format_clock(first, ATTENDANCE_CLOCK_FORMAT),
+        "Time Of Last Card Read": last_text,
+    })
+
+
+def to_bytes(df: pd.DataFrame, fmt: str = "csv") -> bytes:
+    """Serialize a generated frame the way an export would arrive (csv or xlsx)."""
+    buf = io.BytesIO()
+    if fmt == "csv":
+        df.to_csv(buf, index=False)
+    elif fmt == "xlsx":
+        df.to_excel(buf, index=False)
+    else:
+        raise ValueError(f"Unknown format: {fmt}")
+    return buf.getvalue()
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("shape", choices=["reader", "attendance"])
+    p.add_argument("--events", type=int, default=10_000)
+    p.add_argument("--people", type=int, default=500)
+    p.add_argument("--suites", type=int, default=40)
+    p.add_argument("--days", type=int, default=30)
+    p.add_argument("--double-entry-rate", type=float, default=0.02)
+    p.add_argument("--missing-exit-rate", type=float, default=0.02)
+    p.add_argument("--exit-without-entry-rate", type=float, default=0.01)
+    p.add_argument("--other-reader-rate", type=float, default=0.02)
+    p.add_argument("--bad-time-rate", type=float, default=0.0)
+    p.add_argument("--legacy", action="store_true", help="attendance only: positional layout")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("-o", "--output", required=True, help="path ending in .csv or .xlsx")
+    args = p.parse_args(argv)
+
+    if args.shape == "reader":
+        df = reader_activity_frame(
+            args.events, args.people, args.suites, args.days,
+            args.double_entry_rate, args.missing_exit_rate, args.exit_without_entry_rate,
+            args.other_reader_rate, args.bad_time_rate, args.seed,
+        )
+    else:
+        df = attendance_frame(args.events, args.people, args.missing_exit_rate, args.legacy, args.seed)
+
+    fmt = "xlsx" if args.output.lower().endswith(".xlsx") else "csv"
+    with open(args.output, "wb") as f:
+        f.write(to_bytes(df, fmt))
+    print(f"wrote {len(df)} rows to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
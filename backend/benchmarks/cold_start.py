@@ -0,0 +1,169 @@
+"""
+Measure backend cold start: launch the server, poll /ping, stop it.
+
+    python benchmarks/cold_start.py                       # boot.py vs app.py from source
+    python benchmarks/cold_start.py --exe dist/kastle_backend/kastle_backend.exe --runs 10
+    python benchmarks/cold_start.py --compare benchmarks/results/<earlier run>.json
+
+For every target and run this records, from process launch:
+
+    first_response   first HTTP answer on /ping (any status): what the
+                     Electron splash needs to know the backend is coming up
+    ready            first 200 from /ping: reports can be submitted
+
+Targets are "boot" (python boot.py), "app" (python app.py, the eager
+start) and any --exe builds. Runs alternate between targets so disk caches
+warm up evenly; pass --drop-first to discard each target's first run when
+you want warm-cache numbers only. Results go to benchmarks/results/
+<commit>-cold-<time>.json; --compare exits 1 when a target's median ready
+time got slower than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(HERE)
+NOISE_SECONDS = 0.1
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _stop(proc: subprocess.Popen) -> None:
+    if os.name == "nt":
+        # /T also stops the parse pool workers the frozen exe spawned.
+        subprocess.run(["taskkill", "/PID", str(proc.pid), "/T", "/F"], capture_output=True)
+    else:
+        proc.terminate()
+    try:
+        proc.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def measure(cmd: list[str], timeout: float) -> dict:
+    port = _free_port()
+    env = {**os.environ, "KASTLE_PORT": str(port)}
+    url = f"http://127.0.0.1:{port}/ping"
+    record = {"first_response": None, "ready": None}
+
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=BACKEND, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - t0 < timeout:
+            if proc.poll() is not None:
+                record["error"] = f"exited with code {proc.returncode}"
+                break
+            try:
+                with urllib.request.urlopen(url, timeout=1) as r:
+                    status = r.status
+            except urllib.error.HTTPError as e:
+                status = e.code
+            except OSError:
+                status = None
+            now = round(time.perf_counter() - t0, 3)
+            if status is not None and record["first_response"] is None:
+                record["first_response"] = now
+            if status == 200:
+                record["ready"] = now
+                break
+            time.sleep(0.01)
+        else:
+            record["error"] = f"not ready after {timeout}s"
+    finally:
+        _stop(proc)
+    return record
+
+
+def _summary(runs: list[dict]) -> dict:
+    out = {"runs": len(runs)}
+    for field in ("first_response", "ready"):
+        values = [r[field] for r in runs if r.get(field) is not None]
+        if values:
+            out[field] = {"median": round(statistics.median(values), 3), "min": min(values), "max": max(values)}
+    return out
+
+
+def compare(summary: dict, baseline_path: str, threshold: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["summary"]
+
+    regressions = 0
+    print(f"\nvs {baseline_path}")
+    for target, s in summary.items():
+        old = baseline.get(target, {}).get("ready")
+        if not old or "ready" not in s:
+            continue
+        ratio = s["ready"]["median"] / old["median"]
+        flag = "  REGRESSION" if old["median"] >= NOISE_SECONDS and ratio > threshold else ""
+        regressions += bool(flag)
+        print(f"{target:<28} ready {ratio:>6.2f}x{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--targets", nargs="*", choices=["boot", "app"], default=["boot", "app"], help="source launches to time")
+    p.add_argument("--exe", nargs="*", default=[], help="frozen builds to time (e.g. dist/kastle_backend/kastle_backend.exe)")
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--drop-first", action="store_true", help="discard each target's first (cold cache) run")
+    p.add_argument("--timeout", type=float, default=120)
+    p.add_argument("--out", help="results JSON (default: benchmarks/results/<commit>-cold-<time>.json)")
+    p.add_argument("--compare", metavar="JSON", help="earlier results file to compare against")
+    p.add_argument("--threshold", type=float, default=1.15, help="ratio that counts as a regression")
+    args = p.parse_args(argv)
+
+    targets = {name: [sys.executable, f"{name}.py"] for name in args.targets}
+    targets.update({exe: [os.path.abspath(exe)] for exe in args.exe})
+
+    results = {name: [] for name in targets}
+    for run in range(args.runs):
+        for name, cmd in targets.items():
+            record = measure(cmd, args.timeout)
+            print(f"{name:<28} run {run + 1}: first response {record['first_response']}s  ready {record['ready']}s"
+                  + (f"  ({record['error']})" if "error" in record else ""))
+            results[name].append(record)
+    if args.drop_first:
+        results = {name: runs[1:] for name, runs in results.items()}
+    summary = {name: _summary(runs) for name, runs in results.items()}
+
+    # Imported late: pipeline imports app, which the timed launches must not share.
+    from pipeline import _commit
+
+    commit = _commit()
+    out = args.out or os.path.join(HERE, "results", f"{commit}-cold-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "targets": {name: cmd for name, cmd in targets.items()},
+            "summary": summary,
+            "results": results,
+        }, f, indent=2)
+    print(json.dumps(summary, indent=2))
+    print(f"wrote {out}")
+
+    if args.compare:
+        return compare(summary, args.compare, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
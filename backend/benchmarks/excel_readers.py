@@ -0,0 +1,87 @@
+"""
+Compare the Excel reader engines behind app._load_df on generated workbooks.
+
+    python benchmarks/excel_readers.py --rows 20000 100000
+    python benchmarks/excel_readers.py --rows 200000 --engines openpyxl_stream openpyxl
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import Workbook  # noqa: E402
+
+import app  # noqa: E402
+
+
+def make_reader_workbook(rows: int, seed: int = 0) -> bytes:
+    """Reader Activity-shaped workbook with a few unused columns, like real exports."""
+    rng = random.Random(seed)
+    # Regular (not write_only) mode so the file carries shared strings and a
+    # sheet dimension, as workbooks saved by Excel and export tools do.
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Reader Activity"
+    ws.append(["Date and Time", "Reader", "Personnel Name", "Card Number", "Event", "Site", "Panel"])
+    start = datetime(2024, 1, 1, 6, 0)
+    for i in range(rows):
+        suite = rng.randint(1, 40)
+        when = start + timedelta(seconds=i * 7)
+        ws.append([
+            when.strftime("%m/%d/%Y %I:%M:%S %p") + " CT",
+            f"Suite {suite} {'Entry' if rng.random() < 0.5 else 'Exit'} Reader",
+            f"Person {rng.randint(1, 2000):04d}",
+            rng.randint(100000, 999999),
+            "Access Granted",
+            "HQ",
+            f"Panel {suite % 8}",
+        ])
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+class _Upload(io.BytesIO):
+    """Minimal stand-in for werkzeug's FileStorage (filename + stream)."""
+
+    def __init__(self, data: bytes, filename: str):
+        super().__init__(data)
+        self.filename = filename
+        self.stream = self
+
+
+def time_engine(data: bytes, engine: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        upload = _Upload(data, "bench.xlsx")
+        t0 = time.perf_counter()
+        app.EXCEL_READERS[engine](upload)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--rows", type=int, nargs="+", default=[20000, 100000])
+    p.add_argument("--engines", nargs="+", default=app._excel_engine_order("openpyxl"))
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args(argv)
+
+    baseline = "openpyxl"
+    print(f"{'rows':>9}  {'size MB':>8}  {'engine':<16} {'seconds':>9}  {'speedup':>8}")
+    for rows in args.rows:
+        data = make_reader_workbook(rows)
+        results = {engine: time_engine(data, engine, args.repeat) for engine in args.engines}
+        for engine, secs in results.items():
+            speedup = results[baseline] / secs if baseline in results else float("nan")
+            print(f"{rows:>9}  {len(data) / 1e6:>8.1f}  {engine:<16} {secs:>9.3f}  {speedup:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
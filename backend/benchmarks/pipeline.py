@@ -0,0 +1,240 @@
+"""
+Time and memory-profile the report pipeline stages on synthetic badge data.
+
+    python benchmarks/pipeline.py --events 10000 100000 1000000
+    python benchmarks/pipeline.py --events 10000000 --shapes reader --low-memory
+    python benchmarks/pipeline.py --compare benchmarks/results/<earlier run>.json
+
+Stages per shape (reader = Reader Activity, attendance, legacy = positional
+attendance):
+
+    load_*      app._load_df on the serialized upload
+    build_*     build_suite_sessions / build_attendance_outputs
+    occupancy_* build_suite_occupancy on the paired sessions (reader only)
+    process_*   the whole _process_quick / _process_attendance call
+    write_*     the workbook-writing part of that call
+
+process/write stages are skipped above Excel's sheet row limit. Every shape
+and size runs in a fresh interpreter so memory readings do not depend on what
+ran before. Each result records wall time, peak RSS and RSS growth (see
+app._MemoryWatch), plus the tracemalloc peak with --tracemalloc (slow). Results go to a JSON file named
+after the current commit; --compare prints time/memory ratios against an
+earlier file and exits 1 when a stage got slower or bigger than --threshold
+(stages under 0.1 s or 16 MB in the earlier run are too noisy to flag).
+"""
+import argparse
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+# Measure parsing every time, in this process.
+os.environ.setdefault("KASTLE_PARSE_CACHE_MB", "0")
+os.environ.setdefault("KASTLE_PARSE_WORKERS", "1")
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+
+import app  # noqa: E402
+import badge_data  # noqa: E402
+
+EXCEL_MAX_ROWS = 1_048_575  # data rows below the header
+NOISE_SECONDS = 0.1
+NOISE_MB = 16
+SHAPES = {
+    "reader": (lambda n, seed: badge_data.reader_activity_frame(n, seed=seed), app.QUICK_COLUMNS),
+    "attendance": (lambda n, seed: badge_data.attendance_frame(n, seed=seed), app.ATTENDANCE_COLUMNS),
+    "legacy": (lambda n, seed: badge_data.attendance_frame(n, legacy=True, seed=seed), app.ATTENDANCE_COLUMNS),
+}
+
+
+def _commit() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+        return sha + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+class _Stage:
+    """Times one stage and tracks its memory; `.record` is the JSON row."""
+
+    def __init__(self, name: str, shape: str, events: int, use_tracemalloc: bool):
+        self.record = {"stage": name, "shape": shape, "events": events}
+        self.use_tracemalloc = use_tracemalloc
+
+    def __enter__(self):
+        gc.collect()
+        if self.use_tracemalloc:
+            tracemalloc.start()
+        self.mem = app._MemoryWatch(f"{self.record['stage']} {self.record['events']}").__enter__()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.t0
+        self.mem.__exit__(*exc)
+        self.record["seconds"] = round(seconds, 4)
+        self.record.update(_memory_fields(self.mem))
+        if self.use_tracemalloc:
+            self.record["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 1048576, 1)
+            tracemalloc.stop()
+        return False
+
+
+def _memory_fields(mem) -> dict:
+    if mem.peak is None:
+        return {"peak_rss_mb": None, "rss_growth_mb": None}
+    return {"peak_rss_mb": mem.peak_mb, "rss_growth_mb": round((mem.peak - mem.start) / 1048576, 1)}
+
+
+def run_process(shape: str, events: int, data: bytes, filename: str, options: dict, use_tracemalloc: bool) -> list[dict]:
+    """Run the processor once; split off the part after its "writing" progress report."""
+    report = "quick" if shape == "reader" else "attendance"
+    processor = app._process_quick if report == "quick" else app._process_attendance
+    write = {}
+
+    def progress(state, index=None):
+        if state == "writing" and index is None:
+            write["t0"] = time.perf_counter()
+            write["mem"] = app._MemoryWatch(f"write_{report} {events}").__enter__()
+
+    with _Stage(f"process_{report}", shape, events, use_tracemalloc) as stage:
+        output_path, err = processor([app._UploadBuffer(data, filename)], f"bench_{report}.xlsx", progress, options)
+        if "mem" in write:
+            write["seconds"] = time.perf_counter() - write["t0"]
+            write["mem"].__exit__(None, None, None)
+    if err:
+        raise RuntimeError(f"{report} failed: {err}")
+    app._discard_output(output_path)
+
+    records = [stage.record]
+    if "mem" in write:
+        records.append({
+            "stage": f"write_{report}", "shape": shape, "events": events,
+            "seconds": round(write["seconds"], 4), **_memory_fields(write["mem"]),
+        })
+    return records
+
+
+def run_shape(shape: str, events: int, fmt: str, options: dict, seed: int, use_tracemalloc: bool) -> list[dict]:
+    make, columns = SHAPES[shape]
+    lean = bool(options.get("low_memory"))
+    t0 = time.perf_counter()
+    data = badge_data.to_bytes(make(events, seed), fmt)
+    filename = f"bench_{shape}.{fmt}"
+    print(f"{shape} {events}: generated {len(data) / 1e6:.1f} MB in {time.perf_counter() - t0:.1f}s")
+
+    records = []
+    with _Stage(f"load_{shape}", shape, events, use_tracemalloc) as stage:
+        df = app._load_df(app._UploadBuffer(data, filename), **app._ingest_kwargs(columns, lean))
+    records.append(stage.record)
+
+    with _Stage(f"build_{shape}", shape, events, use_tracemalloc) as stage:
+        if shape == "reader":
+            app.build_suite_sessions(df, lean=lean)
+        else:
+            app.build_attendance_outputs(df, filename, lean=lean)
+    records.append(stage.record)
+
+    if shape == "reader":
+        prepared, _ = app._prepare_reader_events(df, lean=lean)
+        sessions = app._occupancy_sessions(prepared)
+        del prepared
+        with _Stage(f"occupancy_{shape}", shape, events, use_tracemalloc) as stage:
+            app.build_suite_occupancy(sessions)
+        records.append(stage.record)
+        del sessions
+    del df
+
+    if events > EXCEL_MAX_ROWS:
+        records.append({"stage": "process", "shape": shape, "events": events, "skipped": "exceeds Excel sheet row limit"})
+    else:
+        records.extend(run_process(shape, events, data, filename, options, use_tracemalloc))
+    return records
+
+
+def compare(results: list[dict], baseline_path: str, threshold: float) -> int:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(r["stage"], r["shape"], r["events"]): r for r in json.load(f)["results"] if "seconds" in r}
+
+    regressions = 0
+    print(f"\nvs {baseline_path}")
+    print(f"{'stage':<20} {'shape':<11} {'events':>9}  {'time':>7}  {'peak RSS growth':>15}")
+    for r in results:
+        old = baseline.get((r["stage"], r["shape"], r["events"]))
+        if old is None or "seconds" not in r:
+            continue
+        t_ratio = r["seconds"] / old["seconds"] if old["seconds"] else float("nan")
+        m_ratio = float("nan")
+        if r.get("rss_growth_mb") is not None and old.get("rss_growth_mb"):
+            m_ratio = r["rss_growth_mb"] / old["rss_growth_mb"]
+        slower = old["seconds"] >= NOISE_SECONDS and t_ratio > threshold
+        bigger = (old.get("rss_growth_mb") or 0) >= NOISE_MB and m_ratio > threshold
+        flag = "  REGRESSION" if slower or bigger else ""
+        regressions += bool(flag)
+        print(f"{r['stage']:<20} {r['shape']:<11} {r['events']:>9}  {t_ratio:>6.2f}x  {m_ratio:>14.2f}x{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--events", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--shapes", nargs="+", choices=list(SHAPES), default=list(SHAPES))
+    p.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="upload format to parse")
+    p.add_argument("--low-memory", action="store_true", help="run with the low_memory report option")
+    p.add_argument("--tracemalloc", action="store_true", help="also record Python allocation peaks (slow)")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="results JSON (default: benchmarks/results/<commit>-<time>.json)")
+    p.add_argument("--compare", metavar="JSON", help="earlier results file to compare against")
+    p.add_argument("--threshold", type=float, default=1.15, help="ratio that counts as a regression")
+    args = p.parse_args(argv)
+
+    commit = _commit()
+    options = {"low_memory": args.low_memory}
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for events in args.events:
+        for shape in args.shapes:
+            with ctx.Pool(1) as pool:
+                records = pool.apply(run_shape, (shape, events, args.format, options, args.seed, args.tracemalloc))
+            for record in records:
+                results.append(record)
+                if "seconds" in record:
+                    print(f"  {record['stage']:<20} {record['seconds']:>9.3f}s  peak {record['peak_rss_mb']} MB"
+                          f"  (+{record['rss_growth_mb']} MB)")
+
+    out = args.out or os.path.join(HERE, "results", f"{commit}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "commit": commit,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "format": args.format,
+            "options": options,
+            "results": results,
+        }, f, indent=2)
+    print(f"wrote {out}")
+
+    if args.compare:
+        return compare(results, args.compare, args.threshold)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
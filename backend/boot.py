@@ -0,0 +1,108 @@
+"""
+Fast-start entry point for the packaged backend (kastle_backend.spec).
+
+Importing app pulls in pandas, numpy and Flask, which takes seconds in a
+frozen build while the Electron splash polls /ping with nothing listening.
+boot binds the port first using only the stdlib and waitress, then imports app
+in a background thread:
+
+    GET /ping     503 {"status": "starting", "ready": false, "seconds": ...}
+                  until app is loaded, then app's own 200 {"ready": true}
+    anything else waits for the load (up to KASTLE_BOOT_WAIT seconds)
+
+Once app is loaded every request goes straight to app.app. Without waitress
+this is just `python app.py`. `boot.py batch ...` runs the command-line
+reports instead (batch.py), so the packaged exe can do both.
+"""
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+BOOT_WAIT = float(os.environ.get("KASTLE_BOOT_WAIT", "120"))
+BOOT_THREADS = 4  # until app.SERVER_THREADS is known
+
+
+class _BootApp:
+    """WSGI app that answers /ping while `load` imports the real one."""
+
+    def __init__(self, started: float):
+        self.started = started
+        self.loaded = threading.Event()
+        self.app = None
+        self.error = None
+
+    def load(self, server) -> None:
+        try:
+            import app
+
+            app._preload()
+            app._ensure_job_workers()
+            app._result_store.start()
+            server.task_dispatcher.set_thread_count(app.SERVER_THREADS)
+            self.app = app.app
+            app.log.info("Backend ready in %.2fs (%d threads, %d concurrent reports)",
+                         time.perf_counter() - self.started, app.SERVER_THREADS, app.MAX_CONCURRENT)
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.loaded.set()
+
+    def _json(self, start_response, status: str, body: dict):
+        data = json.dumps(body).encode()
+        start_response(status, [
+            ("Content-Type", "application/json"),
+            ("Content-Length", str(len(data))),
+            ("Access-Control-Allow-Origin", "*"),
+            ("Retry-After", "1"),
+        ])
+        return [data]
+
+    def __call__(self, environ, start_response):
+        if self.app is not None:
+            return self.app(environ, start_response)
+
+        if environ.get("PATH_INFO", "").rstrip("/") == "/ping" and not self.loaded.is_set():
+            return self._json(start_response, "503 Service Unavailable", {
+                "status": "starting",
+                "ready": False,
+                "seconds": round(time.perf_counter() - self.started, 2),
+            })
+        if not self.loaded.wait(BOOT_WAIT):
+            return self._json(start_response, "503 Service Unavailable", {"error": "Backend is still starting, try again shortly"})
+        if self.app is None:
+            return self._json(start_response, "500 Internal Server Error", {
+                "status": "error",
+                "ready": False,
+                "error": f"Backend failed to load: {self.error}",
+            })
+        return self.app(environ, start_response)
+
+
+def main() -> None:
+    started = time.perf_counter()
+    try:
+        from waitress.server import create_server
+    except ImportError:
+        import app
+
+        app.serve()
+        return
+
+    host = os.environ.get("KASTLE_HOST", "127.0.0.1")
+    port = int(os.environ.get("KASTLE_PORT", "5000"))
+    boot = _BootApp(started)
+    server = create_server(boot, host=host, port=port, threads=BOOT_THREADS, ident="kastle")
+    threading.Thread(target=boot.load, args=(server,), name="boot-load", daemon=True).start()
+    server.run()
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    if sys.argv[1:2] == ["batch"]:
+        import batch
+
+        raise SystemExit(batch.main(sys.argv[2:]))
+    main()
@@ -2,7 +2,7 @@
 
 
 a = Analysis(
-    ['app.py'],
+    ['boot.py'],
     pathex=[],
     binaries=[],
     datas=[],
@@ -16,12 +16,14 @@ a = Analysis(
 )
 pyz = PYZ(a.pure)
 
+# One-folder build: a one-file exe unpacks the whole bundle (pandas, numpy,
+# ...) to a temp dir on every launch before Python starts, which was most of
+# the startup time. Ships as dist/kastle_backend/kastle_backend.exe.
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='kastle_backend',
     debug=False,
     bootloader_ignore_signals=False,
@@ -36,3 +38,12 @@ exe = EXE(
     codesign_identity=None,
     entitlements_file=None,
 )
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=True,
+    upx_exclude=[],
+    name='kastle_backend',
+)
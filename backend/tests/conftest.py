@@ -0,0 +1,68 @@
+"""
+Shared setup for the backend tests.
+
+app reads its KASTLE_* settings at import, so they are pinned here before any
+test module imports it: files are parsed in-process, the parse cache is off
+and the session store is a throwaway file.
+"""
+import io
+import os
+import sys
+import tempfile
+
+import pandas as pd
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TMP = tempfile.mkdtemp(prefix="kastle-tests-")
+os.environ.update({
+    "KASTLE_PARSE_WORKERS": "1",
+    "KASTLE_PARSE_CACHE_MB": "0",
+    "KASTLE_SESSION_STORE": os.path.join(TMP, "session_store.sqlite3"),
+})
+sys.path.insert(0, BACKEND)
+
+import app  # noqa: E402
+
+
+def _upload(df: pd.DataFrame, name: str):
+    """(file object, filename) for a multipart files field, written as CSV or XLSX by extension."""
+    buf = io.BytesIO()
+    if name.endswith(".csv"):
+        buf.write(df.to_csv(index=False).encode())
+    else:
+        df.to_excel(buf, index=False)
+    buf.seek(0)
+    return buf, name
+
+
+@pytest.fixture
+def upload():
+    return _upload
+
+
+@pytest.fixture
+def post():
+    """
+    post(path, [(df, name), ...], **form) -> the finished response. The body is
+    read and the response closed, so the result file is removed from uploads/.
+    """
+    client = app.app.test_client()
+
+    def send(path, files, **form):
+        data = {**form, "files": [_upload(df, name) for df, name in files]}
+        response = client.post(path, data=data, content_type="multipart/form-data")
+        response.get_data()
+        response.close()
+        return response
+
+    return send
+
+
+def read_sheets(response) -> dict[str, pd.DataFrame]:
+    return pd.read_excel(io.BytesIO(response.get_data()), sheet_name=None)
+
+
+@pytest.fixture
+def sheets():
+    return read_sheets
@@ -0,0 +1,67 @@
+"""
+Dedupe across uploads: the same Reader Activity export uploaded as CSV and as
+XLSX must give the report of the export alone.
+"""
+import pandas as pd
+import pytest
+
+EXPORT = pd.DataFrame(
+    [
+        ["Suite 1 Entry", "2024-01-01 08:00:00", "Ann", 7],
+        ["Suite 1 Exit", "2024-01-01 09:00:00", "Ann", 7],
+        # Same person and reader, only the time differs: separate events.
+        ["Suite 1 Entry", "2024-01-01 10:00:00", "Ann", 7],
+        ["Suite 1 Exit", "2024-01-01 10:30:00", "Ann", 7],
+        ["Suite 2 Entry", "2024-01-01 08:15:00", "Bob", 8],
+        ["Suite 2 Entry", "2024-01-01 08:45:00", "Bob", 8],  # MISSING EXIT for the first
+        ["Suite 2 Exit", "2024-01-01 11:00:00", "Bob", 8],
+        ["Suite 1 Exit", "2024-01-01 12:00:00", "Cy", 9],  # MISSING ENTRY
+    ],
+    columns=["Reader", "Date and Time", "Personnel Name", "Card Number"],
+)
+
+
+def _as_excel(df: pd.DataFrame) -> pd.DataFrame:
+    # Excel exports carry real datetime cells, CSVs carry text.
+    return df.assign(**{"Date and Time": pd.to_datetime(df["Date and Time"])})
+
+
+@pytest.fixture
+def single(post, sheets):
+    response = post("/process/quick", [(EXPORT, "export.csv")], dedupe="1")
+    assert response.status_code == 200
+    assert response.headers["X-Duplicate-Rows"] == "0"
+    return sheets(response)
+
+
+def test_csv_and_xlsx_of_one_export(post, sheets, single):
+    files = [(EXPORT, "export.csv"), (_as_excel(EXPORT), "export.xlsx")]
+    response = post("/process/quick", files, dedupe="1")
+    assert response.status_code == 200
+    assert response.headers["X-Duplicate-Rows"] == str(len(EXPORT))
+
+    both = sheets(response)
+    for sheet in ("Suite Sessions", "Suite Discrepancies"):
+        assert len(both[sheet]) == len(single[sheet]), sheet
+        assert set(both[sheet]["Source File"]) == {"export.csv"}
+    assert len(single["Suite Sessions"]) == 5
+    assert len(single["Suite Discrepancies"]) == 2
+
+
+def test_duplicate_rows_per_file(post):
+    files = [(EXPORT, "export.csv"), (_as_excel(EXPORT), "export.xlsx")]
+    response = post("/query/quick", files, dedupe="1")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["duplicate_rows"] == {"export.xlsx": len(EXPORT)}
+    assert body["row_count"] == 5
+
+
+def test_rows_differing_only_in_time_are_kept(post):
+    later = EXPORT.iloc[:2].assign(**{"Date and Time": ["2024-01-01 13:00:00", "2024-01-01 14:00:00"]})
+    files = [(EXPORT, "export.csv"), (_as_excel(later), "later.xlsx")]
+    response = post("/query/quick", files, dedupe="1")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["duplicate_rows"] == {}
+    assert body["row_count"] == 6
@@ -0,0 +1,36 @@
+"""
+_export_frame: the typed frame behind /query rows and the Parquet/NDJSON outputs.
+"""
+import pandas as pd
+import pyarrow as pa
+
+import app
+
+
+def _padded(*values) -> pd.Series:
+    return pd.Series(list(values), dtype=object)
+
+
+def test_padding_becomes_null():
+    out = app._export_frame(pd.DataFrame({
+        "Duration (minutes)": _padded(60, ""),
+        "Exit Time": _padded(pd.Timestamp("2024-01-01 09:00"), ""),
+        "Issue": _padded("", "MISSING EXIT"),
+    }))
+    assert out["Duration (minutes)"].dtype == "float64"
+    assert pd.api.types.is_datetime64_dtype(out["Exit Time"])
+    assert out["Issue"].iloc[1] == "MISSING EXIT"
+    assert out.iloc[1].isna().tolist() == [True, True, False]
+
+
+def test_all_padding_column_is_null_not_text():
+    # A file whose sessions are all open: every Duration is "".
+    out = app._export_frame(pd.DataFrame({"Duration (minutes)": _padded("", "")}))
+    assert out["Duration (minutes)"].isna().all()
+    assert pa.Table.from_pandas(out).schema.field("Duration (minutes)").type == pa.null()
+
+
+def test_mixed_values_become_text():
+    out = app._export_frame(pd.DataFrame({"Card Number": _padded(7, "A7", "")}))
+    assert out["Card Number"].tolist()[:2] == ["7", "A7"]
+    assert out["Card Number"].isna().tolist() == [False, False, True]
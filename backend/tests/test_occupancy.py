@@ -0,0 +1,97 @@
+"""
+build_suite_occupancy against a per-second head count.
+
+The sweep reads bucket values off one sorted +1/-1 event stream; the
+reference here just counts, second by second, how many sessions cover
+[Entry Time, Exit Time) and sums that per bucket.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+
+
+def _reference(sessions: pd.DataFrame, width: int):
+    """{(suite, bucket start seconds): (peak, person-seconds)} and {suite: peak}."""
+    buckets, peaks = {}, {}
+    for suite, group in sessions.groupby("Suite"):
+        entry = group["Entry Time"].to_numpy("datetime64[s]").astype(np.int64)
+        exit_ = group["Exit Time"].to_numpy("datetime64[s]").astype(np.int64)
+        lo, hi = entry.min(), exit_.max()
+        count = np.zeros(hi - lo + 1, dtype=np.int64)
+        for a, b in zip(entry, exit_):
+            count[a - lo:b - lo] += 1
+        peaks[suite] = count.max()
+        midnight = lo // 86400 * 86400
+        for start in range((lo - midnight) // width * width + midnight, hi, width):
+            seconds = count[max(start - lo, 0):max(start + width - lo, 0)]
+            if seconds.sum() > 0:
+                buckets[(suite, start)] = (seconds.max(), seconds.sum())
+    return buckets, peaks
+
+
+def _sessions(seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 60))
+    base = np.datetime64("2024-01-01T00:00:00")
+    if seed % 3 == 0:
+        # Sessions starting and ending on bucket edges: the tie-breaking cases.
+        entry = base + (rng.integers(0, 12, n) * 900).astype("timedelta64[s]")
+        exit_ = entry + (rng.integers(1, 4, n) * 900).astype("timedelta64[s]")
+    else:
+        entry = base + rng.integers(0, 3 * 3600, n).astype("timedelta64[s]")
+        exit_ = entry + rng.integers(1, 5000, n).astype("timedelta64[s]")
+    return pd.DataFrame({
+        "Suite": rng.choice(["Suite 1", "Suite 2", "Suite 10"], n),
+        "Entry Time": entry,
+        "Exit Time": exit_,
+    })
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_sweep_matches_per_second_count(seed):
+    sessions = _sessions(seed)
+    minutes = [1, 5, 15, 60][seed % 4]
+    occupancy, peaks = app.build_suite_occupancy(sessions, minutes)
+    want_buckets, want_peaks = _reference(sessions, minutes * 60)
+
+    got = {
+        (row["Suite"], int(np.datetime64(row["Interval Start"], "s").astype(np.int64))): row
+        for _, row in occupancy.iterrows()
+    }
+    assert set(got) == set(want_buckets)
+    for key, (peak, person_seconds) in want_buckets.items():
+        assert got[key]["Peak Occupancy"] == peak, key
+        assert got[key]["Occupied Minutes"] == pytest.approx(person_seconds / 60, abs=0.01), key
+
+    assert dict(zip(peaks["Suite"], peaks["Peak Occupancy"])) == want_peaks
+    for _, row in peaks.iterrows():
+        # The reported peak window really holds that many people.
+        suite = sessions[sessions["Suite"] == row["Suite"]]
+        inside = (suite["Entry Time"] <= row["Peak Start"]) & (suite["Exit Time"] > row["Peak Start"])
+        assert inside.sum() == row["Peak Occupancy"]
+        assert row["Peak End"] > row["Peak Start"]
+
+
+def test_only_sub_second_sessions():
+    sessions = pd.DataFrame({
+        "Suite": ["Suite 1"],
+        "Entry Time": [pd.Timestamp("2024-01-01 08:00:00.200")],
+        "Exit Time": [pd.Timestamp("2024-01-01 08:00:00.700")],
+    })
+    occupancy, peaks = app.build_suite_occupancy(sessions, 15)
+    assert occupancy.empty and list(occupancy.columns) == app.OCCUPANCY_COLUMNS
+    assert peaks.empty and list(peaks.columns) == app.PEAK_COLUMNS
+
+
+def test_only_sub_second_sessions_over_http(post):
+    export = pd.DataFrame({
+        "Reader": ["Suite 1 Entry", "Suite 1 Exit"],
+        "Date and Time": ["2024-01-01 08:00:00.200", "2024-01-01 08:00:00.700"],
+        "Personnel Name": ["Ann", "Ann"],
+        "Card Number": ["7", "7"],
+    })
+    response = post("/process/occupancy", [(export, "r.csv")], output_name="occ")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "No completed sessions to measure occupancy from"
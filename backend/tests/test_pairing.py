@@ -0,0 +1,263 @@
+"""
+build_suite_sessions against the iterrows() pairing loop it replaced.
+
+    python -m pytest backend/tests
+
+`_reference_build_suite_sessions` is the original implementation, kept here
+verbatim apart from the helper names, so the vectorized engine is checked
+against the behaviour the reports were built on: same Issue labels, same
+row order, same columns and dtypes in all three returned frames.
+"""
+import os
+import random
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+
+
+# -----------------------------
+# Reference: the original loop
+# -----------------------------
+def _ref_norm_cols(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df.columns = [re.sub(r"\s+", " ", str(c)).strip() for c in df.columns]
+    return df
+
+
+def _ref_find_col(df: pd.DataFrame, candidates: list[str]) -> str | None:
+    cols = set(df.columns)
+    for c in candidates:
+        if c in cols:
+            return c
+    return None
+
+
+def _ref_parse_dt(series: pd.Series) -> pd.Series:
+    s = series.astype(str).str.replace(" CT", "", regex=False).str.strip()
+    return pd.to_datetime(s, errors="coerce")
+
+
+def _ref_suite_from_reader(reader_text: str) -> str:
+    if not isinstance(reader_text, str):
+        return "Unknown"
+    m = re.search(r"(Suite\s*\d+)", reader_text, flags=re.IGNORECASE)
+    return m.group(1).strip() if m else "Unknown"
+
+
+def _reference_build_suite_sessions(reader_df: pd.DataFrame):
+    df = _ref_norm_cols(reader_df)
+
+    reader_col = _ref_find_col(df, ["Reader", "Reader Name", "Reader Description"])
+    dt_col = _ref_find_col(df, ["Date and Time", "Date & Time", "Datetime", "Date Time", "Time"])
+
+    if not reader_col or not dt_col:
+        raise ValueError("Missing required columns for Reader Activity report (need Reader + Date/Time).")
+
+    if "Personnel Name" not in df.columns:
+        df["Personnel Name"] = ""
+    if "Card Number" not in df.columns:
+        df["Card Number"] = ""
+
+    df["dt"] = _ref_parse_dt(df[dt_col])
+    df = df.dropna(subset=["dt"]).copy()
+
+    r = df[reader_col].astype(str).str.lower()
+    df["direction"] = np.select(
+        [r.str.contains("entry"), r.str.contains("exit")],
+        ["ENTRY", "EXIT"],
+        default="OTHER"
+    )
+
+    df = df[df["direction"].isin(["ENTRY", "EXIT"])].copy()
+    if df.empty:
+        raise ValueError("No ENTRY/EXIT rows found (Reader column did not contain 'entry' or 'exit').")
+
+    df["Suite"] = df[reader_col].apply(_ref_suite_from_reader)
+    df["Personnel Name"] = df["Personnel Name"].astype(str).str.strip().replace("", "Unknown")
+    df["Card Number"] = df["Card Number"].astype(str).str.strip()
+
+    df = df.sort_values(["Personnel Name", "Card Number", "Suite", "dt"]).reset_index(drop=True)
+
+    sessions = []
+    open_state = {}
+    last_dir = {}
+
+    def key_for(row):
+        return (
+            str(row.get("Personnel Name", "")).strip() or "Unknown",
+            str(row.get("Card Number", "")).strip(),
+            str(row.get("Suite", "Unknown")).strip()
+        )
+
+    for _, row in df.iterrows():
+        k = key_for(row)
+        direction = row["direction"]
+        when = row["dt"]
+        reader = row.get(reader_col, "")
+        prev = last_dir.get(k)
+
+        if direction == "ENTRY":
+            if k in open_state:
+                sessions.append({
+                    "Personnel Name": k[0],
+                    "Card Number": k[1],
+                    "Suite": k[2],
+                    "Entry Reader": open_state[k]["entry_reader"],
+                    "Entry Time": open_state[k]["entry_time"],
+                    "Exit Reader": "",
+                    "Exit Time": "",
+                    "Duration (minutes)": "",
+                    "Issue": "DOUBLE ENTRY (missing EXIT before this ENTRY)"
+                })
+            open_state[k] = {"entry_time": when, "entry_reader": reader}
+
+        elif direction == "EXIT":
+            if k not in open_state:
+                issue = "EXIT WITHOUT ENTRY"
+                if prev == "EXIT":
+                    issue = "DOUBLE EXIT (expected ENTRY between EXITs)"
+                sessions.append({
+                    "Personnel Name": k[0],
+                    "Card Number": k[1],
+                    "Suite": k[2],
+                    "Entry Reader": "",
+                    "Entry Time": "",
+                    "Exit Reader": reader,
+                    "Exit Time": when,
+                    "Duration (minutes)": "",
+                    "Issue": issue
+                })
+            else:
+                entry_time = open_state[k]["entry_time"]
+                duration_min = round((when - entry_time).total_seconds() / 60.0, 2)
+                issue = "NEGATIVE DURATION (timestamps out of order?)" if duration_min < 0 else ""
+
+                sessions.append({
+                    "Personnel Name": k[0],
+                    "Card Number": k[1],
+                    "Suite": k[2],
+                    "Entry Reader": open_state[k]["entry_reader"],
+                    "Entry Time": entry_time,
+                    "Exit Reader": reader,
+                    "Exit Time": when,
+                    "Duration (minutes)": duration_min,
+                    "Issue": issue
+                })
+                open_state.pop(k, None)
+
+        last_dir[k] = direction
+
+    for k, state in open_state.items():
+        sessions.append({
+            "Personnel Name": k[0],
+            "Card Number": k[1],
+            "Suite": k[2],
+            "Entry Reader": state["entry_reader"],
+            "Entry Time": state["entry_time"],
+            "Exit Reader": "",
+            "Exit Time": "",
+            "Duration (minutes)": "",
+            "Issue": "MISSING EXIT"
+        })
+
+    sessions_df = pd.DataFrame(sessions)
+    if sessions_df.empty:
+        raise ValueError("No sessions produced after pairing. (Unexpected)")
+
+    discrepancies_df = sessions_df[sessions_df["Issue"].astype(str).str.strip() != ""].copy()
+
+    tmp = sessions_df.copy()
+    tmp["Entry Time"] = pd.to_datetime(tmp["Entry Time"], errors="coerce")
+    tmp["Exit Time"] = pd.to_datetime(tmp["Exit Time"], errors="coerce")
+    tmp["Duration (minutes)"] = pd.to_numeric(tmp["Duration (minutes)"], errors="coerce")
+
+    completed = tmp.dropna(subset=["Entry Time", "Exit Time", "Duration (minutes)"]).copy()
+    completed["Date"] = completed["Entry Time"].dt.date
+
+    summary_df = (
+        completed
+        .groupby(["Personnel Name", "Card Number", "Suite", "Date"], dropna=False)["Duration (minutes)"]
+        .sum()
+        .reset_index()
+        .sort_values(["Personnel Name", "Date", "Suite"])
+    )
+
+    return sessions_df, discrepancies_df, summary_df
+
+
+# -----------------------------
+# Randomized Reader Activity frames
+# -----------------------------
+def _reader_frame(seed: int) -> pd.DataFrame:
+    """
+    Small exports dense in edge cases: blank/missing names and cards, padded
+    values, non-suite and non-door readers, and repeated timestamps so that
+    same-second ENTRY/EXIT ordering is exercised.
+    """
+    rng = random.Random(seed)
+    people = ["Alice", "Bob", " Carol ", "", None, "Dan"]
+    rows = []
+    for _ in range(rng.randint(1, 300)):
+        direction = rng.choice(["Entry", "Exit", "Lobby"])
+        rows.append({
+            "Reader": f"Suite {rng.randint(1, 4)} {direction} Door" if rng.random() < 0.9 else f"Main {direction}",
+            "Date and Time": f"2024-01-{rng.randint(1, 3):02d} {rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:{rng.choice([0, 0, 30]):02d} CT",
+            "Personnel Name": rng.choice(people),
+            "Card Number": rng.choice(["1", "2", None, " 3"]),
+        })
+    return pd.DataFrame(rows)
+
+
+def _outcome(build, df: pd.DataFrame):
+    try:
+        return build(df.copy())
+    except ValueError as e:
+        return e
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_matches_reference_loop(seed):
+    df = _reader_frame(seed)
+    expected = _outcome(_reference_build_suite_sessions, df)
+    got = _outcome(app.build_suite_sessions, df)
+
+    if isinstance(expected, ValueError):
+        assert isinstance(got, ValueError) and str(got) == str(expected)
+        return
+    assert not isinstance(got, ValueError), got
+    for name, want, have in zip(("sessions", "discrepancies", "summary"), expected, got):
+        pd.testing.assert_frame_equal(have.reset_index(drop=True), want.reset_index(drop=True), obj=name)
+
+
+def test_every_issue_label():
+    df = pd.DataFrame({
+        "Reader": [
+            "Suite 1 Entry", "Suite 1 Entry", "Suite 1 Exit",  # double entry, then a session
+            "Suite 2 Exit", "Suite 2 Exit",  # exit without entry, double exit
+            "Suite 3 Entry",  # missing exit
+        ],
+        "Date and Time": [
+            "2024-01-01 08:00:00", "2024-01-01 09:00:00", "2024-01-01 17:00:00",
+            "2024-01-01 10:00:00", "2024-01-01 11:00:00",
+            "2024-01-01 12:00:00",
+        ],
+        "Personnel Name": ["Ann"] * 6,
+        "Card Number": ["7"] * 6,
+    })
+    sessions, _, _ = app.build_suite_sessions(df)
+    assert sessions["Issue"].tolist() == [
+        app.ISSUE_DOUBLE_ENTRY,
+        "",
+        app.ISSUE_EXIT_WITHOUT_ENTRY,
+        app.ISSUE_DOUBLE_EXIT,
+        app.ISSUE_MISSING_EXIT,
+    ]
+    for want, have in zip(_reference_build_suite_sessions(df), app.build_suite_sessions(df)):
+        pd.testing.assert_frame_equal(have.reset_index(drop=True), want.reset_index(drop=True))
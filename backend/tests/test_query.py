@@ -0,0 +1,102 @@
+"""
+Row filters (start/end/people/suites) and the /query JSON endpoints.
+"""
+import pandas as pd
+import pytest
+from werkzeug.datastructures import MultiDict
+
+import app
+
+EXPORT = pd.DataFrame(
+    [
+        ["Suite 1 Entry", "2024-01-01 08:00:00", "Ann Lee", "7"],
+        ["Suite 1 Exit", "2024-01-01 09:00:00", "Ann Lee", "7"],
+        ["Suite 4 Entry", "2024-01-02 08:00:00", "Ann Lee", "7"],
+        ["Suite 4 Exit", "2024-01-02 10:00:00", "Ann Lee", "7"],
+        ["Suite 1 Entry", "2024-01-02 08:30:00", "Bob Roe", "8"],
+        ["Suite 1 Exit", "2024-01-02 09:30:00", "Bob Roe", "8"],
+        ["Suite 4 Entry", "2024-01-03 12:00:00", "Bob Roe", "8"],
+        ["Suite 4 Exit", "2024-01-03 13:00:00", "Bob Roe", "8"],
+    ],
+    columns=["Reader", "Date and Time", "Personnel Name", "Card Number"],
+)
+
+
+def _filter(**fields) -> "app._RowFilter":
+    form = MultiDict()
+    for name, value in fields.items():
+        form.setlist(name, value if isinstance(value, list) else [value])
+    return app._RowFilter.from_form(form)
+
+
+def test_date_range_is_end_inclusive():
+    f = _filter(start="2024-01-02", end="2024-01-02")
+    dt = pd.Series(pd.to_datetime(["2024-01-01 23:59:59", "2024-01-02 00:00:00", "2024-01-02 23:59:59", "2024-01-03 00:00:00"]))
+    assert f.date_mask(dt).tolist() == [False, True, True, False]
+    assert _filter(end="2024-01-01").date_mask(dt).tolist() == [True, False, False, False]
+
+
+@pytest.mark.parametrize("fields, error", [
+    ({"start": "2024-01-03", "end": "2024-01-02"}, "start must not be after end"),
+    ({"start": "not a date"}, "Invalid start/end date"),
+])
+def test_bad_dates_set_error(fields, error):
+    assert _filter(**fields).error.startswith(error)
+
+
+def test_people_match_name_or_card_case_insensitively():
+    f = _filter(people=["ann lee, 8", "\nNobody\n"])
+    names = pd.Series(["Ann Lee", "ANN LEE ", "Bob Roe", "Cy"])
+    cards = pd.Series(["7", "7", "8", "9"])
+    assert f.person_mask(names, cards).tolist() == [True, True, True, False]
+    assert f.person_mask(names).tolist() == [True, True, False, False]
+
+
+def test_suite_spellings():
+    f = _filter(suites="suite4,2")
+    assert f.suite_match(["Suite 4", "SUITE 4", "Suite 2", "Suite 1", "Suite 41"]).tolist() == [True, True, True, False, False]
+
+
+def test_empty_fields_are_no_filter():
+    f = _filter(start="", people=["", " , "], suites="")
+    assert not f and f.error is None
+
+
+def test_reader_filters_applied_before_pairing(post):
+    response = post("/query/quick", [(EXPORT, "r.csv")], suites="4", people="bob roe", start="2024-01-03")
+    assert response.status_code == 200
+    rows = response.get_json()["rows"]
+    assert [(r["Personnel Name"], r["Suite"], r["Entry Time"]) for r in rows] == [("Bob Roe", "Suite 4", "2024-01-03T12:00:00.000")]
+
+
+def test_limit_truncates(post):
+    body = post("/query/quick", [(EXPORT, "r.csv")], limit="3").get_json()
+    assert body["table"] == "sessions"
+    assert body["row_count"] == 4
+    assert len(body["rows"]) == 3
+    assert body["truncated"] is True
+
+    body = post("/query/quick", [(EXPORT, "r.csv")], limit="4").get_json()
+    assert len(body["rows"]) == 4 and body["truncated"] is False
+
+
+@pytest.mark.parametrize("limit", ["-1", "many"])
+def test_bad_limit(post, limit):
+    assert post("/query/quick", [(EXPORT, "r.csv")], limit=limit).status_code == 400
+
+
+def test_no_matches_is_empty_200(post):
+    response = post("/query/quick", [(EXPORT, "r.csv")], people="Nobody")
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["rows"] == [] and body["row_count"] == 0 and body["truncated"] is False
+
+
+def test_filters_rejected_with_incremental(post):
+    response = post("/process/quick", [(EXPORT, "r.csv")], incremental="1", suites="4")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Filters cannot be combined with incremental"
+
+    response = post("/query/quick", [(EXPORT, "r.csv")], incremental="1")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Queries cannot be combined with incremental"
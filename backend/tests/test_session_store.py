@@ -0,0 +1,84 @@
+"""
+Incremental Quick reports through the session store (KASTLE_SESSION_STORE is
+a throwaway file, see conftest.py).
+"""
+import pandas as pd
+import pytest
+
+import app
+
+EVENT_COLUMNS = ["Reader", "Date and Time", "Personnel Name", "Card Number"]
+
+
+def _export(*rows) -> pd.DataFrame:
+    return pd.DataFrame(list(rows), columns=EVENT_COLUMNS)
+
+
+DAY1 = _export(
+    ["Suite 1 Entry", "2024-01-01 08:00:00", "Ann", "7"],
+    ["Suite 1 Exit", "2024-01-01 09:00:00", "Ann", "7"],
+    ["Suite 1 Entry", "2024-01-01 22:00:00", "Ann", "7"],
+    ["Suite 2 Entry", "2024-01-01 10:00:00", "Bob", "8"],
+)
+DAY2 = _export(
+    ["Suite 1 Exit", "2024-01-02 06:00:00", "Ann", "7"],
+    ["Suite 2 Exit", "2024-01-02 07:30:00", "Bob", "8"],
+)
+
+
+@pytest.fixture(autouse=True)
+def empty_store():
+    app._session_store.clear()
+    yield
+    app._session_store.clear()
+
+
+def test_open_entries_after_first_file(post, sheets):
+    response = post("/process/quick", [(DAY1, "day1.csv")], incremental="1")
+    assert response.status_code == 200
+
+    sessions = sheets(response)["Suite Sessions"]
+    assert len(sessions) == 1  # only Ann's 08:00-09:00; trailing entries stay open
+
+    open_entries = app._session_store.open_entries()
+    assert list(open_entries.columns) == app.SESSION_KEY_COLS + ["Entry Reader", "Entry Time"]
+    assert open_entries[["Personnel Name", "Suite"]].values.tolist() == [["Ann", "Suite 1"], ["Bob", "Suite 2"]]
+    assert open_entries["Entry Time"].tolist() == [pd.Timestamp("2024-01-01 22:00:00"), pd.Timestamp("2024-01-01 10:00:00")]
+    assert len(sheets(response)["Open Entries"]) == 2
+
+
+def test_session_spanning_two_files(post, sheets):
+    post("/process/quick", [(DAY1, "day1.csv")], incremental="1")
+    response = post("/process/quick", [(DAY2, "day2.csv")], incremental="1")
+    assert response.status_code == 200
+
+    sessions = sheets(response)["Suite Sessions"].sort_values("Personnel Name")
+    assert sessions["Entry Time"].tolist() == [pd.Timestamp("2024-01-01 22:00:00"), pd.Timestamp("2024-01-01 10:00:00")]
+    assert sessions["Exit Time"].tolist() == [pd.Timestamp("2024-01-02 06:00:00"), pd.Timestamp("2024-01-02 07:30:00")]
+    assert sessions["Duration (minutes)"].tolist() == [480, 1290]
+    assert sessions["Issue"].isna().all()
+    assert sessions["Source File"].tolist() == ["day2.csv", "day2.csv"]
+    assert app._session_store.open_entries().empty
+
+
+def test_reupload_is_already_imported(post):
+    post("/process/quick", [(DAY1, "day1.csv")], incremental="1")
+    before = app._session_store.open_entries()
+
+    response = post("/process/quick", [(DAY1, "day1.csv")], incremental="1")
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body["error"].startswith("No new events")
+    assert body["already_imported_rows"] == {"day1.csv": len(DAY1)}
+    pd.testing.assert_frame_equal(app._session_store.open_entries(), before)
+
+
+def test_clear():
+    events = app._prepare_reader_events(DAY1)[0]
+    events["Source File"] = "day1.csv"
+    app._session_store.pair(events)
+    assert len(app._session_store.open_entries()) == 2
+
+    assert app._session_store.clear() == 2  # one stored key per (person, card, suite)
+    assert app._session_store.open_entries().empty
+    assert app._session_store.clear() == 0
@@ -4,7 +4,7 @@
 
 $projectRoot = Split-Path -Parent $MyInvocation.MyCommand.Path
 $distFolder = Join-Path $projectRoot "dist\KastleApp-win32-x64"
-$backendScript = Join-Path $projectRoot "backend\app.py"
+$backendSpec = Join-Path $projectRoot "backend\kastle_backend.spec"
 $backendDist = Join-Path $projectRoot "backend\dist"
 
 Write-Host "🚀 Starting build process..." -ForegroundColor Cyan
@@ -37,7 +37,8 @@ if (Test-Path $distFolder) {
 Write-Host "Building backend EXE..." -ForegroundColor Yellow
 if (-Not (Test-Path $backendDist)) { New-Item -ItemType Directory -Path $backendDist }
 
-pyinstaller --onefile $backendScript --distpath $backendDist --workpath "$projectRoot\backend\build" --specpath "$projectRoot\backend\build"
+# The spec builds boot.py as a one-folder app: dist\kastle_backend\kastle_backend.exe
+pyinstaller --noconfirm $backendSpec --distpath $backendDist --workpath "$projectRoot\backend\build"
 
 Write-Host "✅ Backend EXE built at $backendDist" -ForegroundColor Green
 
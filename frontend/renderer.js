@@ -74,12 +74,55 @@ window.addEventListener("DOMContentLoaded", () => {
     }
   }
 
+  const BACKEND = "http://127.0.0.1:5000";
+
   function endpointForReport(reportType) {
-    if (reportType === "attendance") return "http://127.0.0.1:5000/process/attendance";
-    if (reportType === "quick") return "http://127.0.0.1:5000/process/quick";
+    if (reportType === "attendance") return `${BACKEND}/jobs/attendance`;
+    if (reportType === "quick") return `${BACKEND}/jobs/quick`;
     return null;
   }
 
+  async function errorFromResponse(res) {
+    let errMsg = `Server error (${res.status})`;
+    const ct = (res.headers.get("content-type") || "").toLowerCase();
+    if (ct.includes("application/json")) {
+      const data = await res.json();
+      errMsg = errorFromJob(data) || errMsg;
+    } else {
+      errMsg = await res.text();
+    }
+    return new Error(errMsg);
+  }
+
+  function errorFromJob(data) {
+    if (!data.error) return null;
+    let errMsg = data.error;
+    if (data.skipped_files?.length) errMsg += `\nSkipped: ${data.skipped_files.join(", ")}`;
+    if (data.file_errors?.length) errMsg += `\n\nDetails:\n${JSON.stringify(data.file_errors[0], null, 2)}`;
+    return errMsg;
+  }
+
+  // Poll a background job until it finishes; returns the final status payload.
+  async function waitForJob(statusUrl) {
+    for (;;) {
+      const res = await fetch(`${BACKEND}${statusUrl}`);
+      if (!res.ok) throw await errorFromResponse(res);
+      const job = await res.json();
+      if (job.status === "done") return job;
+      if (job.status === "failed") throw new Error(errorFromJob(job) || "Processing failed");
+
+      const files = job.files || [];
+      const finished = files.filter((f) => f.stage === "done" || f.stage === "skipped").length;
+      dropArea.innerText =
+        job.stage === "writing"
+          ? "Writing report…"
+          : job.status === "queued"
+            ? "Waiting for the backend…"
+            : `Processing ${finished}/${files.length} file(s)…`;
+      await new Promise((r) => setTimeout(r, 500));
+    }
+  }
+
   function setFiles(filesArray) {
     droppedFiles = filesArray || [];
     dropArea.innerText =
@@ -137,22 +180,15 @@ window.addEventListener("DOMContentLoaded", () => {
       formData.append("output_name", outputName);
 
       const res = await fetch(url, { method: "POST", body: formData });
+      if (!res.ok) throw await errorFromResponse(res);
 
-      if (!res.ok) {
-        let errMsg = `Server error (${res.status})`;
-        const ct = (res.headers.get("content-type") || "").toLowerCase();
-        if (ct.includes("application/json")) {
-          const data = await res.json();
-          errMsg = data.error || errMsg;
-          if (data.skipped_files?.length) errMsg += `\nSkipped: ${data.skipped_files.join(", ")}`;
-          if (data.file_errors?.length) errMsg += `\n\nDetails:\n${JSON.stringify(data.file_errors[0], null, 2)}`;
-        } else {
-          errMsg = await res.text();
-        }
-        throw new Error(errMsg);
-      }
+      const { status_url: statusUrl } = await res.json();
+      const job = await waitForJob(statusUrl);
+
+      const download = await fetch(`${BACKEND}${job.download_url}`);
+      if (!download.ok) throw await errorFromResponse(download);
 
-      const blob = await res.blob();
+      const blob = await download.blob();
       const dlUrl = window.URL.createObjectURL(blob);
       const a = document.createElement("a");
       a.href = dlUrl;
@@ -166,8 +202,17 @@ window.addEventListener("DOMContentLoaded", () => {
       outputNameInput.value = "";
       fileInput.value = "";
 
+      const notes = [];
+      const duplicates = Object.values(job.duplicate_rows || {}).reduce((a, b) => a + b, 0);
+      if (duplicates) notes.push(`${duplicates} duplicate row(s) dropped`);
+      const imported = Object.values(job.already_imported_rows || {}).reduce((a, b) => a + b, 0);
+      if (imported) notes.push(`${imported} event(s) were already imported`);
+      if (job.skipped_files?.length) notes.push(`Skipped: ${job.skipped_files.join(", ")}`);
+      if (notes.length) dropArea.innerText = `Report saved. ${notes.join(". ")}.`;
+
     } catch (err) {
       console.error(err);
+      setFiles(droppedFiles);
       alert(`Error processing files:\n${err.message || err}`);
     }
   });
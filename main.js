@@ -47,6 +47,8 @@ async function waitForBackendDetailed({ tries = 60, delayMs = 250 } = {}) {
     try {
       const code = await httpGet(url);
       if (code === 200) return true;
+      // 503 from boot.py: the server is up and still loading its data libraries.
+      if (code === 503) setBackendStatus("checking", "Loading report engine…");
     } catch (_) {}
     await new Promise((r) => setTimeout(r, delayMs));
   }
@@ -55,8 +57,8 @@ async function waitForBackendDetailed({ tries = 60, delayMs = 250 } = {}) {
 
 function getBackendExePath() {
   return app.isPackaged
-    ? path.join(process.resourcesPath, "backend", "kastle_backend.exe")
-    : path.join(__dirname, "backend", "dist", "kastle_backend.exe");
+    ? path.join(process.resourcesPath, "backend", "kastle_backend", "kastle_backend.exe")
+    : path.join(__dirname, "backend", "dist", "kastle_backend", "kastle_backend.exe");
 }
 
 function killBackend() {